@@ -1,9 +1,13 @@
 """
 DAG de Airflow para el pipeline de recomendaciones
-Ejecuta diariamente: FiltrarDatos -> TopCTR, TopProduct -> DBWriting
+Ejecuta diariamente: FiltrarDatos -> TopCTR, TopProduct -> DBWriting -> ComputeStats, PublishSnapshot
+Con la Variable pipeline_mode='fused' reemplaza las tres primeras tareas por
+una sola tarea fusionada: FusedPipeline -> DBWriting -> ComputeStats, PublishSnapshot
+Con raw_data_layout='partitioned', CompactRawLogs actualiza antes las
+particiones diarias de los logs crudos (ver raw_partitions.py)
 """
 from airflow import DAG
-from airflow.operators.python import PythonOperator
+from airflow.operators.python import BranchPythonOperator, PythonOperator
 from airflow.utils.dates import days_ago
 from airflow.models import Variable
 from datetime import datetime, timedelta
@@ -43,6 +47,95 @@ def get_execution_date(**context):
     return execution_date.strftime('%Y-%m-%d')
 
 
+def get_artifact_format():
+    """Formato de los archivos intermedios entre tareas ('parquet' por defecto o 'csv')"""
+    return Variable.get("artifact_format", default_var="parquet")
+
+
+def get_window_days():
+    """Días de la ventana que rankean TopCTR y TopProduct (1 = solo el día de ejecución)"""
+    return int(Variable.get("aggregate_window_days", default_var="1"))
+
+
+def get_model_workers():
+    """Procesos en paralelo para TopCTR y TopProduct (1 = secuencial, 0 = todos los cores)"""
+    return int(Variable.get("model_workers", default_var="1"))
+
+
+def get_raw_layout():
+    """'flat' lee los logs acumulados; 'partitioned' solo las particiones del día (raw_partitions.py)"""
+    return Variable.get("raw_data_layout", default_var="flat")
+
+
+def get_db_config():
+    """Configuración de la base de datos desde variables de Airflow"""
+    return {
+        'host': Variable.get("rds_host", default_var="localhost"),
+        'port': int(Variable.get("rds_port", default_var="5432")),
+        'database': Variable.get("rds_database", default_var="mlops"),
+        'user': Variable.get("rds_user", default_var="postgres"),
+        'password': Variable.get("rds_password", default_var="password"),
+    }
+
+
+def run_stage(stage, execution_date, s3_bucket, s3_output_prefix, func, *args, **kwargs):
+    """
+    Ejecuta una etapa midiendo tiempos por fase, filas, bytes y pico de memoria
+
+    Las métricas se guardan en {s3_output_prefix}/metrics/date=.../{stage}.json
+    y se devuelven en el XCom junto con el resultado de la etapa
+    (ver instrumentation.py).
+    """
+    from instrumentation import run_instrumented
+    from storage import get_storage
+
+    return run_instrumented(stage, execution_date, get_storage(s3_bucket), s3_output_prefix, func, *args, **kwargs)
+
+
+# Tarea 0: compactar los logs crudos en particiones diarias
+def task_compact_raw_logs_wrapper(**context):
+    """Wrapper para compactar los logs crudos; no hace nada con raw_data_layout='flat'"""
+    if get_raw_layout() != 'partitioned':
+        print("raw_data_layout no es 'partitioned': no hay nada que compactar")
+        return None
+
+    # Importar aquí para evitar timeout en la carga del DAG
+    from raw_partitions import RAW_LOGS, compact_raw_log
+    from storage import get_storage
+
+    execution_date = context['execution_date'].strftime('%Y-%m-%d')
+    s3_bucket = Variable.get("s3_bucket", default_var="grupo13-2025")
+    s3_input_prefix = Variable.get("s3_input_prefix", default_var="raw_data")
+    s3_output_prefix = Variable.get("s3_output_prefix", default_var="processed_data")
+
+    def compact_raw_logs():
+        storage = get_storage(s3_bucket)
+        return {log_name: len(compact_raw_log(storage, s3_input_prefix, log_name)) for log_name in RAW_LOGS}
+
+    return run_stage('compact_raw_logs', execution_date, s3_bucket, s3_output_prefix, compact_raw_logs)
+
+
+task_compact_raw_logs = PythonOperator(
+    task_id='compact_raw_logs',
+    python_callable=task_compact_raw_logs_wrapper,
+    dag=dag,
+)
+
+
+# Elegir entre el pipeline por etapas y el fusionado
+def choose_pipeline_mode(**context):
+    """Devuelve la tarea inicial según la Variable pipeline_mode ('staged' o 'fused')"""
+    pipeline_mode = Variable.get("pipeline_mode", default_var="staged")
+    return 'fused_pipeline' if pipeline_mode == 'fused' else 'filter_data'
+
+
+task_choose_pipeline_mode = BranchPythonOperator(
+    task_id='choose_pipeline_mode',
+    python_callable=choose_pipeline_mode,
+    dag=dag,
+)
+
+
 # Tarea 1: FiltrarDatos
 def task_filter_data_wrapper(**context):
     """Wrapper para la tarea de filtrar datos"""
@@ -56,13 +149,21 @@ def task_filter_data_wrapper(**context):
     s3_input_prefix = Variable.get("s3_input_prefix", default_var="raw_data")
     s3_output_prefix = Variable.get("s3_output_prefix", default_var="processed_data")
     advertiser_ids_file = Variable.get("advertiser_ids_file", default_var="advertiser_ids")
+    # Tamaño de bloque (filas) para el modo streaming; vacío = leer los logs completos
+    chunk_size = Variable.get("filter_chunk_size", default_var="")
+    raw_layout = get_raw_layout()
+    artifact_format = get_artifact_format()
     
-    return filter_data(
+    return run_stage(
+        'filter_data', execution_date, s3_bucket, s3_output_prefix, filter_data,
         s3_bucket,
         s3_input_prefix,
         s3_output_prefix,
         advertiser_ids_file,
-        execution_date
+        execution_date,
+        chunk_size=int(chunk_size) if chunk_size else None,
+        artifact_format=artifact_format,
+        raw_layout=raw_layout
     )
 
 
@@ -78,18 +179,25 @@ def task_top_ctr_wrapper(**context):
     """Wrapper para calcular TopCTR"""
     # Importar aquí para evitar timeout en la carga del DAG
     from top_ctr import calculate_top_ctr
+    from artifacts import artifact_key
     
     execution_date = context['execution_date'].strftime('%Y-%m-%d')
     
     s3_bucket = Variable.get("s3_bucket", default_var="grupo13-2025")
     s3_output_prefix = Variable.get("s3_output_prefix", default_var="processed_data")
-    filtered_ads_file = f"{s3_output_prefix}/ads_views_filtered_{execution_date}.csv"
+    artifact_format = get_artifact_format()
+    filtered_ads_file = artifact_key(s3_output_prefix, 'ads_views_filtered', execution_date, artifact_format)
     
-    return calculate_top_ctr(
+    return run_stage(
+        'top_ctr', execution_date, s3_bucket, s3_output_prefix, calculate_top_ctr,
         s3_bucket,
         filtered_ads_file,
         s3_output_prefix,
-        execution_date
+        execution_date,
+        artifact_format=artifact_format,
+        window_days=get_window_days(),
+        workers=get_model_workers(),
+        advertiser_ids_file=Variable.get("advertiser_ids_file", default_var="advertiser_ids")
     )
 
 
@@ -105,18 +213,25 @@ def task_top_product_wrapper(**context):
     """Wrapper para calcular TopProduct"""
     # Importar aquí para evitar timeout en la carga del DAG
     from top_product import calculate_top_product
+    from artifacts import artifact_key
     
     execution_date = context['execution_date'].strftime('%Y-%m-%d')
     
     s3_bucket = Variable.get("s3_bucket", default_var="grupo13-2025")
     s3_output_prefix = Variable.get("s3_output_prefix", default_var="processed_data")
-    filtered_views_file = f"{s3_output_prefix}/product_views_filtered_{execution_date}.csv"
+    artifact_format = get_artifact_format()
+    filtered_views_file = artifact_key(s3_output_prefix, 'product_views_filtered', execution_date, artifact_format)
     
-    return calculate_top_product(
+    return run_stage(
+        'top_product', execution_date, s3_bucket, s3_output_prefix, calculate_top_product,
         s3_bucket,
         filtered_views_file,
         s3_output_prefix,
-        execution_date
+        execution_date,
+        artifact_format=artifact_format,
+        window_days=get_window_days(),
+        workers=get_model_workers(),
+        advertiser_ids_file=Variable.get("advertiser_ids_file", default_var="advertiser_ids")
     )
 
 
@@ -127,44 +242,129 @@ task_top_product = PythonOperator(
 )
 
 
+# Tarea 1-3 (modo fusionado): FiltrarDatos + TopCTR + TopProduct en una sola tarea
+def task_fused_pipeline_wrapper(**context):
+    """Wrapper para el pipeline fusionado"""
+    # Importar aquí para evitar timeout en la carga del DAG
+    from fused_pipeline import run_fused_pipeline
+    
+    execution_date = context['execution_date'].strftime('%Y-%m-%d')
+    
+    s3_bucket = Variable.get("s3_bucket", default_var="grupo13-2025")
+    s3_input_prefix = Variable.get("s3_input_prefix", default_var="raw_data")
+    s3_output_prefix = Variable.get("s3_output_prefix", default_var="processed_data")
+    advertiser_ids_file = Variable.get("advertiser_ids_file", default_var="advertiser_ids")
+    chunk_size = Variable.get("filter_chunk_size", default_var="")
+    raw_layout = get_raw_layout()
+    
+    return run_stage(
+        'fused_pipeline', execution_date, s3_bucket, s3_output_prefix, run_fused_pipeline,
+        s3_bucket,
+        s3_input_prefix,
+        s3_output_prefix,
+        advertiser_ids_file,
+        execution_date,
+        chunk_size=int(chunk_size) if chunk_size else None,
+        artifact_format=get_artifact_format(),
+        raw_layout=raw_layout,
+        window_days=get_window_days(),
+        workers=get_model_workers()
+    )
+
+
+task_fused_pipeline = PythonOperator(
+    task_id='fused_pipeline',
+    python_callable=task_fused_pipeline_wrapper,
+    dag=dag,
+)
+
+
 # Tarea 4: DBWriting
 def task_db_writing_wrapper(**context):
     """Wrapper para escribir en la base de datos"""
     # Importar aquí para evitar timeout en la carga del DAG
     from db_writing import write_to_db
+    from artifacts import artifact_key
     
     execution_date = context['execution_date'].strftime('%Y-%m-%d')
     
     s3_bucket = Variable.get("s3_bucket", default_var="grupo13-2025")
     s3_output_prefix = Variable.get("s3_output_prefix", default_var="processed_data")
-    top_ctr_file = f"{s3_output_prefix}/top_ctr_{execution_date}.csv"
-    top_product_file = f"{s3_output_prefix}/top_product_{execution_date}.csv"
+    artifact_format = get_artifact_format()
+    top_ctr_file = artifact_key(s3_output_prefix, 'top_ctr', execution_date, artifact_format)
+    top_product_file = artifact_key(s3_output_prefix, 'top_product', execution_date, artifact_format)
     
-    # Obtener configuración de DB desde variables de Airflow
-    db_config = {
-        'host': Variable.get("rds_host", default_var="localhost"),
-        'port': int(Variable.get("rds_port", default_var="5432")),
-        'database': Variable.get("rds_database", default_var="mlops"),
-        'user': Variable.get("rds_user", default_var="postgres"),
-        'password': Variable.get("rds_password", default_var="password"),
-    }
+    db_config = get_db_config()
+    
+    # 'copy' (carga en bloque con COPY) o 'insert' (un INSERT por fila)
+    load_method = Variable.get("db_load_method", default_var="copy")
+    # Días de recomendaciones que se conservan; las particiones más viejas se borran.
+    # Borrar es destructivo, así que es opt-in: sin la Variable (o vacía) no se borra nada
+    retention_days = Variable.get("recommendations_retention_days", default_var="")
+    # Espera máxima por los locks del intercambio de particiones; si se agota la tarea falla y se reintenta
+    lock_timeout = Variable.get("db_lock_timeout", default_var="5s")
     
-    return write_to_db(
+    return run_stage(
+        'db_writing', execution_date, s3_bucket, s3_output_prefix, write_to_db,
         s3_bucket,
         top_ctr_file,
         top_product_file,
         db_config,
-        execution_date
+        execution_date,
+        method=load_method,
+        retention_days=int(retention_days) if retention_days else None,
+        lock_timeout=lock_timeout
     )
 
 
 task_db_writing = PythonOperator(
     task_id='db_writing',
     python_callable=task_db_writing_wrapper,
+    # Corre con la rama que se haya ejecutado (la otra queda en skipped)
+    trigger_rule='none_failed_min_one_success',
+    dag=dag,
+)
+
+
+# Tarea 5: ComputeStats
+def task_compute_stats_wrapper(**context):
+    """Wrapper para precalcular las estadísticas de /stats/"""
+    # Importar aquí para evitar timeout en la carga del DAG
+    from compute_stats import compute_stats
+    
+    execution_date = context['execution_date'].strftime('%Y-%m-%d')
+    return compute_stats(get_db_config(), execution_date)
+
+
+task_compute_stats = PythonOperator(
+    task_id='compute_stats',
+    python_callable=task_compute_stats_wrapper,
+    dag=dag,
+)
+
+
+# Tarea 6: PublishSnapshot
+def task_publish_snapshot_wrapper(**context):
+    """Wrapper para publicar el snapshot que sirve la API"""
+    # Importar aquí para evitar timeout en la carga del DAG
+    from serving_snapshot import publish_snapshot
+    
+    s3_bucket = Variable.get("s3_bucket", default_var="grupo13-2025")
+    s3_output_prefix = Variable.get("s3_output_prefix", default_var="processed_data")
+    return publish_snapshot(s3_bucket, s3_output_prefix, get_db_config())
+
+
+task_publish_snapshot = PythonOperator(
+    task_id='publish_snapshot',
+    python_callable=task_publish_snapshot_wrapper,
     dag=dag,
 )
 
 
 # Definir dependencias
+task_compact_raw_logs >> task_choose_pipeline_mode
+task_choose_pipeline_mode >> [task_filter_data, task_fused_pipeline]
 task_filter_data >> [task_top_ctr, task_top_product] >> task_db_writing
+task_fused_pipeline >> task_db_writing
+task_db_writing >> [task_compute_stats, task_publish_snapshot]
 
@@ -0,0 +1,153 @@
+"""
+Lectura y escritura de los artefactos intermedios que se pasan entre tareas
+
+El formato de cada artefacto se deduce de la extensión de su key:
+'.parquet' (columnar, comprimido, formato por defecto) o '.csv' (compatibilidad).
+"""
+from io import BytesIO, TextIOWrapper
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from id_codes import ENCODED_ID_COLUMNS, encode_ids, read_csv_encoded
+
+ARTIFACT_FORMATS = ('parquet', 'csv')
+DEFAULT_ARTIFACT_FORMAT = 'parquet'
+PARQUET_COMPRESSION = 'zstd'
+
+
+def artifact_key(prefix, name, date, artifact_format=DEFAULT_ARTIFACT_FORMAT):
+    """Arma la key de un artefacto, p. ej. processed_data/top_ctr_2024-01-01.parquet"""
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(f"Formato de artefacto inválido: {artifact_format}. Opciones: {ARTIFACT_FORMATS}")
+    return f"{prefix}/{name}_{date}.{artifact_format}"
+
+
+def artifact_format_from_key(key):
+    """Devuelve el formato de un artefacto según su extensión"""
+    return 'parquet' if key.endswith('.parquet') else 'csv'
+
+
+def _apply_filters(df, filters):
+    """Aplica filtros estilo pyarrow [(columna, op, valor)] sobre un DataFrame (solo CSV)"""
+    for column, op, value in filters:
+        if op in ('==', '='):
+            df = df[df[column] == value]
+        elif op == 'in':
+            df = df[df[column].isin(value)]
+        else:
+            raise ValueError(f"Operador de filtro no soportado para CSV: {op}")
+    return df
+
+
+def read_artifact(storage, key, columns=None, filters=None, encoded_ids=False):
+    """
+    Lee un artefacto como DataFrame
+
+    Args:
+        storage: Backend de almacenamiento (ver storage.get_storage)
+        key: Key del artefacto
+        columns: Columnas a leer (en Parquet solo se leen esas columnas)
+        filters: Filtros [(columna, op, valor)]; en Parquet se empujan a los
+                 row groups y se descartan los que no pueden cumplirlos
+        encoded_ids: Leer las columnas de ID codificadas (advertiser_id y,
+                     con ENCODE_PRODUCT_IDS, product_id) como categóricos
+                     ordenados (ver id_codes.py)
+    """
+    if artifact_format_from_key(key) == 'parquet':
+        read_dictionary = [column for column in ENCODED_ID_COLUMNS if columns is None or column in columns]
+        df = pd.read_parquet(BytesIO(storage.read_bytes(key)), columns=columns, filters=filters,
+                             read_dictionary=read_dictionary if encoded_ids else None)
+    else:
+        read_csv = read_csv_encoded if encoded_ids else pd.read_csv
+        df = read_csv(storage.open_read(key), usecols=columns)
+        if filters:
+            df = _apply_filters(df, filters).reset_index(drop=True)
+    return encode_ids(df) if encoded_ids else df
+
+
+def write_artifact(storage, key, df):
+    """
+    Escribe un DataFrame en el formato indicado por la extensión de key
+
+    Se serializa directamente sobre storage.open_write (en S3, un multipart
+    upload con partes en paralelo), sin armar el archivo completo en memoria.
+    """
+    with storage.open_write(key) as writer:
+        if artifact_format_from_key(key) == 'parquet':
+            df.to_parquet(writer, index=False, compression=PARQUET_COMPRESSION)
+        else:
+            text = TextIOWrapper(writer, encoding='utf-8', newline='')
+            df.to_csv(text, index=False)
+            # Vacía el buffer de texto sin cerrar writer (lo cierra el with)
+            text.flush()
+            text.detach()
+
+
+def _widen_dictionaries(schema):
+    """
+    Usa índices int32 en las columnas diccionario (categóricos) de schema
+
+    Pandas elige el ancho de los códigos según la cantidad de categorías de
+    cada bloque; con int32 fijo todos los bloques entran en el mismo schema.
+    """
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(pa.dictionary(pa.int32(), field.type.value_type)))
+    return schema
+
+
+class ArtifactChunkWriter:
+    """
+    Escribe un artefacto bloque a bloque sobre storage.open_write (en S3, un multipart upload)
+
+    En Parquet cada bloque se escribe como un row group; en CSV el header
+    se escribe solo con el primer bloque. El schema Parquet se fija con
+    `schema`, con infer_schema() o, si no, con el primer bloque escrito.
+    """
+
+    def __init__(self, storage, key, schema=None):
+        self._format = artifact_format_from_key(key)
+        self._writer = storage.open_write(key)
+        self._schema = schema
+        self._parquet_writer = None
+        self._header_written = False
+
+    def infer_schema(self, df):
+        """Fija el schema Parquet a partir de df si todavía no fue fijado"""
+        if self._format == 'parquet' and self._schema is None:
+            self._schema = _widen_dictionaries(pa.Schema.from_pandas(df, preserve_index=False))
+
+    def write(self, df):
+        if self._format == 'parquet':
+            if self._schema is None:
+                self.infer_schema(df)
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            if self._parquet_writer is None:
+                self._schema = table.schema
+                self._parquet_writer = pq.ParquetWriter(self._writer, self._schema, compression=PARQUET_COMPRESSION)
+            self._parquet_writer.write_table(table)
+        else:
+            self._writer.write(df.to_csv(index=False, header=not self._header_written).encode('utf-8'))
+            self._header_written = True
+
+    def close(self):
+        if self._format == 'parquet' and self._parquet_writer is None and self._schema is not None:
+            # Sin bloques escritos: igual se genera un Parquet válido y vacío
+            self._parquet_writer = pq.ParquetWriter(self._writer, self._schema, compression=PARQUET_COMPRESSION)
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        self._writer.close()
+
+    def abort(self):
+        self._writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
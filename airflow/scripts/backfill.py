@@ -0,0 +1,198 @@
+"""
+Backfill: recalcula las recomendaciones de un rango de fechas leyendo los logs una sola vez
+
+En lugar de disparar una corrida del DAG por día (cada una descargando los
+logs crudos completos), lee los logs una vez, separa los eventos por día y,
+para cada día del rango, calcula ambos modelos, guarda sus resultados y los
+carga en bloque en la tabla recommendations (junto con las estadísticas del
+día en recommendation_stats).
+"""
+import time
+from datetime import timedelta
+from functools import partial
+
+import pandas as pd
+
+from artifacts import DEFAULT_ARTIFACT_FORMAT
+from compute_stats import store_stats
+from daily_aggregates import DEFAULT_WINDOW_DAYS, window_counts
+from db_writing import connect, load_recommendations
+from filter_data import iter_raw_log, read_active_advertisers
+from id_codes import encode_ids
+from raw_partitions import manifest_key, read_manifest
+from sharding import DEFAULT_WORKERS, map_advertiser_shards, sort_ranking
+from storage import get_storage
+from top_ctr import aggregate_ads, rank_top_ctr, save_top_ctr
+from top_k import DEFAULT_TOP_K, merge_counts
+from top_product import aggregate_views, rank_top_product, save_top_product
+
+
+def date_range(start_date, end_date):
+    """Lista de fechas YYYY-MM-DD entre start_date y end_date inclusive"""
+    start = pd.to_datetime(start_date).date()
+    end = pd.to_datetime(end_date).date()
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+def _aggregate_by_day(chunks, aggregate, dates, active_advertisers, workers=DEFAULT_WORKERS):
+    """
+    Agrega un log por día en una sola pasada
+
+    Returns:
+        Diccionario {fecha: conteos} con una entrada por cada fecha de dates
+    """
+    range_days = pd.to_datetime(dates)
+    counts = {}
+    empty = None
+    for chunk in chunks:
+        chunk = encode_ids(chunk, active_advertisers)
+        if empty is None:
+            empty = aggregate(chunk.iloc[:0])
+        days = pd.to_datetime(chunk['date']).dt.normalize()
+        in_range = days.isin(range_days) & chunk['advertiser_id'].notna()
+        chunk, days = chunk[in_range], days[in_range]
+        for day, events in chunk.groupby(days, sort=False):
+            day = day.strftime('%Y-%m-%d')
+            day_counts = map_advertiser_shards(events, aggregate, workers)
+            counts[day] = day_counts if day not in counts else merge_counts([counts[day], day_counts])
+
+    # Los días sin eventos quedan con conteos vacíos
+    return {day: counts.get(day, empty) for day in dates}
+
+
+def _iter_range(storage, input_prefix, log_name, dates, chunk_size, raw_layout):
+    """
+    Itera los bloques de un log que cubren dates: el log acumulado una vez, o cada partición diaria
+
+    En el layout particionado los días que no figuran en el manifest (sin
+    eventos) se saltean y quedan con conteos vacíos, como en el layout plano.
+    """
+    if raw_layout != 'partitioned':
+        yield from iter_raw_log(storage, input_prefix, log_name, dates[0], chunk_size, raw_layout)
+        return
+
+    manifest = read_manifest(storage, input_prefix, log_name)
+    if manifest is None:
+        raise FileNotFoundError(
+            f"No existe {manifest_key(input_prefix, log_name)}: ejecutar raw_partitions.py primero"
+        )
+    present = [day for day in dates if day in manifest['partitions']]
+    if not present:
+        # Un bloque vacío con las columnas del log, para que los conteos vacíos tengan schema
+        yield pd.DataFrame({column: pd.Series(dtype=str) for column in manifest['columns']})
+        return
+    for day in present:
+        yield from iter_raw_log(storage, input_prefix, log_name, day, chunk_size, raw_layout)
+
+
+def backfill(s3_bucket, input_prefix, output_prefix, advertiser_ids_file, start_date, end_date, db_config=None,
+             chunk_size=None, artifact_format=DEFAULT_ARTIFACT_FORMAT, raw_layout='flat', top_k=DEFAULT_TOP_K,
+             window_days=DEFAULT_WINDOW_DAYS, workers=DEFAULT_WORKERS):
+    """
+    Recalcula TopCTR y TopProduct para cada día de [start_date, end_date]
+
+    Args:
+        s3_bucket: Nombre del bucket de S3 (o file:///ruta para usar un directorio local)
+        input_prefix: Prefijo donde están los datos crudos
+        output_prefix: Prefijo donde guardar los resultados
+        advertiser_ids_file: Archivo con la lista de advertisers activos
+        start_date: Primer día del rango (YYYY-MM-DD)
+        end_date: Último día del rango (YYYY-MM-DD, inclusive)
+        db_config: Configuración de la base (ver db_writing.write_to_db); si es
+                   None solo se escriben los archivos de resultados
+        chunk_size: Si se indica, lee los logs en bloques de chunk_size filas
+        artifact_format: Formato de los archivos de resultados ('parquet' o 'csv')
+        raw_layout: 'flat' o 'partitioned' (ver filter_data.py)
+        top_k: Cantidad de productos a recomendar por advertiser
+        window_days: Días de la ventana a rankear (ver daily_aggregates.py)
+        workers: Procesos en paralelo por hash de advertiser_id (ver sharding.py)
+
+    Returns:
+        Diccionario con el tiempo de lectura, el total y las filas y segundos por día
+    """
+    start = time.perf_counter()
+    storage = get_storage(s3_bucket)
+    dates = date_range(start_date, end_date)
+    active_advertisers = read_active_advertisers(storage, advertiser_ids_file)
+
+    # Una sola lectura de cada log para todo el rango
+    print(f"Backfill {dates[0]} -> {dates[-1]} ({len(dates)} días): leyendo logs crudos...")
+    view_counts_by_day = _aggregate_by_day(
+        _iter_range(storage, input_prefix, 'product_views', dates, chunk_size, raw_layout),
+        aggregate_views, dates, active_advertisers, workers
+    )
+    ctr_counts_by_day = _aggregate_by_day(
+        _iter_range(storage, input_prefix, 'ads_views', dates, chunk_size, raw_layout),
+        aggregate_ads, dates, active_advertisers, workers
+    )
+    read_seconds = time.perf_counter() - start
+    print(f"Logs leídos y agregados en {read_seconds:.2f}s")
+
+    conn = connect(db_config) if db_config else None
+    days = []
+    try:
+        for i, day in enumerate(dates, start=1):
+            day_start = time.perf_counter()
+
+            # En orden cronológico, así la ventana de cada día ya tiene guardados los anteriores
+            view_counts = window_counts(storage, output_prefix, 'views', day, view_counts_by_day[day], window_days, active_advertisers)
+            ctr_counts = window_counts(storage, output_prefix, 'ads', day, ctr_counts_by_day[day], window_days, active_advertisers)
+            df_top_ctr = sort_ranking(
+                map_advertiser_shards(ctr_counts, partial(rank_top_ctr, date=day, top_k=top_k), workers)
+            )
+            df_top_product = sort_ranking(
+                map_advertiser_shards(view_counts, partial(rank_top_product, date=day, top_k=top_k), workers)
+            )
+            save_top_ctr(storage, df_top_ctr, output_prefix, day, artifact_format)
+            save_top_product(storage, df_top_product, output_prefix, day, artifact_format)
+
+            df_day = pd.concat([df_top_ctr, df_top_product], ignore_index=True)
+            if conn is not None and not df_day.empty:
+                with conn.cursor() as cursor:
+                    load_recommendations(cursor, df_day, day)
+                conn.commit()
+                # En su propia transacción, como ComputeStats en el DAG: leer
+                # recommendations antes del commit alargaría el lock del intercambio
+                with conn.cursor() as cursor:
+                    store_stats(cursor, day)
+                conn.commit()
+
+            seconds = time.perf_counter() - day_start
+            days.append({
+                'date': day,
+                'top_ctr_rows': len(df_top_ctr),
+                'top_product_rows': len(df_top_product),
+                'seconds': round(seconds, 3),
+            })
+            print(f"[{i}/{len(dates)}] {day}: TopCTR {len(df_top_ctr)} filas, "
+                  f"TopProduct {len(df_top_product)} filas ({seconds:.2f}s)")
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"Error en el backfill: {e}")
+        raise
+    finally:
+        if conn is not None:
+            conn.close()
+
+    total_seconds = time.perf_counter() - start
+    print(f"Backfill terminado: {len(dates)} días en {total_seconds:.2f}s")
+    return {
+        'read_seconds': round(read_seconds, 3),
+        'total_seconds': round(total_seconds, 3),
+        'days': days,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    if len(sys.argv) not in (7, 8, 9):
+        print("Uso: python backfill.py <s3_bucket> <input_prefix> <output_prefix> <advertiser_ids_file> "
+              "<start_date> <end_date> [db_config_json] [chunk_size]")
+        sys.exit(1)
+
+    db_config = json.loads(sys.argv[7]) if len(sys.argv) > 7 and sys.argv[7] else None
+    chunk_size = int(sys.argv[8]) if len(sys.argv) > 8 else None
+    backfill(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], db_config, chunk_size)
@@ -0,0 +1,62 @@
+"""
+Tarea ComputeStats: precalcula las estadísticas de /stats/ para la fecha cargada
+
+Corre después de DBWriting y guarda en recommendation_stats la respuesta de
+/stats/ de esa fecha (calculada por la función SQL
+compute_recommendation_stats, ver database/schema.sql). Así la API responde
+/stats/ con una sola búsqueda por clave en lugar de recorrer recommendations
+en cada request.
+"""
+import time
+
+from db_writing import connect
+
+
+def store_stats(cursor, date):
+    """Calcula y guarda (o reemplaza) las estadísticas de date; no hace commit"""
+    cursor.execute("""
+        INSERT INTO recommendation_stats (date, payload)
+        VALUES (%s, compute_recommendation_stats(%s))
+        ON CONFLICT (date) DO UPDATE
+            SET payload = EXCLUDED.payload, computed_at = CURRENT_TIMESTAMP
+    """, (date, date))
+
+
+def compute_stats(db_config, date):
+    """
+    Precalcula las estadísticas de /stats/ de una fecha
+
+    Args:
+        db_config: Configuración de la base (ver db_writing.write_to_db)
+        date: Fecha cargada por DBWriting (YYYY-MM-DD)
+
+    Returns:
+        Diccionario con la fecha y los segundos que tomó el cálculo
+    """
+    conn = connect(db_config)
+    cursor = conn.cursor()
+    try:
+        start = time.perf_counter()
+        store_stats(cursor, date)
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        print(f"Estadísticas de {date} guardadas en recommendation_stats en {elapsed:.2f}s")
+        return {'date': date, 'seconds': round(elapsed, 3)}
+    except Exception as e:
+        conn.rollback()
+        print(f"Error calculando estadísticas: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    if len(sys.argv) != 3:
+        print("Uso: python compute_stats.py <db_config_json> <date>")
+        sys.exit(1)
+
+    compute_stats(json.loads(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,79 @@
+"""
+Almacén incremental de conteos diarios por (advertiser_id, product_id, date)
+
+Cada corrida guarda los conteos del día que procesó:
+
+    {output_prefix}/aggregates/ads/date=YYYY-MM-DD.parquet    (clicks, impressions)
+    {output_prefix}/aggregates/views/date=YYYY-MM-DD.parquet  (view_count)
+
+Los modelos con ventana de N días suman los conteos guardados de los
+últimos N días en lugar de volver a leer los logs crudos, así cada corrida
+diaria solo procesa los eventos de un día nuevo. Los conteos guardados se
+filtraron con los advertisers activos de su día; la suma de la ventana se
+vuelve a filtrar con los activos de hoy, así un advertiser desactivado deja
+de recibir recomendaciones en la primera corrida sin él.
+"""
+from datetime import timedelta
+
+import pandas as pd
+
+from artifacts import read_artifact, write_artifact
+from id_codes import encode_ids
+from top_k import merge_counts
+
+AGGREGATE_KINDS = ('ads', 'views')
+DEFAULT_WINDOW_DAYS = 1
+
+
+def daily_counts_key(output_prefix, kind, date):
+    return f"{output_prefix}/aggregates/{kind}/date={date}.parquet"
+
+
+def save_daily_counts(storage, output_prefix, kind, date, counts):
+    """Guarda los conteos de un día (reemplaza los existentes para esa fecha)"""
+    key = daily_counts_key(output_prefix, kind, date)
+    write_artifact(storage, key, counts.assign(date=date))
+    return key
+
+
+def load_window_counts(storage, output_prefix, kind, date, window_days):
+    """
+    Suma los conteos guardados de los window_days días que terminan en date
+
+    Los días sin conteos guardados se omiten (con un aviso).
+
+    Returns:
+        DataFrame con una fila por (advertiser_id, product_id) y los conteos sumados
+    """
+    end = pd.to_datetime(date).date()
+    frames = []
+    for offset in range(window_days):
+        day = (end - timedelta(days=offset)).isoformat()
+        key = daily_counts_key(output_prefix, kind, day)
+        if not storage.exists(key):
+            print(f"Aviso: no hay conteos {kind} guardados para {day}, se omite de la ventana")
+            continue
+        frames.append(read_artifact(storage, key, encoded_ids=True).drop(columns=['date']))
+    return merge_counts(frames)
+
+
+def window_counts(storage, output_prefix, kind, date, counts, window_days=DEFAULT_WINDOW_DAYS,
+                  active_advertisers=None):
+    """
+    Guarda los conteos del día y devuelve los conteos de la ventana que termina en date
+
+    Con window_days=1 devuelve counts sin releer nada (ya vienen filtrados).
+
+    Args:
+        active_advertisers: Index ordenado de los advertisers activos hoy (ver
+                            filter_data.read_active_advertisers); si se indica,
+                            se descartan de la ventana los demás advertisers
+    """
+    save_daily_counts(storage, output_prefix, kind, date, counts)
+    if window_days <= 1:
+        return counts
+    window = load_window_counts(storage, output_prefix, kind, date, window_days)
+    if active_advertisers is None:
+        return window
+    window = encode_ids(window, active_advertisers)
+    return window[window['advertiser_id'].notna()].reset_index(drop=True)
@@ -0,0 +1,151 @@
+"""
+Particiones diarias de la tabla recommendations
+
+recommendations está particionada por rango de date (ver database/schema.sql)
+con una partición por día llamada recommendations_pYYYYMMDD. DBWriting carga
+cada día en una tabla nueva y la intercambia por la partición del día en la
+misma transacción, en lugar de DELETE + INSERT sobre una tabla única; la
+retención borra particiones enteras en lugar de filas. Nada de esto hace
+commit: la transacción es del llamador.
+
+DETACH PARTITION y DROP TABLE de una partición toman ACCESS EXCLUSIVE sobre
+recommendations hasta el commit: mientras tanto la API no puede leer, y si
+hay lecturas abiertas el DETACH las espera. Por eso el llamador los deja
+como últimos pasos antes del commit y antes fija un lock_timeout (ver
+set_lock_timeout), así una sesión colgada hace fallar la carga en lugar de
+frenarla indefinidamente.
+"""
+import re
+from datetime import date as Date, datetime, timedelta
+
+PARENT_TABLE = 'recommendations'
+PARTITION_PREFIX = f'{PARENT_TABLE}_p'
+PARTITION_PATTERN = re.compile(rf'^{PARTITION_PREFIX}(\d{{8}})$')
+
+# Espera máxima por los locks del intercambio de particiones (sintaxis de Postgres: '5s', '500ms')
+DEFAULT_LOCK_TIMEOUT = '5s'
+
+
+def _as_date(day):
+    if isinstance(day, datetime):
+        return day.date()
+    if isinstance(day, Date):
+        return day
+    return datetime.strptime(str(day), '%Y-%m-%d').date()
+
+
+def partition_name(day):
+    """Nombre de la partición de un día (recommendations_pYYYYMMDD)"""
+    return f"{PARTITION_PREFIX}{_as_date(day):%Y%m%d}"
+
+
+def partition_bounds(day):
+    """Límites [desde, hasta) de la partición de un día"""
+    day = _as_date(day)
+    return day, day + timedelta(days=1)
+
+
+def partition_exists(cursor, day):
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass AND c.relname = %s
+        )
+    """, (PARENT_TABLE, partition_name(day)))
+    return cursor.fetchone()[0]
+
+
+def ensure_partition(cursor, day):
+    """Crea la partición de un día si no existe"""
+    start, end = partition_bounds(day)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(day)}
+        PARTITION OF {PARENT_TABLE} FOR VALUES FROM ('{start}') TO ('{end}')
+    """)
+
+
+def set_lock_timeout(cursor, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+    """Fija lock_timeout hasta el final de la transacción (SET LOCAL)"""
+    cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+
+
+def create_load_table(cursor, day):
+    """
+    Crea la tabla (todavía sin adjuntar) donde se carga un día
+
+    Tiene las columnas y defaults de recommendations y un CHECK con los
+    límites de la partición, así ATTACH PARTITION no necesita recorrerla.
+
+    Returns:
+        Nombre de la tabla
+    """
+    start, end = partition_bounds(day)
+    load_table = f"{partition_name(day)}_load"
+    cursor.execute(f"DROP TABLE IF EXISTS {load_table}")
+    cursor.execute(f"""
+        CREATE TABLE {load_table} (
+            LIKE {PARENT_TABLE} INCLUDING DEFAULTS,
+            CONSTRAINT {load_table}_date_check CHECK (date >= '{start}' AND date < '{end}')
+        )
+    """)
+    return load_table
+
+
+def replace_partition(cursor, day, load_table):
+    """
+    Reemplaza la partición de un día por load_table
+
+    Desadjunta y borra la partición anterior (si existe), renombra load_table
+    y la adjunta. Los índices de recommendations se crean en la partición al
+    adjuntarla. Toma ACCESS EXCLUSIVE sobre recommendations: debe ser lo
+    último antes del commit.
+    """
+    name = partition_name(day)
+    start, end = partition_bounds(day)
+    if partition_exists(cursor, day):
+        cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
+    cursor.execute(f"ALTER TABLE {load_table} RENAME TO {name}")
+    cursor.execute(f"""
+        ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name}
+        FOR VALUES FROM ('{start}') TO ('{end}')
+    """)
+    cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {load_table}_date_check")
+
+
+def list_partitions(cursor):
+    """Devuelve [(fecha, nombre)] de las particiones diarias, ordenadas por fecha"""
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (PARENT_TABLE,))
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((datetime.strptime(match.group(1), '%Y%m%d').date(), name))
+    return sorted(partitions)
+
+
+def drop_partitions_before(cursor, cutoff):
+    """
+    Borra las particiones de los días anteriores a cutoff
+
+    También borra esos días de recommendation_history y los punteros de
+    latest_recommendations que apuntan a ellos (advertisers sin
+    recomendaciones dentro de la retención). Los DROP van al final porque
+    toman ACCESS EXCLUSIVE sobre recommendations (ver replace_partition).
+
+    Returns:
+        Lista con las fechas de las particiones borradas
+    """
+    cutoff = _as_date(cutoff)
+    expired = [(day, name) for day, name in list_partitions(cursor) if day < cutoff]
+    if expired:
+        cursor.execute("DELETE FROM latest_recommendations WHERE date < %s", (cutoff,))
+        cursor.execute("DELETE FROM recommendation_history WHERE date < %s", (cutoff,))
+    for day, name in expired:
+        cursor.execute(f"DROP TABLE {name}")
+    return [day for day, _ in expired]
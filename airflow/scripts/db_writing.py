@@ -2,109 +2,341 @@
 Tarea DBWriting: Escribe los resultados de los modelos en PostgreSQL
 """
 import pandas as pd
-import boto3
 import psycopg2
-from io import StringIO
 import os
+import time
+from datetime import datetime, timedelta
 
+from artifacts import read_artifact
+from db_partitions import (
+    DEFAULT_LOCK_TIMEOUT,
+    PARENT_TABLE,
+    create_load_table,
+    drop_partitions_before,
+    ensure_partition,
+    partition_exists,
+    partition_name,
+    replace_partition,
+    set_lock_timeout,
+)
+from instrumentation import count_rows, phase
+from storage import get_storage
 
-def write_to_db(s3_bucket, top_ctr_file, top_product_file, db_config, date):
+RECOMMENDATION_COLUMNS = ['advertiser_id', 'model_name', 'product_id', 'rank_position', 'score', 'date']
+LOAD_METHODS = ('copy', 'insert')
+DEFAULT_LOAD_METHOD = 'copy'
+
+# Filas por bloque al generar el CSV que se envía con COPY
+COPY_BLOCK_ROWS = 100_000
+
+
+def connect(db_config):
     """
-    Escribe los resultados de ambos modelos en la base de datos PostgreSQL
-    
-    Args:
-        s3_bucket: Nombre del bucket de S3
-        top_ctr_file: Archivo con resultados de TopCTR
-        top_product_file: Archivo con resultados de TopProduct
-        db_config: Diccionario con configuración de la base de datos
-                   {'host': ..., 'port': ..., 'database': ..., 'user': ..., 'password': ...}
-        date: Fecha del día procesado
+    Abre una conexión a PostgreSQL a partir de db_config
+
+    Usa sslmode='require' (necesario para RDS) salvo que db_config indique otro sslmode.
     """
-    s3_client = boto3.client('s3')
-    
-    # Conectar a la base de datos
-    # Agregar sslmode='require' para conexiones a RDS
-    conn = psycopg2.connect(
+    return psycopg2.connect(
         host=db_config['host'],
         port=db_config['port'],
         database=db_config['database'],
         user=db_config['user'],
         password=db_config['password'],
-        sslmode='require'
+        sslmode=db_config.get('sslmode', 'require')
     )
-    cursor = conn.cursor()
-    
-    try:
-        # Leer y escribir TopCTR
+
+
+class _DataFrameCsvStream:
+    """
+    Archivo de solo lectura que genera el CSV de un DataFrame de a bloques
+
+    copy_expert lee el archivo de a pedazos, así nunca se arma en memoria
+    el CSV completo de todas las filas.
+    """
+
+    def __init__(self, df, block_rows=COPY_BLOCK_ROWS):
+        self._df = df
+        self._block_rows = block_rows
+        self._next_row = 0
+        self._pending = b''
+
+    def read(self, size=-1):
+        while (size < 0 or len(self._pending) < size) and self._next_row < len(self._df):
+            block = self._df.iloc[self._next_row:self._next_row + self._block_rows]
+            self._pending += block.to_csv(index=False, header=False).encode('utf-8')
+            self._next_row += self._block_rows
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def stage_recommendations(cursor, df, date):
+    """
+    Carga recomendaciones en bloque con COPY en la tabla nueva del día, sin adjuntarla
+
+    Hace COPY FROM STDIN de todas las filas a una tabla nueva con la forma de
+    recommendations, le agrega las filas del día de los modelos que no están
+    en df y actualiza latest_recommendations y recommendation_history a
+    partir de esa tabla. Solo toma locks de filas: falta intercambiarla por
+    la partición del día (db_partitions.replace_partition). No hace commit.
+
+    Returns:
+        Nombre de la tabla cargada
+    """
+    load_table = create_load_table(cursor, date)
+    cursor.copy_expert(
+        f"COPY {load_table} ({', '.join(RECOMMENDATION_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+        _DataFrameCsvStream(df[RECOMMENDATION_COLUMNS])
+    )
+
+    models = sorted(df['model_name'].unique().tolist())
+    if partition_exists(cursor, date):
+        # Conservar las recomendaciones del día de los modelos que no se recargan
+        cursor.execute(f"""
+            INSERT INTO {load_table}
+            SELECT * FROM {partition_name(date)}
+            WHERE NOT (model_name = ANY(%s))
+        """, (models,))
+    update_latest_recommendations(cursor, date, models, source=load_table)
+    update_recommendation_history(cursor, date, models, source=load_table)
+    return load_table
+
+
+def load_recommendations(cursor, df, date, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+    """
+    Carga recomendaciones en bloque con COPY y reemplaza la partición del día
+
+    Prepara la tabla del día y los punteros con stage_recommendations y
+    termina con el intercambio de particiones, que toma ACCESS EXCLUSIVE
+    sobre recommendations: el llamador debe hacer commit enseguida, sin
+    ejecutar nada más en la transacción. No hace commit.
+
+    Args:
+        cursor: Cursor de psycopg2
+        df: DataFrame con las columnas de RECOMMENDATION_COLUMNS
+        date: Fecha del día cargado
+        lock_timeout: Espera máxima por los locks del intercambio (ver db_partitions.py)
+
+    Returns:
+        Cantidad de filas cargadas
+    """
+    load_table = stage_recommendations(cursor, df, date)
+    set_lock_timeout(cursor, lock_timeout)
+    replace_partition(cursor, date, load_table)
+    return len(df)
+
+
+def update_latest_recommendations(cursor, date, models, source=PARENT_TABLE):
+    """
+    Actualiza latest_recommendations después de cargar date para los modelos indicados
+
+    Los pares (advertiser, modelo) cargados en date avanzan su puntero si date
+    es más reciente (un backfill de días viejos no lo hace retroceder). Los
+    que apuntaban a date y ya no tienen filas ese día (una recarga sin ese
+    advertiser) vuelven a su fecha anterior, o se borran si no les queda
+    ninguna. No hace commit.
+
+    Args:
+        source: Tabla con las filas de date (recommendations o la tabla de
+                carga todavía sin adjuntar)
+    """
+    cursor.execute(f"""
+        INSERT INTO latest_recommendations (advertiser_id, model_name, date)
+        SELECT DISTINCT advertiser_id, model_name, date
+        FROM {source}
+        WHERE date = %s AND model_name = ANY(%s)
+        ON CONFLICT (advertiser_id, model_name) DO UPDATE
+            SET date = EXCLUDED.date
+            WHERE latest_recommendations.date < EXCLUDED.date
+    """, (date, models))
+
+    cursor.execute(f"""
+        DELETE FROM latest_recommendations l
+        WHERE l.date = %s AND l.model_name = ANY(%s)
+            AND NOT EXISTS (
+                SELECT 1 FROM {source} r
+                WHERE r.advertiser_id = l.advertiser_id
+                    AND r.model_name = l.model_name
+                    AND r.date = l.date
+            )
+        RETURNING l.advertiser_id, l.model_name
+    """, (date, models))
+    stale = cursor.fetchall()
+    if stale:
+        cursor.execute("""
+            INSERT INTO latest_recommendations (advertiser_id, model_name, date)
+            SELECT r.advertiser_id, r.model_name, MAX(r.date)
+            FROM recommendations r
+            JOIN UNNEST(%s::varchar[], %s::varchar[]) AS s(advertiser_id, model_name)
+                ON r.advertiser_id = s.advertiser_id AND r.model_name = s.model_name
+            WHERE r.date <> %s
+            GROUP BY r.advertiser_id, r.model_name
+        """, ([advertiser_id for advertiser_id, _ in stale], [model_name for _, model_name in stale], date))
+
+
+def update_recommendation_history(cursor, date, models, source=PARENT_TABLE):
+    """
+    Reescribe en recommendation_history las filas de date de los modelos indicados
+
+    Agrupa las recomendaciones del día de source (ver
+    update_latest_recommendations) en una fila por (advertiser, modelo) con
+    los productos, posiciones y scores ordenados por ranking. No hace commit.
+    """
+    cursor.execute("""
+        DELETE FROM recommendation_history
+        WHERE date = %s AND model_name = ANY(%s)
+    """, (date, models))
+    cursor.execute(f"""
+        INSERT INTO recommendation_history
+            (advertiser_id, date, model_name, product_ids, rank_positions, scores)
+        SELECT advertiser_id, date, model_name,
+            array_agg(product_id ORDER BY rank_position),
+            array_agg(rank_position ORDER BY rank_position),
+            array_agg(score ORDER BY rank_position)
+        FROM {source}
+        WHERE date = %s AND model_name = ANY(%s)
+        GROUP BY advertiser_id, date, model_name
+    """, (date, models))
+
+
+def insert_recommendations(cursor, df, model_name, date):
+    """
+    Carga las recomendaciones de un modelo fila por fila (método original)
+
+    Borra las recomendaciones del día del modelo y ejecuta un INSERT ... ON
+    CONFLICT por fila. Se mantiene como alternativa a load_recommendations.
+
+    Returns:
+        Cantidad de filas cargadas
+    """
+    ensure_partition(cursor, date)
+
+    # Eliminar registros del día si existen (para evitar duplicados)
+    delete_query = """
+        DELETE FROM recommendations
+        WHERE date = %s AND model_name = %s
+    """
+    cursor.execute(delete_query, (date, model_name))
+
+    # Insertar nuevos registros
+    insert_query = """
+        INSERT INTO recommendations
+        (advertiser_id, model_name, product_id, rank_position, score, date)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (advertiser_id, model_name, product_id, date)
+        DO UPDATE SET rank_position = EXCLUDED.rank_position, score = EXCLUDED.score
+    """
+
+    for _, row in df.iterrows():
+        cursor.execute(insert_query, (
+            row['advertiser_id'],
+            row['model_name'],
+            row['product_id'],
+            int(row['rank_position']),
+            float(row['score']),
+            row['date']
+        ))
+    update_latest_recommendations(cursor, date, [model_name])
+    update_recommendation_history(cursor, date, [model_name])
+    return len(df)
+
+
+def write_to_db(s3_bucket, top_ctr_file, top_product_file, db_config, date, method=DEFAULT_LOAD_METHOD,
+                retention_days=None, lock_timeout=DEFAULT_LOCK_TIMEOUT):
+    """
+    Escribe los resultados de ambos modelos en la base de datos PostgreSQL
+
+    Args:
+        s3_bucket: Nombre del bucket de S3 (o file:///ruta para usar un directorio local)
+        top_ctr_file: Archivo con resultados de TopCTR (Parquet o CSV según su extensión)
+        top_product_file: Archivo con resultados de TopProduct (Parquet o CSV según su extensión)
+        db_config: Diccionario con configuración de la base de datos
+                   {'host': ..., 'port': ..., 'database': ..., 'user': ..., 'password': ...}
+        date: Fecha del día procesado
+        method: 'copy' (COPY a una tabla nueva + reemplazo de la partición del
+                día) o 'insert' (un INSERT por fila, método original)
+        retention_days: Si se indica, en la misma transacción borra las
+                        particiones de los días anteriores a date - retention_days
+        lock_timeout: Espera máxima por los locks del intercambio y el borrado de
+                      particiones; si se agota la transacción se deshace
+                      (ver db_partitions.py)
+
+    Returns:
+        Diccionario con filas cargadas, tiempo total, filas por segundo y
+        particiones borradas por la retención
+    """
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Método de carga inválido: {method}. Opciones: {LOAD_METHODS}")
+
+    storage = get_storage(s3_bucket)
+
+    # Leer resultados de los modelos
+    frames = {}
+    with phase('read'):
         if top_ctr_file:
-            response = s3_client.get_object(Bucket=s3_bucket, Key=top_ctr_file)
-            df_top_ctr = pd.read_csv(response['Body'])
-            
-            # Eliminar registros del día si existen (para evitar duplicados)
-            delete_query = """
-                DELETE FROM recommendations 
-                WHERE date = %s AND model_name = 'TopCTR'
-            """
-            cursor.execute(delete_query, (date,))
-            
-            # Insertar nuevos registros
-            insert_query = """
-                INSERT INTO recommendations 
-                (advertiser_id, model_name, product_id, rank_position, score, date)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (advertiser_id, model_name, product_id, date) 
-                DO UPDATE SET rank_position = EXCLUDED.rank_position, score = EXCLUDED.score
-            """
-            
-            for _, row in df_top_ctr.iterrows():
-                cursor.execute(insert_query, (
-                    row['advertiser_id'],
-                    row['model_name'],
-                    row['product_id'],
-                    int(row['rank_position']),
-                    float(row['score']),
-                    row['date']
-                ))
-            
-            print(f"TopCTR: {len(df_top_ctr)} registros escritos en la base de datos")
-        
-        # Leer y escribir TopProduct
+            frames['TopCTR'] = read_artifact(storage, top_ctr_file)
         if top_product_file:
-            response = s3_client.get_object(Bucket=s3_bucket, Key=top_product_file)
-            df_top_product = pd.read_csv(response['Body'])
-            
-            # Eliminar registros del día si existen
-            delete_query = """
-                DELETE FROM recommendations 
-                WHERE date = %s AND model_name = 'TopProduct'
-            """
-            cursor.execute(delete_query, (date,))
-            
-            # Insertar nuevos registros
-            insert_query = """
-                INSERT INTO recommendations 
-                (advertiser_id, model_name, product_id, rank_position, score, date)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (advertiser_id, model_name, product_id, date) 
-                DO UPDATE SET rank_position = EXCLUDED.rank_position, score = EXCLUDED.score
-            """
-            
-            for _, row in df_top_product.iterrows():
-                cursor.execute(insert_query, (
-                    row['advertiser_id'],
-                    row['model_name'],
-                    row['product_id'],
-                    int(row['rank_position']),
-                    float(row['score']),
-                    row['date']
-                ))
-            
-            print(f"TopProduct: {len(df_top_product)} registros escritos en la base de datos")
-        
+            frames['TopProduct'] = read_artifact(storage, top_product_file)
+    for model_name, df in frames.items():
+        count_rows(f'{model_name}_in', len(df))
+
+    conn = connect(db_config)
+    cursor = conn.cursor()
+
+    try:
+        start = time.perf_counter()
+        total_rows = 0
+
+        load_table = None
+        with phase('load'):
+            if method == 'copy' and frames:
+                df = pd.concat(frames.values(), ignore_index=True)
+                load_table = stage_recommendations(cursor, df, date)
+                total_rows = len(df)
+            else:
+                for model_name, df in frames.items():
+                    total_rows += insert_recommendations(cursor, df, model_name, date)
+
+        # Borrar particiones viejas e intercambiar la del día toman ACCESS
+        # EXCLUSIVE sobre recommendations: van al final, justo antes del commit
+        set_lock_timeout(cursor, lock_timeout)
+        dropped = []
+        if retention_days:
+            cutoff = datetime.strptime(str(date), '%Y-%m-%d').date() - timedelta(days=retention_days)
+            with phase('retention'):
+                dropped = drop_partitions_before(cursor, cutoff)
+        if load_table:
+            with phase('swap'):
+                replace_partition(cursor, date, load_table)
+        count_rows('recommendations_out', total_rows)
+
         # Confirmar transacción
-        conn.commit()
-        print("Datos escritos exitosamente en la base de datos")
-        
+        with phase('commit'):
+            conn.commit()
+        elapsed = time.perf_counter() - start
+
+        for model_name, df in frames.items():
+            print(f"{model_name}: {len(df)} registros escritos en la base de datos")
+        if dropped:
+            print(f"Retención de {retention_days} días: {len(dropped)} particiones borradas "
+                  f"({dropped[0]} a {dropped[-1]})")
+        rows_per_second = total_rows / elapsed if elapsed > 0 else 0.0
+        print(f"Datos escritos exitosamente en la base de datos: {total_rows} registros en {elapsed:.2f}s "
+              f"({rows_per_second:,.0f} filas/s, método {method})")
+        return {
+            'method': method,
+            'rows': total_rows,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows_per_second, 1),
+            'dropped_partitions': [str(day) for day in dropped],
+        }
+
+    except psycopg2.errors.LockNotAvailable:
+        conn.rollback()
+        print(f"Error escribiendo en la base de datos: no se obtuvo el lock de recommendations en "
+              f"{lock_timeout} (hay transacciones abiertas leyendo la tabla); no se cargó nada")
+        raise
     except Exception as e:
         conn.rollback()
         print(f"Error escribiendo en la base de datos: {e}")
@@ -117,13 +349,16 @@ def write_to_db(s3_bucket, top_ctr_file, top_product_file, db_config, date):
 if __name__ == "__main__":
     import sys
     import json
-    
-    if len(sys.argv) != 5:
-        print("Uso: python db_writing.py <s3_bucket> <top_ctr_file> <top_product_file> <db_config_json>")
+
+    if len(sys.argv) not in (6, 7, 8, 9):
+        print("Uso: python db_writing.py <s3_bucket> <top_ctr_file> <top_product_file> <db_config_json> <date> "
+              "[method] [retention_days] [lock_timeout]")
         sys.exit(1)
-    
+
     db_config = json.loads(sys.argv[4])
-    date = sys.argv[5] if len(sys.argv) > 5 else None
-    
-    write_to_db(sys.argv[1], sys.argv[2], sys.argv[3], db_config, date)
+    date = sys.argv[5]
+    method = sys.argv[6] if len(sys.argv) > 6 else DEFAULT_LOAD_METHOD
+    retention_days = int(sys.argv[7]) if len(sys.argv) > 7 and sys.argv[7] else None
+    lock_timeout = sys.argv[8] if len(sys.argv) > 8 else DEFAULT_LOCK_TIMEOUT
 
+    write_to_db(sys.argv[1], sys.argv[2], sys.argv[3], db_config, date, method, retention_days, lock_timeout)
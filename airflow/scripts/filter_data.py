@@ -2,86 +2,156 @@
 Tarea FiltrarDatos: Filtra los logs para mantener solo advertisers activos
 """
 import pandas as pd
-import boto3
-from io import StringIO
 import os
 
+from artifacts import DEFAULT_ARTIFACT_FORMAT, ArtifactChunkWriter, artifact_key, write_artifact
+from id_codes import concat_encoded, encode_ids, read_csv_encoded
+from instrumentation import count_rows, phase, timed_iter
+from raw_partitions import iter_partition_chunks
+from storage import get_storage
 
-def filter_data(s3_bucket, input_prefix, output_prefix, advertiser_ids_file, date):
+
+def read_active_advertisers(storage, advertiser_ids_file):
+    """Lee la lista de advertisers activos como un Index ordenado (las categorías de advertiser_id)"""
+    active_advertisers_df = pd.read_csv(storage.open_read(advertiser_ids_file), dtype={'advertiser_id': str})
+    return pd.Index(active_advertisers_df['advertiser_id'].unique()).sort_values()
+
+
+def filter_chunk(df, target_date, active_advertisers):
+    """
+    Filtra un DataFrame de logs por fecha y advertisers activos
+
+    Devuelve los IDs codificados (ver id_codes.py): los advertisers que no
+    están en active_advertisers quedan como NaN y se descartan.
+    """
+    df['date'] = pd.to_datetime(df['date'])
+    df = encode_ids(df, active_advertisers)
+    return df[
+        (df['date'].dt.date == target_date) &
+        (df['advertiser_id'].notna())
+    ]
+
+
+def iter_raw_log(storage, input_prefix, log_name, date, chunk_size=None, raw_layout='flat'):
+    """
+    Itera un log crudo en bloques de DataFrame
+
+    Con raw_layout='flat' lee el objeto acumulado {input_prefix}/{log_name}
+    (completo o en bloques de chunk_size filas); con 'partitioned' lee solo
+    las particiones de date (ver raw_partitions.py). advertiser_id (y
+    product_id con ENCODE_PRODUCT_IDS) se leen como categóricos (ver id_codes.py).
+    """
+    if raw_layout == 'partitioned':
+        yield from iter_partition_chunks(storage, input_prefix, log_name, date, chunk_size)
+        return
+
+    body = storage.open_read(f"{input_prefix}/{log_name}")
+    if chunk_size:
+        yield from read_csv_encoded(body, chunksize=chunk_size)
+    else:
+        yield read_csv_encoded(body)
+
+
+def _filter_log(storage, log_name, chunks, output_key, target_date, active_advertisers, chunk_size=None):
+    """
+    Filtra un log crudo y guarda el resultado en output_key
+
+    Sin chunk_size junta el log completo en memoria. Con chunk_size procesa
+    bloques de chunk_size filas y sube la salida por partes, así la memoria
+    queda acotada por el tamaño del bloque. El formato de salida (Parquet o
+    CSV) se deduce de la extensión de output_key. Registra las filas de
+    entrada y salida como {log_name}_in y {log_name}_out (ver instrumentation.py).
+
+    Returns:
+        Cantidad de registros escritos
+    """
+    chunks = timed_iter(chunks, 'read', rows=f'{log_name}_in')
+    if not chunk_size:
+        df = concat_encoded(chunks)
+        with phase('filter'):
+            df_filtered = filter_chunk(df, target_date, active_advertisers)
+        with phase('write'):
+            write_artifact(storage, output_key, df_filtered)
+        count_rows(f'{log_name}_out', len(df_filtered))
+        return len(df_filtered)
+
+    total_rows = 0
+    with ArtifactChunkWriter(storage, output_key) as writer:
+        for chunk in chunks:
+            with phase('filter'):
+                chunk = encode_ids(chunk, active_advertisers)
+                df_filtered = filter_chunk(chunk, target_date, active_advertisers)
+            with phase('write'):
+                # El schema sale del bloque sin filtrar: un bloque filtrado vacío no tiene tipos
+                writer.infer_schema(chunk)
+                writer.write(df_filtered)
+            total_rows += len(df_filtered)
+    count_rows(f'{log_name}_out', total_rows)
+    return total_rows
+
+
+def filter_data(s3_bucket, input_prefix, output_prefix, advertiser_ids_file, date, chunk_size=None,
+                artifact_format=DEFAULT_ARTIFACT_FORMAT, raw_layout='flat'):
     """
     Filtra los logs del día para mantener solo advertisers activos
-    
+
     Args:
-        s3_bucket: Nombre del bucket de S3
+        s3_bucket: Nombre del bucket de S3 (o file:///ruta para usar un directorio local)
         input_prefix: Prefijo donde están los datos crudos
         output_prefix: Prefijo donde guardar los datos filtrados
         advertiser_ids_file: Archivo con la lista de advertisers activos
         date: Fecha del día a procesar (formato YYYY-MM-DD)
+        chunk_size: Si se indica, procesa los logs en modo streaming en bloques
+                    de chunk_size filas en lugar de cargarlos completos en memoria
+        artifact_format: Formato de los archivos filtrados ('parquet' o 'csv')
+        raw_layout: 'flat' para leer los logs acumulados o 'partitioned' para
+                    leer solo las particiones del día (ver raw_partitions.py)
     """
-    s3_client = boto3.client('s3')
-    
+    storage = get_storage(s3_bucket)
+    target_date = pd.to_datetime(date).date()
+
     # Leer lista de advertisers activos
-    response = s3_client.get_object(Bucket=s3_bucket, Key=advertiser_ids_file)
-    active_advertisers_df = pd.read_csv(response['Body'])
-    active_advertisers = set(active_advertisers_df['advertiser_id'].tolist())
-    
+    with phase('read_advertisers'):
+        active_advertisers = read_active_advertisers(storage, advertiser_ids_file)
+
+    product_views_output_key = artifact_key(output_prefix, 'product_views_filtered', date, artifact_format)
+    ads_views_output_key = artifact_key(output_prefix, 'ads_views_filtered', date, artifact_format)
+
     # Procesar product_views
-    product_views_key = f"{input_prefix}/product_views"
     try:
-        response = s3_client.get_object(Bucket=s3_bucket, Key=product_views_key)
-        df_product_views = pd.read_csv(response['Body'])
-        
-        # Filtrar por fecha y advertisers activos
-        df_product_views['date'] = pd.to_datetime(df_product_views['date'])
-        df_filtered_views = df_product_views[
-            (df_product_views['date'].dt.date == pd.to_datetime(date).date()) &
-            (df_product_views['advertiser_id'].isin(active_advertisers))
-        ]
-        
-        # Guardar resultado filtrado
-        output_key = f"{output_prefix}/product_views_filtered_{date}.csv"
-        csv_buffer = StringIO()
-        df_filtered_views.to_csv(csv_buffer, index=False)
-        s3_client.put_object(Bucket=s3_bucket, Key=output_key, Body=csv_buffer.getvalue())
-        print(f"Product views filtrados guardados en {output_key}: {len(df_filtered_views)} registros")
+        chunks = iter_raw_log(storage, input_prefix, 'product_views', date, chunk_size, raw_layout)
+        rows = _filter_log(storage, 'product_views', chunks, product_views_output_key, target_date, active_advertisers,
+                           chunk_size)
+        print(f"Product views filtrados guardados en {product_views_output_key}: {rows} registros")
     except Exception as e:
         print(f"Error procesando product_views: {e}")
         raise
-    
+
     # Procesar ads_views
-    ads_views_key = f"{input_prefix}/ads_views"
     try:
-        response = s3_client.get_object(Bucket=s3_bucket, Key=ads_views_key)
-        df_ads_views = pd.read_csv(response['Body'])
-        
-        # Filtrar por fecha y advertisers activos
-        df_ads_views['date'] = pd.to_datetime(df_ads_views['date'])
-        df_filtered_ads = df_ads_views[
-            (df_ads_views['date'].dt.date == pd.to_datetime(date).date()) &
-            (df_ads_views['advertiser_id'].isin(active_advertisers))
-        ]
-        
-        # Guardar resultado filtrado
-        output_key = f"{output_prefix}/ads_views_filtered_{date}.csv"
-        csv_buffer = StringIO()
-        df_filtered_ads.to_csv(csv_buffer, index=False)
-        s3_client.put_object(Bucket=s3_bucket, Key=output_key, Body=csv_buffer.getvalue())
-        print(f"Ads views filtrados guardados en {output_key}: {len(df_filtered_ads)} registros")
+        chunks = iter_raw_log(storage, input_prefix, 'ads_views', date, chunk_size, raw_layout)
+        rows = _filter_log(storage, 'ads_views', chunks, ads_views_output_key, target_date, active_advertisers,
+                           chunk_size)
+        print(f"Ads views filtrados guardados en {ads_views_output_key}: {rows} registros")
     except Exception as e:
         print(f"Error procesando ads_views: {e}")
         raise
-    
+
     return {
-        'product_views_filtered': f"{output_prefix}/product_views_filtered_{date}.csv",
-        'ads_views_filtered': f"{output_prefix}/ads_views_filtered_{date}.csv"
+        'product_views_filtered': product_views_output_key,
+        'ads_views_filtered': ads_views_output_key
     }
 
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) != 6:
-        print("Uso: python filter_data.py <s3_bucket> <input_prefix> <output_prefix> <advertiser_ids_file> <date>")
+    if len(sys.argv) not in (6, 7, 8, 9):
+        print("Uso: python filter_data.py <s3_bucket> <input_prefix> <output_prefix> <advertiser_ids_file> <date> "
+              "[chunk_size] [artifact_format] [raw_layout]")
         sys.exit(1)
-    
-    filter_data(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5])
 
+    chunk_size = int(sys.argv[6]) if len(sys.argv) > 6 and sys.argv[6] else None
+    artifact_format = sys.argv[7] if len(sys.argv) > 7 else DEFAULT_ARTIFACT_FORMAT
+    raw_layout = sys.argv[8] if len(sys.argv) > 8 else 'flat'
+    filter_data(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], chunk_size, artifact_format,
+                raw_layout)
@@ -0,0 +1,102 @@
+"""
+Modo fusionado: FiltrarDatos, TopCTR y TopProduct en una sola tarea
+
+Lee cada log crudo una única vez, filtra por fecha y advertisers activos y
+acumula los conteos de ambos modelos en el mismo proceso, sin escribir los
+archivos filtrados intermedios. Escribe los mismos top_ctr_{date} y
+top_product_{date} que el pipeline por etapas, así DBWriting no cambia.
+"""
+from functools import partial
+
+import pandas as pd
+
+from artifacts import DEFAULT_ARTIFACT_FORMAT
+from daily_aggregates import DEFAULT_WINDOW_DAYS, window_counts
+from filter_data import filter_chunk, iter_raw_log, read_active_advertisers
+from instrumentation import phase, timed_iter
+from sharding import DEFAULT_WORKERS, map_advertiser_shards, sort_ranking
+from storage import get_storage
+from top_ctr import aggregate_ads, rank_top_ctr, save_top_ctr
+from top_k import DEFAULT_TOP_K, merge_counts
+from top_product import aggregate_views, rank_top_product, save_top_product
+
+
+def _aggregate_log(log_name, chunks, aggregate, target_date, active_advertisers, workers=DEFAULT_WORKERS):
+    """Filtra cada bloque de un log y acumula sus conteos parciales"""
+    counts = None
+    for chunk in timed_iter(chunks, 'read', rows=f'{log_name}_in'):
+        with phase('filter'):
+            chunk = filter_chunk(chunk, target_date, active_advertisers)
+        with phase('aggregate'):
+            chunk_counts = map_advertiser_shards(chunk, aggregate, workers)
+            counts = chunk_counts if counts is None else merge_counts([counts, chunk_counts])
+    return counts
+
+
+def run_fused_pipeline(s3_bucket, input_prefix, output_prefix, advertiser_ids_file, date, chunk_size=None,
+                       artifact_format=DEFAULT_ARTIFACT_FORMAT, raw_layout='flat', top_k=DEFAULT_TOP_K,
+                       window_days=DEFAULT_WINDOW_DAYS, workers=DEFAULT_WORKERS):
+    """
+    Calcula TopCTR y TopProduct del día leyendo los logs crudos una sola vez
+
+    Args:
+        s3_bucket: Nombre del bucket de S3 (o file:///ruta para usar un directorio local)
+        input_prefix: Prefijo donde están los datos crudos
+        output_prefix: Prefijo donde guardar los resultados
+        advertiser_ids_file: Archivo con la lista de advertisers activos
+        date: Fecha del día a procesar (formato YYYY-MM-DD)
+        chunk_size: Si se indica, lee los logs en bloques de chunk_size filas
+        artifact_format: Formato de los archivos de resultados ('parquet' o 'csv')
+        raw_layout: 'flat' o 'partitioned' (ver filter_data.py)
+        top_k: Cantidad de productos a recomendar por advertiser
+        window_days: Días de la ventana a rankear (ver daily_aggregates.py)
+        workers: Procesos en paralelo por hash de advertiser_id (ver sharding.py)
+
+    Returns:
+        Diccionario con las keys de los resultados de ambos modelos
+    """
+    storage = get_storage(s3_bucket)
+    target_date = pd.to_datetime(date).date()
+    with phase('read_advertisers'):
+        active_advertisers = read_active_advertisers(storage, advertiser_ids_file)
+
+    view_counts = _aggregate_log(
+        'product_views', iter_raw_log(storage, input_prefix, 'product_views', date, chunk_size, raw_layout),
+        aggregate_views, target_date, active_advertisers, workers
+    )
+    ctr_counts = _aggregate_log(
+        'ads_views', iter_raw_log(storage, input_prefix, 'ads_views', date, chunk_size, raw_layout),
+        aggregate_ads, target_date, active_advertisers, workers
+    )
+
+    # Guardar los conteos del día y sumar los días previos de la ventana
+    with phase('window'):
+        view_counts = window_counts(storage, output_prefix, 'views', date, view_counts, window_days, active_advertisers)
+        ctr_counts = window_counts(storage, output_prefix, 'ads', date, ctr_counts, window_days, active_advertisers)
+
+    with phase('rank'):
+        df_top_ctr = sort_ranking(
+            map_advertiser_shards(ctr_counts, partial(rank_top_ctr, date=date, top_k=top_k), workers)
+        )
+        df_top_product = sort_ranking(
+            map_advertiser_shards(view_counts, partial(rank_top_product, date=date, top_k=top_k), workers)
+        )
+
+    return {
+        'top_ctr': save_top_ctr(storage, df_top_ctr, output_prefix, date, artifact_format),
+        'top_product': save_top_product(storage, df_top_product, output_prefix, date, artifact_format),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) not in (6, 7, 8, 9):
+        print("Uso: python fused_pipeline.py <s3_bucket> <input_prefix> <output_prefix> <advertiser_ids_file> <date> "
+              "[chunk_size] [artifact_format] [raw_layout]")
+        sys.exit(1)
+
+    chunk_size = int(sys.argv[6]) if len(sys.argv) > 6 and sys.argv[6] else None
+    artifact_format = sys.argv[7] if len(sys.argv) > 7 else DEFAULT_ARTIFACT_FORMAT
+    raw_layout = sys.argv[8] if len(sys.argv) > 8 else 'flat'
+    run_fused_pipeline(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], chunk_size,
+                       artifact_format, raw_layout)
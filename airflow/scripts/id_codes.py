@@ -0,0 +1,127 @@
+"""
+Representación compacta de los IDs como categóricos
+
+Los IDs se leen directamente como categóricos (códigos enteros + un
+diccionario de valores) y así se filtran, agrupan y rankean; solo se
+decodifican a texto al escribir los resultados de los modelos.
+
+Un categórico solo ahorra memoria si hay muchas filas por valor distinto:
+guarda un código por fila más cada valor una vez, y parsearlo es más lento
+que leer texto. advertiser_id siempre se codifica (pocos valores, y el
+filtro de advertisers activos es un notna() sobre los códigos). product_id
+queda como texto salvo con ENCODE_PRODUCT_IDS=1, que conviene solo con
+catálogos chicos. Con scripts/report_id_encoding_memory.py (3M eventos,
+20k advertisers, la mitad activos; MB de las columnas de ID, segundos de
+lectura + filtro + agregación):
+
+    productos por       IDs como texto   solo advertiser   advertiser + producto
+    advertiser
+    200                 194.5 MB  6.9 s  102.4 MB  6.5 s   212.8 MB  13.2 s
+    20                  194.5 MB  5.9 s  102.4 MB  3.8 s    43.8 MB   4.5 s
+
+La decisión es global y no por bloque: todos los bloques de un artefacto
+tienen que tener el mismo tipo de columna (diccionario o texto en Parquet).
+
+Las categorías se mantienen ordenadas, así ordenar por los códigos da el
+mismo orden que ordenar por el texto y los rankings no cambian. Las de
+advertiser_id se fijan a la lista de advertisers activos: un advertiser
+inactivo queda como NaN y filtrar es un notna() sobre los códigos.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+ID_COLUMNS = ('advertiser_id', 'product_id')
+
+# Columnas de ID que se codifican como categóricos (ver el docstring del módulo)
+ENCODE_PRODUCT_IDS = os.getenv('ENCODE_PRODUCT_IDS', '') == '1'
+ENCODED_ID_COLUMNS = ID_COLUMNS if ENCODE_PRODUCT_IDS else ('advertiser_id',)
+
+# dtype para leer los IDs de un CSV como categóricos (las categorías se parsean como texto)
+ID_DTYPES = {column: 'category' for column in ENCODED_ID_COLUMNS}
+
+# dtype para leer los IDs de un CSV como texto sin codificar (p. ej. al compactar los logs crudos)
+ID_TEXT_DTYPES = {column: str for column in ID_COLUMNS}
+
+
+def read_csv_encoded(source, columns=ENCODED_ID_COLUMNS, **kwargs):
+    """
+    pd.read_csv con las columnas de ID codificadas leídas directamente como categóricos
+
+    low_memory=False evita que el parser arme un categórico por cada bloque
+    interno y después tenga que unificarlos, que con muchos valores
+    distintos es más lento que la lectura como texto.
+    """
+    dtype = {column: 'category' for column in columns}
+    dtype.update({column: str for column in ID_COLUMNS if column not in columns})
+    return pd.read_csv(source, dtype=dtype, low_memory=False, **kwargs)
+
+
+def _sorted_categorical(values):
+    """Convierte una Serie en categórica con categorías de texto ordenadas"""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    categories = values.cat.categories
+    if categories.dtype != object:
+        # IDs numéricos (p. ej. inferidos como enteros al leer un CSV): se comparan como texto
+        # contra los advertisers activos, así que las categorías también tienen que serlo
+        categories = categories.astype(str)
+        values = values.cat.rename_categories(categories)
+    if categories.is_monotonic_increasing:
+        return values
+    return values.cat.reorder_categories(categories.sort_values())
+
+
+def encode_ids(df, advertisers=None, columns=ENCODED_ID_COLUMNS):
+    """
+    Codifica las columnas de ID de df como categóricos ordenados
+
+    Args:
+        df: DataFrame con advertiser_id y/o product_id (texto o categóricos)
+        advertisers: Index ordenado de advertisers activos (ver
+                     filter_data.read_active_advertisers); si se indica, se usa
+                     como categorías de advertiser_id y los demás quedan como NaN
+        columns: Columnas de ID a codificar (por defecto ENCODED_ID_COLUMNS)
+    """
+    encoded = {}
+    for column in columns:
+        if column not in df:
+            continue
+        values = _sorted_categorical(df[column])
+        if column == 'advertiser_id' and advertisers is not None and not values.cat.categories.equals(advertisers):
+            values = values.cat.set_categories(advertisers)
+        encoded[column] = values
+    return df.assign(**encoded)
+
+
+def decode_ids(df):
+    """Vuelve a texto las columnas de ID codificadas"""
+    columns = {
+        column: df[column].astype(df[column].cat.categories.dtype)
+        for column in ID_COLUMNS
+        if column in df and isinstance(df[column].dtype, pd.CategoricalDtype)
+    }
+    return df.assign(**columns) if columns else df
+
+
+def concat_encoded(frames):
+    """
+    Concatena DataFrames conservando los IDs codificados
+
+    pd.concat solo conserva un categórico si todos los bloques tienen las
+    mismas categorías (si no, lo convierte a texto); acá se lleva cada
+    columna de ID a la unión ordenada de las categorías antes de concatenar.
+    """
+    frames = list(frames)
+    for column in ID_COLUMNS:
+        if len(frames) < 2 or not all(
+            column in frame and isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames
+        ):
+            continue
+        categories = [frame[column].cat.categories for frame in frames]
+        if all(categories[0].equals(other) for other in categories[1:]):
+            continue
+        union = pd.Index(np.unique(np.concatenate([c.to_numpy(dtype=object) for c in categories])))
+        frames = [frame.assign(**{column: frame[column].cat.set_categories(union)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,170 @@
+"""
+Métricas por etapa del pipeline: tiempo por fase, filas, bytes y pico de memoria
+
+Cada tarea corre dentro de instrument_stage(), que deja activa una
+StageMetrics. Mientras tanto las funciones de las etapas registran:
+
+    with phase('read'): ...          tiempo de pared por fase (se acumula si se repite)
+    timed_iter(chunks, 'read', rows='ads_views_in')
+                                     tiempo que tarda en producirse cada bloque de un
+                                     iterador (y, con rows, las filas de los bloques)
+    count_rows('ads_views_in', n)    filas de entrada o salida con nombre
+    count_bytes_read(n) / count_bytes_written(n)
+                                     bytes leídos y escritos (los registra storage.py)
+
+Fuera de instrument_stage() todas estas funciones no hacen nada, así las
+etapas se pueden usar igual desde scripts o benchmarks. Al terminar la
+etapa se agrega el pico de RSS del proceso (y de los procesos hijos de
+sharding.py) y, si se indica storage, se guarda el JSON en
+{output_prefix}/metrics/date=YYYY-MM-DD/{stage}.json para comparar corridas.
+"""
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+_current = ContextVar('stage_metrics', default=None)
+
+
+def _peak_rss_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux informa KiB y macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class StageMetrics:
+    """Métricas de una etapa: fases, filas y bytes"""
+
+    def __init__(self, stage, date):
+        self.stage = stage
+        self.date = date
+        self.started_at = datetime.now(timezone.utc)
+        self.phases = {}
+        self.rows = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.total_seconds = None
+        self.peak_rss_mb = None
+        self.peak_rss_children_mb = None
+        self._start = time.perf_counter()
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_rows(self, name, rows):
+        self.rows[name] = self.rows.get(name, 0) + int(rows)
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self._start
+        self.peak_rss_mb = _peak_rss_mb(resource.RUSAGE_SELF)
+        self.peak_rss_children_mb = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'date': self.date,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'total_seconds': round(self.total_seconds, 3) if self.total_seconds is not None else None,
+            'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            'rows': dict(self.rows),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss_mb': self.peak_rss_mb,
+            'peak_rss_children_mb': self.peak_rss_children_mb,
+        }
+
+
+def metrics_key(output_prefix, date, stage):
+    return f"{output_prefix}/metrics/date={date}/{stage}.json"
+
+
+@contextmanager
+def instrument_stage(stage, date, storage=None, output_prefix=None):
+    """
+    Activa las métricas de una etapa mientras dura el bloque
+
+    Si se indican storage y output_prefix, al terminar bien guarda las
+    métricas como JSON (ver metrics_key).
+
+    Yields:
+        La StageMetrics de la etapa (to_dict() una vez terminado el bloque)
+    """
+    metrics = StageMetrics(stage, date)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        metrics.finish()
+
+    phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in metrics.phases.items())
+    print(f"Métricas de {stage}: {metrics.total_seconds:.2f}s ({phases}); filas {metrics.rows}; "
+          f"{metrics.bytes_read:,} bytes leídos, {metrics.bytes_written:,} escritos; "
+          f"pico RSS {metrics.peak_rss_mb} MB")
+    if storage is not None and output_prefix:
+        storage.write_bytes(metrics_key(output_prefix, date, stage), json.dumps(metrics.to_dict(), indent=2))
+
+
+def run_instrumented(stage, date, storage, output_prefix, func, *args, **kwargs):
+    """
+    Ejecuta func dentro de instrument_stage y devuelve su resultado junto con las métricas
+
+    Returns:
+        {'result': <resultado de func>, 'metrics': <métricas de la etapa>}
+    """
+    with instrument_stage(stage, date, storage, output_prefix) as metrics:
+        result = func(*args, **kwargs)
+    return {'result': result, 'metrics': metrics.to_dict()}
+
+
+@contextmanager
+def phase(name):
+    """Suma al tiempo de la fase name lo que tarda el bloque"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(name, time.perf_counter() - start)
+
+
+def timed_iter(iterable, name, rows=None):
+    """
+    Itera iterable sumando a la fase name el tiempo que tarda cada elemento en producirse
+
+    Con rows, suma además len() de cada elemento (p. ej. filas de cada bloque) a ese contador.
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        if rows is not None:
+            count_rows(rows, len(item))
+        yield item
+
+
+def count_rows(name, rows):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_rows(name, rows)
+
+
+def count_bytes_read(n):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.bytes_read += n
+
+
+def count_bytes_written(n):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.bytes_written += n
@@ -0,0 +1,167 @@
+"""
+Layout de logs crudos particionado por fecha
+
+La compactación reescribe cada log crudo acumulado (raw_data/product_views,
+raw_data/ads_views) como archivos Parquet por día más un manifest:
+
+    {input_prefix}/partitioned/{log_name}/date=YYYY-MM-DD/part-00000.parquet
+    {input_prefix}/partitioned/{log_name}/_manifest.json
+
+Así FiltrarDatos descarga solo las particiones de la fecha de ejecución en
+lugar del log completo. El manifest es el punto de commit: un archivo que
+no figura en él no existe para los lectores.
+
+El DAG compacta los logs en la tarea compact_raw_logs antes de filtrar
+(con raw_data_layout='partitioned'); la compactación solo trabaja si el log
+crudo cambió desde la anterior.
+"""
+import json
+from datetime import datetime, timezone
+from io import BytesIO
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from artifacts import write_artifact
+from id_codes import ENCODED_ID_COLUMNS, ID_TEXT_DTYPES
+from instrumentation import count_rows, phase, timed_iter
+
+RAW_LOGS = ('product_views', 'ads_views')
+RAW_LAYOUTS = ('flat', 'partitioned')
+DEFAULT_COMPACTION_CHUNK_SIZE = 1_000_000
+
+
+def partitioned_prefix(input_prefix, log_name):
+    return f"{input_prefix}/partitioned/{log_name}"
+
+
+def manifest_key(input_prefix, log_name):
+    return f"{partitioned_prefix(input_prefix, log_name)}/_manifest.json"
+
+
+def read_manifest(storage, input_prefix, log_name):
+    """Devuelve el manifest de un log particionado, o None si todavía no fue compactado"""
+    key = manifest_key(input_prefix, log_name)
+    if not storage.exists(key):
+        return None
+    return json.loads(storage.read_bytes(key))
+
+
+def compact_raw_log(storage, input_prefix, log_name, chunk_size=DEFAULT_COMPACTION_CHUNK_SIZE, overwrite=False):
+    """
+    Reescribe un log crudo acumulado como particiones diarias en Parquet
+
+    El manifest guarda la versión (tamaño y ETag) del log crudo compactado.
+    Si el log no cambió desde la última compactación no se hace nada; si
+    cambió (se le agregaron filas, incluso de días ya compactados) se
+    reescriben todas las particiones, así las filas que llegan tarde también
+    quedan en su día. Los archivos nuevos llevan el id de la corrida en el
+    nombre: los del manifest anterior no se pisan y se borran recién después
+    de escribir el manifest nuevo.
+
+    Args:
+        storage: Backend de almacenamiento (ver storage.get_storage)
+        input_prefix: Prefijo donde están los datos crudos
+        log_name: 'product_views' o 'ads_views'
+        chunk_size: Filas por bloque de lectura
+        overwrite: Reescribir las particiones aunque el log no haya cambiado
+
+    Returns:
+        Diccionario {fecha: filas escritas} con las particiones escritas en esta corrida
+    """
+    source_key = f"{input_prefix}/{log_name}"
+    source = storage.object_version(source_key)
+    previous = read_manifest(storage, input_prefix, log_name)
+    if previous is not None and previous.get('source') == source and not overwrite:
+        print(f"{source_key} no cambió desde la última compactación")
+        return {}
+
+    run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    manifest = {
+        'log_name': log_name,
+        'format': 'parquet',
+        'columns': None,
+        'source': source,
+        'partitions': {},
+    }
+
+    body = storage.open_read(source_key)
+    # Los IDs se guardan siempre como texto: si pandas los infiriera como enteros, las
+    # particiones no coincidirían con la lista de advertisers activos (que es texto)
+    chunks = pd.read_csv(body, chunksize=chunk_size, dtype=ID_TEXT_DTYPES)
+    for chunk in timed_iter(chunks, 'read', rows=f'{log_name}_in'):
+        if manifest['columns'] is None:
+            manifest['columns'] = list(chunk.columns)
+        days = pd.to_datetime(chunk['date']).dt.strftime('%Y-%m-%d')
+        with phase('write'):
+            for day, part in chunk.groupby(days, sort=True):
+                partition = manifest['partitions'].setdefault(day, {'files': [], 'rows': 0})
+                key = (f"{partitioned_prefix(input_prefix, log_name)}/date={day}/"
+                       f"part-{run_id}-{len(partition['files']):05d}.parquet")
+                write_artifact(storage, key, part)
+                partition['files'].append(key)
+                partition['rows'] += len(part)
+
+    manifest['updated_at'] = datetime.now(timezone.utc).isoformat()
+    storage.write_bytes(manifest_key(input_prefix, log_name), json.dumps(manifest, indent=2, sort_keys=True))
+
+    # Con el manifest nuevo escrito, los archivos de la compactación anterior ya no se leen
+    if previous is not None:
+        for partition in previous['partitions'].values():
+            for key in partition['files']:
+                if storage.exists(key):
+                    storage.delete(key)
+
+    written = {day: partition['rows'] for day, partition in manifest['partitions'].items()}
+    count_rows(f'{log_name}_out', sum(written.values()))
+    return written
+
+
+def iter_partition_chunks(storage, input_prefix, log_name, date, chunk_size=None):
+    """
+    Itera los registros de un día de un log particionado
+
+    Con chunk_size devuelve bloques de a lo sumo chunk_size filas; sin él,
+    un DataFrame por archivo. Falla si el día no figura en el manifest: o
+    el log no se compactó después de subir ese día, o el día no tiene datos.
+    """
+    manifest = read_manifest(storage, input_prefix, log_name)
+    if manifest is None:
+        raise FileNotFoundError(
+            f"No existe {manifest_key(input_prefix, log_name)}: ejecutar raw_partitions.py primero"
+        )
+
+    partition = manifest['partitions'].get(date)
+    if partition is None:
+        compacted = sorted(manifest['partitions'])
+        compacted = f"{compacted[0]} a {compacted[-1]}" if compacted else "ninguna"
+        raise ValueError(
+            f"La fecha {date} no está en {manifest_key(input_prefix, log_name)} (fechas compactadas: "
+            f"{compacted}): el log crudo no tiene datos de ese día o hay que volver a compactarlo"
+        )
+
+    # Los IDs codificados se leen como columnas diccionario (categóricos, ver id_codes.py) sin pasar por texto
+    id_columns = [column for column in ENCODED_ID_COLUMNS if column in manifest['columns']]
+    for key in partition['files']:
+        data = BytesIO(storage.read_bytes(key))
+        if not chunk_size:
+            yield pd.read_parquet(data, read_dictionary=id_columns)
+            continue
+        for batch in pq.ParquetFile(data, read_dictionary=id_columns).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+
+if __name__ == "__main__":
+    import sys
+    from storage import get_storage
+
+    if len(sys.argv) not in (3, 4, 5):
+        print("Uso: python raw_partitions.py <s3_bucket|file:///ruta> <input_prefix> [chunk_size] [--overwrite]")
+        sys.exit(1)
+
+    storage = get_storage(sys.argv[1])
+    chunk_size = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != '--overwrite' else DEFAULT_COMPACTION_CHUNK_SIZE
+    overwrite = '--overwrite' in sys.argv[3:]
+    for log_name in RAW_LOGS:
+        written = compact_raw_log(storage, sys.argv[2], log_name, chunk_size, overwrite)
+        print(f"{log_name}: {len(written)} particiones escritas, {sum(written.values())} registros")
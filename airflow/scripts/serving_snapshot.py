@@ -0,0 +1,198 @@
+"""
+Tarea PublishSnapshot: publica un snapshot binario de las recomendaciones vigentes
+
+Corre después de DBWriting y escribe en <output_prefix>/serving/recommendations.snap
+las recomendaciones que hoy devuelve /recommendations (las filas de la fecha
+de latest_recommendations de cada advertiser y modelo). La API lo abre con
+mmap y responde sin consultar Postgres (ver api/app/snapshot.py, que lee el
+mismo formato).
+
+Formato (little endian, versión 1):
+    cabecera   magic 'RECSNAP\\0', versión (u32), cantidad de claves (u32),
+               cantidad de filas (u32), generación (i32, días desde
+               1970-01-01) y el offset (u64) de cada una de las 8 secciones
+    secciones  alineadas a 8 bytes:
+               key_offsets   u32[n_keys + 1]  límites de cada clave en key_bytes
+               key_bytes     claves 'advertiser_id\\0model_name' en UTF-8, ordenadas por bytes
+               key_dates     i32[n_keys]      fecha de cada clave (días desde 1970-01-01)
+               row_starts    u32[n_keys + 1]  primera fila de cada clave
+               product_offsets u32[n_rows + 1] límites de cada product_id en product_bytes
+               product_bytes product_id en UTF-8
+               ranks         i32[n_rows]
+               scores        f64[n_rows]      NaN para score NULL
+"""
+import io
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+from db_writing import connect
+from storage import get_storage
+
+SNAPSHOT_MAGIC = b'RECSNAP\0'
+SNAPSHOT_VERSION = 1
+HEADER_FORMAT = '<8sIIIi8Q'
+SNAPSHOT_SECTIONS = 8
+SNAPSHOT_KEY = 'serving/recommendations.snap'
+
+# Máximo de filas por advertiser y modelo, como en /recommendations
+MAX_ROWS_PER_KEY = 20
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def snapshot_key(output_prefix):
+    return f"{output_prefix}/{SNAPSHOT_KEY}"
+
+
+def _string_heap(values):
+    """Concatena strings en UTF-8; devuelve (offsets u32, bytes)"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded)
+
+
+def build_snapshot(df, generation):
+    """
+    Serializa las recomendaciones vigentes en el formato del snapshot
+
+    Args:
+        df: DataFrame con advertiser_id, model_name, product_id, rank_position,
+            score y date (una fecha por advertiser y modelo)
+        generation: Fecha más reciente cargada (la generación de los datos)
+
+    Returns:
+        bytes del snapshot
+    """
+    df = df[df['rank_position'] <= MAX_ROWS_PER_KEY].astype({'advertiser_id': str, 'model_name': str})
+    # Ordenar por (advertiser_id, model_name) da el mismo orden que por bytes de
+    # 'advertiser_id\0model_name' (el orden de str en Python coincide con el de
+    # UTF-8 y '\0' es el menor byte), que es el que usa la búsqueda binaria de
+    # la API. Las claves con '\0' se arman en Python y nunca pasan por pandas:
+    # pandas 2.1 trata esos strings como strings de C, los corta en el '\0' y
+    # ordena y agrupa mal las claves.
+    df = df.sort_values(['advertiser_id', 'model_name', 'rank_position'], kind='stable').reset_index(drop=True)
+
+    keys = df.drop_duplicates(['advertiser_id', 'model_name'])
+    key_offsets, key_bytes = _string_heap(
+        f"{advertiser_id}\0{model_name}" for advertiser_id, model_name in zip(keys['advertiser_id'], keys['model_name'])
+    )
+    key_dates = ((pd.to_datetime(keys['date']).values.astype('datetime64[D]') - EPOCH)
+                 .astype('<i4'))
+    row_starts = np.append(keys.index.to_numpy(), len(df)).astype('<u4')
+    product_offsets, product_bytes = _string_heap(df['product_id'].astype(str))
+    ranks = df['rank_position'].to_numpy(dtype='<i4')
+    scores = df['score'].to_numpy(dtype='<f8', na_value=np.nan)
+
+    sections = [
+        key_offsets.tobytes(), key_bytes, key_dates.tobytes(), row_starts.tobytes(),
+        product_offsets.tobytes(), product_bytes, ranks.tobytes(), scores.tobytes(),
+    ]
+    offsets = []
+    position = struct.calcsize(HEADER_FORMAT)
+    for section in sections:
+        position += -position % 8
+        offsets.append(position)
+        position += len(section)
+
+    buffer = bytearray(position)
+    generation_days = int((np.datetime64(str(generation), 'D') - EPOCH).astype(int))
+    struct.pack_into(HEADER_FORMAT, buffer, 0, SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                     len(keys), len(df), generation_days, *offsets)
+    for offset, section in zip(offsets, sections):
+        buffer[offset:offset + len(section)] = section
+    return bytes(buffer)
+
+
+def read_current_recommendations(cursor):
+    """
+    Lee de la base las recomendaciones vigentes de todos los advertisers y modelos
+
+    Returns:
+        (DataFrame con las filas, generación) o (None, None) si la tabla está vacía
+    """
+    cursor.execute("SELECT MAX(date) FROM recommendations")
+    generation = cursor.fetchone()[0]
+    if generation is None:
+        return None, None
+
+    buffer = io.StringIO()
+    cursor.copy_expert(f"""
+        COPY (
+            SELECT r.advertiser_id, r.model_name, r.product_id, r.rank_position, r.score, r.date
+            FROM latest_recommendations l
+            INNER JOIN recommendations r
+                ON r.advertiser_id = l.advertiser_id
+                AND r.model_name = l.model_name
+                AND r.date = l.date
+            WHERE r.rank_position <= {MAX_ROWS_PER_KEY}
+        ) TO STDOUT WITH (FORMAT csv, HEADER true)
+    """, buffer)
+    buffer.seek(0)
+    df = pd.read_csv(
+        buffer,
+        dtype={'advertiser_id': str, 'model_name': str, 'product_id': str, 'rank_position': 'int32'},
+        keep_default_na=False,
+        na_values={'score': ['']},
+        # El parser rápido de pandas puede diferir en el último dígito: el score
+        # tiene que ser exactamente el double de la base, como lo devuelve la API
+        float_precision='round_trip',
+    )
+    return df, generation
+
+
+def publish_snapshot(s3_bucket, output_prefix, db_config):
+    """
+    Publica el snapshot de las recomendaciones vigentes
+
+    Args:
+        s3_bucket: Bucket de S3 (o URI file:///ruta) donde se publica
+        output_prefix: Prefijo de salida del pipeline
+        db_config: Configuración de la base (ver db_writing.write_to_db)
+
+    Returns:
+        Diccionario con la key publicada, la generación, claves, filas y bytes
+    """
+    start = time.perf_counter()
+    conn = connect(db_config)
+    try:
+        cursor = conn.cursor()
+        df, generation = read_current_recommendations(cursor)
+        cursor.close()
+    finally:
+        conn.close()
+
+    if df is None:
+        print("La tabla recommendations está vacía: no se publica snapshot")
+        return None
+
+    data = build_snapshot(df, generation)
+    key = snapshot_key(output_prefix)
+    get_storage(s3_bucket).write_bytes(key, data)
+
+    n_keys, n_rows = struct.unpack_from('<II', data, len(SNAPSHOT_MAGIC) + 4)
+    elapsed = time.perf_counter() - start
+    print(f"Snapshot {key} publicado: generación {generation}, {n_keys} claves, "
+          f"{n_rows} filas, {len(data)} bytes en {elapsed:.2f}s")
+    return {
+        'snapshot_file': key,
+        'generation': str(generation),
+        'keys': n_keys,
+        'rows': n_rows,
+        'bytes': len(data),
+        'seconds': round(elapsed, 3),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    if len(sys.argv) != 4:
+        print("Uso: python serving_snapshot.py <s3_bucket> <output_prefix> <db_config_json>")
+        sys.exit(1)
+
+    publish_snapshot(sys.argv[1], sys.argv[2], json.loads(sys.argv[3]))
@@ -0,0 +1,70 @@
+"""
+Ejecución paralela de los modelos particionando los datos por hash de advertiser_id
+
+Cada advertiser cae siempre en el mismo shard, así la agregación y el
+ranking de un shard no dependen de los demás y los resultados de los
+shards se pueden concatenar directamente.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+DEFAULT_WORKERS = 1
+
+# Datos compartidos con los procesos hijos cuando se usa fork (se heredan sin serializar)
+_shard_state = {}
+
+
+def resolve_workers(workers):
+    """Convierte workers en una cantidad de procesos (0 o None = todos los cores)"""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def advertiser_shards(advertiser_ids, n_shards):
+    """Devuelve el shard (0..n_shards-1) de cada advertiser_id, estable entre procesos"""
+    return pd.util.hash_pandas_object(advertiser_ids, index=False).to_numpy() % n_shards
+
+
+def _run_shard(shard):
+    df = _shard_state['df']
+    return _shard_state['func'](df[_shard_state['shard_ids'] == shard])
+
+
+def map_advertiser_shards(df, func, workers=DEFAULT_WORKERS):
+    """
+    Aplica func a cada shard de df en un pool de procesos y concatena los resultados
+
+    Con fork (Linux) los hijos heredan df sin copiarlo y solo se serializan
+    los resultados; en otras plataformas se envía cada shard al pool.
+
+    Args:
+        df: DataFrame con columna advertiser_id
+        func: Función DataFrame -> DataFrame que procesa un conjunto de advertisers
+        workers: Cantidad de procesos (y de shards)
+    """
+    workers = resolve_workers(workers)
+    if workers == 1 or df.empty:
+        return func(df)
+
+    shard_ids = advertiser_shards(df['advertiser_id'], workers)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _shard_state.update(df=df, func=func, shard_ids=shard_ids)
+        try:
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                results = list(pool.map(_run_shard, range(workers)))
+        finally:
+            _shard_state.clear()
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(func, [df[shard_ids == shard] for shard in range(workers)]))
+
+    return pd.concat(results, ignore_index=True)
+
+
+def sort_ranking(df_top):
+    """Ordena un resultado rankeado por advertiser y posición, como en la ejecución secuencial"""
+    return df_top.sort_values(['advertiser_id', 'rank_position'], kind='mergesort').reset_index(drop=True)
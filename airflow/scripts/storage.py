@@ -0,0 +1,364 @@
+"""
+Almacenamiento de objetos compartido por las tareas del pipeline
+
+Las tareas reciben un "bucket" y obtienen el backend con get_storage():
+un nombre de bucket usa S3 y una URI file:///ruta/local usa el sistema de
+archivos local, lo que permite correr el pipeline sin S3.
+
+En S3 todas las tareas de un proceso comparten un único cliente (sus
+conexiones HTTP se reusan). Los objetos grandes se transfieren por partes
+en paralelo: read_bytes descarga rangos concurrentes y open_write /
+write_bytes suben las partes de un multipart upload con varios hilos, con a
+lo sumo S3_MAX_CONCURRENCY partes en memoria.
+
+Los bytes leídos y escritos por ambos backends se registran en las métricas
+de la etapa en curso (ver instrumentation.py).
+"""
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+from instrumentation import count_bytes_read, count_bytes_written
+
+LOCAL_SCHEME = 'file://'
+
+# S3 exige que todas las partes de un multipart upload (salvo la última) midan al menos 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+# Objetos desde este tamaño se transfieren por partes en paralelo
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+S3_MAX_CONCURRENCY = int(os.getenv('S3_MAX_CONCURRENCY', '8'))
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=DEFAULT_PART_SIZE,
+    max_concurrency=S3_MAX_CONCURRENCY,
+)
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Cliente de S3 compartido por el proceso (los clientes de boto3 son thread-safe)"""
+    global _s3_client
+    with _s3_client_lock:
+        if _s3_client is None:
+            # Conexiones suficientes para las transferencias en paralelo
+            _s3_client = boto3.client('s3', config=Config(max_pool_connections=max(10, 2 * S3_MAX_CONCURRENCY)))
+        return _s3_client
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """
+    Archivo binario de solo escritura que sube su contenido a S3 por partes
+
+    Sube cada parte de part_size bytes con un multipart upload a medida que
+    se completa, hasta max_concurrency partes en paralelo; si ya hay
+    max_concurrency partes subiendo, write espera a que termine alguna, así
+    la memoria queda acotada. Si el total no llega a una parte, al cerrar se
+    hace un único put_object. Usado como context manager, aborta el upload
+    si se produce una excepción.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=DEFAULT_PART_SIZE, max_concurrency=S3_MAX_CONCURRENCY):
+        super().__init__()
+        self._s3_client = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(part_size, MIN_PART_SIZE)
+        self._max_concurrency = max(1, max_concurrency)
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._pending = set()
+        self._executor = None
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write en un S3MultipartWriter cerrado")
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+        count_bytes_written(len(data))
+        while len(self._buffer) >= self._part_size:
+            self._upload_part(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self._s3_client.put_object(Bucket=self._bucket, Key=self._key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                self._wait_parts(len(self._pending))
+                self._s3_client.complete_multipart_upload(
+                    Bucket=self._bucket,
+                    Key=self._key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={'Parts': sorted(self._parts, key=lambda part: part['PartNumber'])},
+                )
+            self._buffer = bytearray()
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._shutdown()
+            super().close()
+
+    def abort(self):
+        """Descarta el upload en curso sin crear el objeto"""
+        self._shutdown()
+        if self._upload_id is not None:
+            self._s3_client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+            self._upload_id = None
+        self._buffer = bytearray()
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def _upload_part(self, data):
+        if self._upload_id is None:
+            response = self._s3_client.create_multipart_upload(Bucket=self._bucket, Key=self._key)
+            self._upload_id = response['UploadId']
+            self._executor = ThreadPoolExecutor(self._max_concurrency, thread_name_prefix='s3-upload')
+        self._wait_parts(len(self._pending) - self._max_concurrency + 1)
+        part_number = len(self._parts) + len(self._pending) + 1
+        self._pending.add(self._executor.submit(self._send_part, part_number, data))
+
+    def _send_part(self, part_number, data):
+        response = self._s3_client.upload_part(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def _wait_parts(self, count):
+        """Espera a que terminen al menos count partes en curso (propaga el error de una parte fallida)"""
+        while count > 0 and self._pending:
+            done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                self._parts.append(future.result())
+            count -= len(done)
+
+    def _shutdown(self):
+        if self._executor is not None:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._pending = set()
+
+
+class CountingReader(io.RawIOBase):
+    """Stream binario de lectura que registra los bytes leídos de otro stream"""
+
+    def __init__(self, raw):
+        super().__init__()
+        self._raw = raw
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._raw.read() if size is None or size < 0 else self._raw.read(size)
+        count_bytes_read(len(data))
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+
+class LocalFileWriter(io.RawIOBase):
+    """
+    Archivo binario de solo escritura sobre el sistema de archivos local
+
+    Escribe en un archivo temporal en el mismo directorio y lo renombra al
+    cerrar, así los lectores nunca ven un objeto a medio escribir.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self._path = path
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        self._file = os.fdopen(fd, 'wb')
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write en un LocalFileWriter cerrado")
+        self._file.write(data)
+        self.bytes_written += len(data)
+        count_bytes_written(len(data))
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._file.close()
+            os.replace(self._tmp_path, self._path)
+        finally:
+            super().close()
+
+    def abort(self):
+        """Descarta lo escrito sin crear el archivo"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class S3Storage:
+    """Backend de almacenamiento sobre un bucket de S3"""
+
+    def __init__(self, bucket, s3_client=None):
+        self.bucket = bucket
+        self.client = s3_client or get_s3_client()
+
+    def open_read(self, key):
+        """Devuelve un stream binario de lectura del objeto"""
+        return CountingReader(self.client.get_object(Bucket=self.bucket, Key=key)['Body'])
+
+    def read_bytes(self, key):
+        """Descarga el objeto completo (por rangos en paralelo si supera MULTIPART_THRESHOLD)"""
+        buffer = io.BytesIO()
+        self.client.download_fileobj(self.bucket, key, buffer, Config=TRANSFER_CONFIG)
+        count_bytes_read(buffer.tell())
+        return buffer.getvalue()
+
+    def write_bytes(self, key, data):
+        """Sube data (por partes en paralelo si supera MULTIPART_THRESHOLD)"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.client.upload_fileobj(io.BytesIO(data), self.bucket, key, Config=TRANSFER_CONFIG)
+        count_bytes_written(len(data))
+
+    def open_write(self, key):
+        """Devuelve un archivo binario de escritura que sube el objeto por partes"""
+        return S3MultipartWriter(self.client, self.bucket, key)
+
+    def exists(self, key):
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=key, MaxKeys=1)
+        return any(obj['Key'] == key for obj in response.get('Contents', []))
+
+    def object_version(self, key):
+        """Tamaño y ETag del objeto: cambian si el objeto se reescribe"""
+        response = self.client.head_object(Bucket=self.bucket, Key=key)
+        return {'size': response['ContentLength'], 'version': response['ETag'].strip('"')}
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def list_keys(self, prefix):
+        """Lista las keys que empiezan con prefix"""
+        paginator = self.client.get_paginator('list_objects_v2')
+        keys = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+
+
+class LocalStorage:
+    """Backend de almacenamiento sobre un directorio local (las keys son rutas relativas)"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def open_read(self, key):
+        return CountingReader(open(self._path(key), 'rb'))
+
+    def read_bytes(self, key):
+        with self.open_read(key) as f:
+            return f.read()
+
+    def write_bytes(self, key, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self.open_write(key) as f:
+            f.write(data)
+
+    def open_write(self, key):
+        return LocalFileWriter(self._path(key))
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def object_version(self, key):
+        """Tamaño y fecha de modificación del archivo: cambian si el archivo se reescribe"""
+        stat = os.stat(self._path(key))
+        return {'size': stat.st_size, 'version': str(stat.st_mtime_ns)}
+
+    def delete(self, key):
+        os.remove(self._path(key))
+
+    def list_keys(self, prefix):
+        keys = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith('.tmp-'):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+
+def get_storage(bucket):
+    """
+    Devuelve el backend de almacenamiento para bucket
+
+    Args:
+        bucket: Nombre de un bucket de S3 o URI file:///ruta para usar un directorio local
+    """
+    if bucket.startswith(LOCAL_SCHEME):
+        return LocalStorage(bucket[len(LOCAL_SCHEME):])
+    return S3Storage(bucket)
@@ -0,0 +1,246 @@
+"""
+Generador determinístico de logs crudos sintéticos
+
+Escribe los mismos tres objetos que espera FiltrarDatos:
+
+    {prefix}/advertiser_ids   advertiser_id
+    {prefix}/product_views    advertiser_id,product_id,date
+    {prefix}/ads_views        advertiser_id,product_id,date,type   (type: impression | click)
+
+El catálogo es de n_advertisers × products_per_advertiser productos. La
+popularidad de advertisers y de productos dentro de cada advertiser sigue
+una ley de potencias (skew = exponente; 0 = uniforme) y cada producto tiene
+un CTR propio sacado de una Beta con media ctr. Cada impresión clickeada
+agrega una fila 'click', así clicks / impressions por producto tiende a su
+CTR. Una fracción inactive_fraction de los advertisers aparece en los logs
+pero no en advertiser_ids, para que el filtro descarte algo.
+
+Los eventos se generan y se escriben en bloques de chunk_size filas sobre
+storage.open_write (en S3, un multipart upload), así la memoria queda
+acotada por el catálogo y un bloque, no por el total de filas. Cada bloque
+usa su propio generador derivado de (seed, log, día, bloque): con los mismos
+parámetros la salida es idéntica byte a byte.
+
+Funciona con cualquier backend de storage.py: un directorio local
+(file:///ruta) o un bucket de S3, incluido un stand-in compatible
+(MinIO, moto) apuntando AWS_ENDPOINT_URL a él.
+"""
+import argparse
+import time
+from datetime import date as Date, timedelta
+from io import BytesIO
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+from storage import get_storage
+
+LOG_COLUMNS = {
+    'product_views': ['advertiser_id', 'product_id', 'date'],
+    'ads_views': ['advertiser_id', 'product_id', 'date', 'type'],
+}
+EVENT_TYPES = pa.array(['impression', 'click'])
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+DEFAULT_CONFIG = {
+    'n_advertisers': 1000,
+    'products_per_advertiser': 200,
+    'events_per_day': 1_000_000,
+    'impressions_per_day': None,   # None = igual a events_per_day
+    'days': 7,
+    'start_date': '2024-01-01',
+    'ctr': 0.05,
+    'ctr_concentration': 20.0,     # más alto = CTRs más parecidos entre productos
+    'skew': 1.1,
+    'inactive_fraction': 0.2,
+    'seed': 42,
+}
+
+# Identificador de cada log en la semilla de sus bloques
+_LOG_SEEDS = {'product_views': 1, 'ads_views': 2}
+
+
+def _power_law_cdf(n, skew, rng):
+    """CDF de popularidad con pesos 1 / rank^skew repartidos al azar entre los n elementos"""
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    weights = weights[rng.permutation(n)]
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _id_strings(prefix, codes, width):
+    """IDs de texto (prefix + código con ceros a la izquierda) como columna de Arrow"""
+    digits = pc.utf8_lpad(pc.cast(pa.array(codes), pa.string()), width, '0')
+    return pc.binary_join_element_wise(prefix, digits, '')
+
+
+class Catalog:
+    """Advertisers, productos, popularidad y CTR por producto, derivados de la semilla"""
+
+    def __init__(self, n_advertisers, products_per_advertiser, ctr, ctr_concentration, skew, inactive_fraction, seed):
+        rng = np.random.default_rng([seed, 0])
+        self.n_advertisers = n_advertisers
+        self.products_per_advertiser = products_per_advertiser
+        self.advertiser_width = len(str(n_advertisers - 1))
+        self.product_width = len(str(n_advertisers * products_per_advertiser - 1))
+        self.advertiser_ids = _id_strings('ADV', np.arange(n_advertisers), self.advertiser_width)
+
+        self.advertiser_cdf = _power_law_cdf(n_advertisers, skew, rng)
+        # Misma curva de popularidad para los productos de todos los advertisers,
+        # rotada por advertiser para que cada uno tenga otro producto más visto
+        self.product_cdf = _power_law_cdf(products_per_advertiser, skew, rng)
+        self.product_offsets = rng.integers(0, products_per_advertiser, n_advertisers)
+        alpha = ctr * ctr_concentration
+        self.product_ctr = rng.beta(alpha, ctr_concentration - alpha,
+                                    n_advertisers * products_per_advertiser).astype(np.float32)
+
+        n_inactive = int(round(n_advertisers * inactive_fraction))
+        self.active = np.sort(rng.permutation(n_advertisers)[n_inactive:])
+
+    def sample(self, rng, n):
+        """Devuelve n eventos como (códigos de advertiser, códigos de producto)"""
+        advertisers = np.searchsorted(self.advertiser_cdf, rng.random(n), side='right')
+        local = np.searchsorted(self.product_cdf, rng.random(n), side='right')
+        local = (local + self.product_offsets[advertisers]) % self.products_per_advertiser
+        return advertisers, advertisers * self.products_per_advertiser + local
+
+    def event_table(self, advertisers, products, day):
+        return {
+            'advertiser_id': self.advertiser_ids.take(pa.array(advertisers)),
+            'product_id': _id_strings('PRD', products, self.product_width),
+            'date': pa.array(np.full(len(advertisers), day)),
+        }
+
+
+def _chunk_sizes(total, chunk_size):
+    full, rest = divmod(total, chunk_size)
+    return [chunk_size] * full + ([rest] if rest else [])
+
+
+def iter_log_chunks(catalog, log_name, day, day_index, events, chunk_size=DEFAULT_CHUNK_SIZE, seed=42):
+    """
+    Itera los eventos de un día de un log como tablas de Arrow
+
+    En ads_views, events es la cantidad de impresiones; los clicks se agregan
+    aparte en cada bloque.
+    """
+    for chunk_index, size in enumerate(_chunk_sizes(events, chunk_size)):
+        rng = np.random.default_rng([seed, _LOG_SEEDS[log_name], day_index, chunk_index])
+        advertisers, products = catalog.sample(rng, size)
+        if log_name == 'ads_views':
+            clicked = rng.random(size) < catalog.product_ctr[products]
+            advertisers = np.concatenate([advertisers, advertisers[clicked]])
+            products = np.concatenate([products, products[clicked]])
+            columns = catalog.event_table(advertisers, products, day)
+            columns['type'] = EVENT_TYPES.take(pa.array(np.repeat([0, 1], [size, int(clicked.sum())])))
+        else:
+            columns = catalog.event_table(advertisers, products, day)
+        yield pa.table(columns)
+
+
+def _write_csv(writer, table):
+    buffer = BytesIO()
+    pa_csv.write_csv(table, buffer, write_options=pa_csv.WriteOptions(include_header=False, quoting_style='none'))
+    writer.write(buffer.getvalue())
+
+
+def write_log(storage, key, log_name, catalog, days, events_per_day, chunk_size=DEFAULT_CHUNK_SIZE, seed=42):
+    """
+    Escribe un log completo bloque a bloque
+
+    Returns:
+        Cantidad de filas escritas
+    """
+    rows = 0
+    with storage.open_write(key) as writer:
+        writer.write((','.join(LOG_COLUMNS[log_name]) + '\n').encode('utf-8'))
+        for day_index, day in enumerate(days):
+            for table in iter_log_chunks(catalog, log_name, day, day_index, events_per_day, chunk_size, seed):
+                _write_csv(writer, table)
+                rows += table.num_rows
+            print(f"  {log_name} {day}: {rows:,} filas acumuladas")
+    return rows
+
+
+def generate_logs(s3_bucket, prefix, chunk_size=DEFAULT_CHUNK_SIZE, **config):
+    """
+    Genera advertiser_ids, product_views y ads_views en {prefix}/
+
+    Args:
+        s3_bucket: Nombre del bucket de S3 (o file:///ruta para usar un directorio local)
+        prefix: Prefijo de los objetos (el s3_input_prefix del pipeline, p. ej. raw_data)
+        chunk_size: Filas por bloque generado y escrito
+        **config: Parámetros de escala (ver DEFAULT_CONFIG)
+
+    Returns:
+        Diccionario con la configuración usada, las fechas, las filas por log y los segundos
+    """
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Parámetros desconocidos: {sorted(unknown)}")
+    config = {**DEFAULT_CONFIG, **config}
+    if config['impressions_per_day'] is None:
+        config['impressions_per_day'] = config['events_per_day']
+
+    storage = get_storage(s3_bucket)
+    start = time.perf_counter()
+    first_day = Date.fromisoformat(config['start_date'])
+    days = [(first_day + timedelta(days=offset)).isoformat() for offset in range(config['days'])]
+    catalog = Catalog(
+        config['n_advertisers'], config['products_per_advertiser'], config['ctr'],
+        config['ctr_concentration'], config['skew'], config['inactive_fraction'], config['seed'],
+    )
+
+    with storage.open_write(f"{prefix}/advertiser_ids") as writer:
+        writer.write(b'advertiser_id\n')
+        _write_csv(writer, pa.table({'advertiser_id': catalog.advertiser_ids.take(pa.array(catalog.active))}))
+
+    rows = {'advertiser_ids': len(catalog.active)}
+    rows['product_views'] = write_log(storage, f"{prefix}/product_views", 'product_views', catalog, days,
+                                      config['events_per_day'], chunk_size, config['seed'])
+    rows['ads_views'] = write_log(storage, f"{prefix}/ads_views", 'ads_views', catalog, days,
+                                  config['impressions_per_day'], chunk_size, config['seed'])
+
+    elapsed = time.perf_counter() - start
+    print(f"Logs sintéticos escritos en {s3_bucket}/{prefix}: {rows['product_views']:,} product_views y "
+          f"{rows['ads_views']:,} ads_views en {elapsed:.1f}s")
+    return {'config': config, 'dates': days, 'rows': rows, 'seconds': round(elapsed, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera logs crudos sintéticos (advertiser_ids, product_views, ads_views)")
+    parser.add_argument('s3_bucket', help='bucket de S3 o file:///ruta')
+    parser.add_argument('prefix', help='prefijo de los logs, p. ej. raw_data')
+    parser.add_argument('--advertisers', type=int, default=DEFAULT_CONFIG['n_advertisers'])
+    parser.add_argument('--products-per-advertiser', type=int, default=DEFAULT_CONFIG['products_per_advertiser'])
+    parser.add_argument('--events-per-day', type=int, default=DEFAULT_CONFIG['events_per_day'],
+                        help='filas de product_views por día')
+    parser.add_argument('--impressions-per-day', type=int, default=None,
+                        help='impresiones de ads_views por día (default: --events-per-day)')
+    parser.add_argument('--days', type=int, default=DEFAULT_CONFIG['days'])
+    parser.add_argument('--start-date', default=DEFAULT_CONFIG['start_date'])
+    parser.add_argument('--ctr', type=float, default=DEFAULT_CONFIG['ctr'], help='CTR medio de los productos')
+    parser.add_argument('--ctr-concentration', type=float, default=DEFAULT_CONFIG['ctr_concentration'])
+    parser.add_argument('--skew', type=float, default=DEFAULT_CONFIG['skew'],
+                        help='exponente de popularidad de advertisers y productos (0 = uniforme)')
+    parser.add_argument('--inactive-fraction', type=float, default=DEFAULT_CONFIG['inactive_fraction'])
+    parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG['seed'])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    generate_logs(
+        args.s3_bucket, args.prefix, chunk_size=args.chunk_size,
+        n_advertisers=args.advertisers,
+        products_per_advertiser=args.products_per_advertiser,
+        events_per_day=args.events_per_day,
+        impressions_per_day=args.impressions_per_day,
+        days=args.days,
+        start_date=args.start_date,
+        ctr=args.ctr,
+        ctr_concentration=args.ctr_concentration,
+        skew=args.skew,
+        inactive_fraction=args.inactive_fraction,
+        seed=args.seed,
+    )
@@ -1,73 +1,127 @@
 """
 Tarea TopCTR: Calcula los 20 productos con mejor CTR por advertiser
 """
-import pandas as pd
-import boto3
-from io import StringIO
-import os
+from functools import partial
 
+from artifacts import DEFAULT_ARTIFACT_FORMAT, artifact_key, read_artifact, write_artifact
+from daily_aggregates import DEFAULT_WINDOW_DAYS, window_counts
+from filter_data import read_active_advertisers
+from id_codes import decode_ids
+from instrumentation import count_rows, phase
+from sharding import DEFAULT_WORKERS, map_advertiser_shards, sort_ranking
+from storage import get_storage
+from top_k import DEFAULT_TOP_K, rank_top_k
 
-def calculate_top_ctr(s3_bucket, filtered_ads_file, output_prefix, date):
+
+def aggregate_ads(df_ads):
+    """
+    Cuenta clicks e impresiones por advertiser y producto
+
+    Los conteos de distintos bloques de datos se pueden sumar con merge_counts.
+
+    Returns:
+        DataFrame con columnas advertiser_id, product_id, clicks, impressions
+    """
+    df_ads = df_ads[df_ads['type'].isin(['click', 'impression'])]
+    return df_ads.assign(
+        clicks=(df_ads['type'] == 'click').astype(int),
+        impressions=(df_ads['type'] == 'impression').astype(int),
+    ).groupby(['advertiser_id', 'product_id'], observed=True)[['clicks', 'impressions']].sum().reset_index()
+
+
+def rank_top_ctr(ctr_counts, date, top_k=DEFAULT_TOP_K):
+    """
+    Arma el resultado de TopCTR a partir de los conteos de clicks e impresiones
+
+    Returns:
+        DataFrame con columnas advertiser_id, product_id, score, rank_position,
+        model_name, date (vacío si no hay datos)
+    """
+    # CTR = clicks / impressions
+    ctr_data = ctr_counts.assign(ctr=ctr_counts['clicks'] / ctr_counts['impressions'].replace(0, 1))
+
+    df_top_ctr = rank_top_k(ctr_data, 'ctr', k=top_k)
+    df_top_ctr['model_name'] = 'TopCTR'
+    df_top_ctr['date'] = date
+    return df_top_ctr.rename(columns={'ctr': 'score', 'rank': 'rank_position'})
+
+
+def save_top_ctr(storage, df_top_ctr, output_prefix, date, artifact_format=DEFAULT_ARTIFACT_FORMAT):
+    """Guarda el resultado de TopCTR y devuelve su key, o None si está vacío"""
+    if df_top_ctr.empty:
+        print("No se encontraron datos para calcular TopCTR")
+        return None
+
+    output_key = artifact_key(output_prefix, 'top_ctr', date, artifact_format)
+    with phase('write'):
+        write_artifact(storage, output_key, decode_ids(df_top_ctr))
+    count_rows('top_ctr_out', len(df_top_ctr))
+    print(f"TopCTR calculado y guardado en {output_key}")
+    return output_key
+
+
+def calculate_top_ctr(s3_bucket, filtered_ads_file, output_prefix, date, top_k=DEFAULT_TOP_K,
+                      artifact_format=DEFAULT_ARTIFACT_FORMAT, window_days=DEFAULT_WINDOW_DAYS, workers=DEFAULT_WORKERS,
+                      advertiser_ids_file=None):
     """
     Calcula los 20 productos con mejor CTR por advertiser
     
     Args:
-        s3_bucket: Nombre del bucket de S3
+        s3_bucket: Nombre del bucket de S3 (o file:///ruta para usar un directorio local)
         filtered_ads_file: Archivo con ads_views filtrados
         output_prefix: Prefijo donde guardar los resultados
         date: Fecha del día procesado
+        top_k: Cantidad de productos a recomendar por advertiser
+        artifact_format: Formato del archivo de resultados ('parquet' o 'csv')
+        window_days: Días de la ventana a rankear; los conteos del día se guardan
+                     siempre y se suman a los ya guardados de los días anteriores
+        workers: Procesos en paralelo; los datos se reparten por hash de advertiser_id
+                 (0 = todos los cores)
+        advertiser_ids_file: Archivo con la lista de advertisers activos; con
+                             window_days > 1 se descartan de la ventana los
+                             advertisers que hoy no están activos
     """
-    s3_client = boto3.client('s3')
+    storage = get_storage(s3_bucket)
+    active_advertisers = None
+    if window_days > 1:
+        if advertiser_ids_file:
+            with phase('read_advertisers'):
+                active_advertisers = read_active_advertisers(storage, advertiser_ids_file)
+        else:
+            print("Aviso: sin advertiser_ids_file la ventana incluye advertisers que hoy no están activos")
     
-    # Leer datos filtrados
-    response = s3_client.get_object(Bucket=s3_bucket, Key=filtered_ads_file)
-    df_ads = pd.read_csv(response['Body'])
+    # Leer datos filtrados con los IDs codificados: solo las columnas necesarias y solo clicks/impresiones
+    with phase('read'):
+        df_ads = read_artifact(
+            storage, filtered_ads_file,
+            columns=['advertiser_id', 'product_id', 'type'],
+            filters=[('type', 'in', ['click', 'impression'])],
+            encoded_ids=True
+        )
+    count_rows('ads_views_in', len(df_ads))
     
-    # Calcular CTR por advertiser y producto
-    # CTR = clicks / impressions
-    df_ads['is_click'] = (df_ads['type'] == 'click').astype(int)
-    df_ads['is_impression'] = (df_ads['type'] == 'impression').astype(int)
-    
-    # Agrupar por advertiser_id y product_id
-    ctr_data = df_ads.groupby(['advertiser_id', 'product_id']).agg({
-        'is_click': 'sum',
-        'is_impression': 'sum'
-    }).reset_index()
-    
-    # Calcular CTR
-    ctr_data['ctr'] = ctr_data['is_click'] / ctr_data['is_impression'].replace(0, 1)
+    # Conteos del día (sumados a los días previos de la ventana), CTR y top K por advertiser
+    with phase('aggregate'):
+        day_counts = map_advertiser_shards(df_ads, aggregate_ads, workers)
+    with phase('window'):
+        ctr_counts = window_counts(storage, output_prefix, 'ads', date, day_counts, window_days,
+                                   active_advertisers)
+    with phase('rank'):
+        df_top_ctr = sort_ranking(map_advertiser_shards(ctr_counts, partial(rank_top_ctr, date=date, top_k=top_k), workers))
     
-    # Obtener top 20 por advertiser
-    top_ctr_results = []
-    for advertiser in ctr_data['advertiser_id'].unique():
-        advertiser_data = ctr_data[ctr_data['advertiser_id'] == advertiser].copy()
-        advertiser_data = advertiser_data.sort_values('ctr', ascending=False).head(20)
-        advertiser_data['rank'] = range(1, len(advertiser_data) + 1)
-        top_ctr_results.append(advertiser_data[['advertiser_id', 'product_id', 'ctr', 'rank']])
-    
-    if top_ctr_results:
-        df_top_ctr = pd.concat(top_ctr_results, ignore_index=True)
-        df_top_ctr['model_name'] = 'TopCTR'
-        df_top_ctr['date'] = date
-        df_top_ctr = df_top_ctr.rename(columns={'ctr': 'score', 'rank': 'rank_position'})
-        
-        # Guardar resultado
-        output_key = f"{output_prefix}/top_ctr_{date}.csv"
-        csv_buffer = StringIO()
-        df_top_ctr.to_csv(csv_buffer, index=False)
-        s3_client.put_object(Bucket=s3_bucket, Key=output_key, Body=csv_buffer.getvalue())
-        print(f"TopCTR calculado y guardado en {output_key}")
-        return output_key
-    else:
-        print("No se encontraron datos para calcular TopCTR")
-        return None
+    return save_top_ctr(storage, df_top_ctr, output_prefix, date, artifact_format)
 
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) != 5:
-        print("Uso: python top_ctr.py <s3_bucket> <filtered_ads_file> <output_prefix> <date>")
+    if len(sys.argv) not in (5, 6, 7, 8, 9, 10):
+        print("Uso: python top_ctr.py <s3_bucket> <filtered_ads_file> <output_prefix> <date> [top_k] [artifact_format] [window_days] [workers] [advertiser_ids_file]")
         sys.exit(1)
     
-    calculate_top_ctr(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+    top_k = int(sys.argv[5]) if len(sys.argv) > 5 else DEFAULT_TOP_K
+    artifact_format = sys.argv[6] if len(sys.argv) > 6 else DEFAULT_ARTIFACT_FORMAT
+    window_days = int(sys.argv[7]) if len(sys.argv) > 7 else DEFAULT_WINDOW_DAYS
+    workers = int(sys.argv[8]) if len(sys.argv) > 8 else DEFAULT_WORKERS
+    advertiser_ids_file = sys.argv[9] if len(sys.argv) > 9 else None
+    calculate_top_ctr(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], top_k, artifact_format, window_days, workers, advertiser_ids_file)
 
@@ -0,0 +1,65 @@
+"""
+Agregación y ranking Top-K por advertiser compartidos por los modelos TopCTR y TopProduct
+"""
+import pandas as pd
+
+from id_codes import concat_encoded
+
+# Cantidad de productos recomendados por advertiser
+DEFAULT_TOP_K = 20
+
+
+def rank_top_k(df, score_column, k=DEFAULT_TOP_K, group_column='advertiser_id', tie_column='product_id'):
+    """
+    Obtiene los K productos con mayor score por advertiser en una sola pasada
+
+    Ordena una única vez todo el DataFrame por (advertiser, score descendente,
+    producto ascendente) y numera las filas dentro de cada advertiser con
+    cumcount, en lugar de filtrar el DataFrame completo por cada advertiser.
+    Los empates de score se resuelven por product_id, por lo que el
+    resultado es determinístico.
+
+    Args:
+        df: DataFrame agregado con una fila por (advertiser, producto)
+        score_column: Columna por la que se rankea (mayor es mejor)
+        k: Cantidad máxima de productos por advertiser
+        group_column: Columna que identifica al advertiser
+        tie_column: Columna usada para desempatar scores iguales
+
+    Returns:
+        DataFrame con columnas [group_column, tie_column, score_column, 'rank'],
+        ordenado por advertiser y rank
+    """
+    columns = [group_column, tie_column, score_column]
+    if df.empty:
+        return pd.DataFrame(columns=columns + ['rank'])
+
+    # mergesort es estable, así el orden no depende del orden de entrada
+    ranked = df[columns].sort_values(
+        [group_column, score_column, tie_column],
+        ascending=[True, False, True],
+        kind='mergesort',
+    )
+    ranked['rank'] = ranked.groupby(group_column, sort=False, observed=True).cumcount() + 1
+    return ranked[ranked['rank'] <= k].reset_index(drop=True)
+
+
+def merge_counts(frames, keys=('advertiser_id', 'product_id')):
+    """
+    Suma conteos parciales calculados sobre distintos bloques de datos
+
+    Args:
+        frames: Lista de DataFrames con las columnas keys y columnas de conteo
+        keys: Columnas que identifican cada fila agregada (texto o IDs codificados,
+              ver id_codes.py)
+
+    Returns:
+        DataFrame con una fila por keys y la suma de cada columna de conteo
+    """
+    non_empty = [frame for frame in frames if not frame.empty]
+    if not non_empty:
+        # Se conservan las columnas del primer bloque para que el resultado siga siendo rankeable
+        return frames[0].iloc[:0] if frames else pd.DataFrame(columns=list(keys))
+    if len(non_empty) == 1:
+        return non_empty[0].reset_index(drop=True)
+    return concat_encoded(non_empty).groupby(list(keys), sort=False, observed=True).sum().reset_index()
@@ -1,62 +1,119 @@
 """
 Tarea TopProduct: Calcula los 20 productos más vistos por advertiser
 """
-import pandas as pd
-import boto3
-from io import StringIO
-import os
+from functools import partial
 
+from artifacts import DEFAULT_ARTIFACT_FORMAT, artifact_key, read_artifact, write_artifact
+from daily_aggregates import DEFAULT_WINDOW_DAYS, window_counts
+from filter_data import read_active_advertisers
+from id_codes import decode_ids
+from instrumentation import count_rows, phase
+from sharding import DEFAULT_WORKERS, map_advertiser_shards, sort_ranking
+from storage import get_storage
+from top_k import DEFAULT_TOP_K, rank_top_k
 
-def calculate_top_product(s3_bucket, filtered_views_file, output_prefix, date):
+
+def aggregate_views(df_views):
+    """
+    Cuenta vistas por advertiser y producto
+
+    Los conteos de distintos bloques de datos se pueden sumar con merge_counts.
+
+    Returns:
+        DataFrame con columnas advertiser_id, product_id, view_count
+    """
+    return df_views.groupby(['advertiser_id', 'product_id'], observed=True).size().reset_index(name='view_count')
+
+
+def rank_top_product(view_counts, date, top_k=DEFAULT_TOP_K):
+    """
+    Arma el resultado de TopProduct a partir de los conteos de vistas
+
+    Returns:
+        DataFrame con columnas advertiser_id, product_id, score, rank_position,
+        model_name, date (vacío si no hay datos)
+    """
+    df_top_product = rank_top_k(view_counts, 'view_count', k=top_k)
+    df_top_product['model_name'] = 'TopProduct'
+    df_top_product['date'] = date
+    return df_top_product.rename(columns={'view_count': 'score', 'rank': 'rank_position'})
+
+
+def save_top_product(storage, df_top_product, output_prefix, date, artifact_format=DEFAULT_ARTIFACT_FORMAT):
+    """Guarda el resultado de TopProduct y devuelve su key, o None si está vacío"""
+    if df_top_product.empty:
+        print("No se encontraron datos para calcular TopProduct")
+        return None
+
+    output_key = artifact_key(output_prefix, 'top_product', date, artifact_format)
+    with phase('write'):
+        write_artifact(storage, output_key, decode_ids(df_top_product))
+    count_rows('top_product_out', len(df_top_product))
+    print(f"TopProduct calculado y guardado en {output_key}")
+    return output_key
+
+
+def calculate_top_product(s3_bucket, filtered_views_file, output_prefix, date, top_k=DEFAULT_TOP_K,
+                          artifact_format=DEFAULT_ARTIFACT_FORMAT, window_days=DEFAULT_WINDOW_DAYS, workers=DEFAULT_WORKERS,
+                          advertiser_ids_file=None):
     """
     Calcula los 20 productos más vistos por advertiser
     
     Args:
-        s3_bucket: Nombre del bucket de S3
+        s3_bucket: Nombre del bucket de S3 (o file:///ruta para usar un directorio local)
         filtered_views_file: Archivo con product_views filtrados
         output_prefix: Prefijo donde guardar los resultados
         date: Fecha del día procesado
+        top_k: Cantidad de productos a recomendar por advertiser
+        artifact_format: Formato del archivo de resultados ('parquet' o 'csv')
+        window_days: Días de la ventana a rankear; los conteos del día se guardan
+                     siempre y se suman a los ya guardados de los días anteriores
+        workers: Procesos en paralelo; los datos se reparten por hash de advertiser_id
+                 (0 = todos los cores)
+        advertiser_ids_file: Archivo con la lista de advertisers activos; con
+                             window_days > 1 se descartan de la ventana los
+                             advertisers que hoy no están activos
     """
-    s3_client = boto3.client('s3')
-    
-    # Leer datos filtrados
-    response = s3_client.get_object(Bucket=s3_bucket, Key=filtered_views_file)
-    df_views = pd.read_csv(response['Body'])
+    storage = get_storage(s3_bucket)
+    active_advertisers = None
+    if window_days > 1:
+        if advertiser_ids_file:
+            with phase('read_advertisers'):
+                active_advertisers = read_active_advertisers(storage, advertiser_ids_file)
+        else:
+            print("Aviso: sin advertiser_ids_file la ventana incluye advertisers que hoy no están activos")
     
-    # Contar vistas por advertiser y producto
-    view_counts = df_views.groupby(['advertiser_id', 'product_id']).size().reset_index(name='view_count')
+    # Leer datos filtrados con los IDs codificados: solo las columnas necesarias
+    with phase('read'):
+        df_views = read_artifact(
+            storage, filtered_views_file,
+            columns=['advertiser_id', 'product_id'],
+            encoded_ids=True
+        )
+    count_rows('product_views_in', len(df_views))
     
-    # Obtener top 20 por advertiser
-    top_product_results = []
-    for advertiser in view_counts['advertiser_id'].unique():
-        advertiser_data = view_counts[view_counts['advertiser_id'] == advertiser].copy()
-        advertiser_data = advertiser_data.sort_values('view_count', ascending=False).head(20)
-        advertiser_data['rank'] = range(1, len(advertiser_data) + 1)
-        top_product_results.append(advertiser_data[['advertiser_id', 'product_id', 'view_count', 'rank']])
+    # Vistas del día (sumadas a los días previos de la ventana) y top K por advertiser
+    with phase('aggregate'):
+        day_counts = map_advertiser_shards(df_views, aggregate_views, workers)
+    with phase('window'):
+        view_counts = window_counts(storage, output_prefix, 'views', date, day_counts, window_days,
+                                    active_advertisers)
+    with phase('rank'):
+        df_top_product = sort_ranking(map_advertiser_shards(view_counts, partial(rank_top_product, date=date, top_k=top_k), workers))
     
-    if top_product_results:
-        df_top_product = pd.concat(top_product_results, ignore_index=True)
-        df_top_product['model_name'] = 'TopProduct'
-        df_top_product['date'] = date
-        df_top_product = df_top_product.rename(columns={'view_count': 'score', 'rank': 'rank_position'})
-        
-        # Guardar resultado
-        output_key = f"{output_prefix}/top_product_{date}.csv"
-        csv_buffer = StringIO()
-        df_top_product.to_csv(csv_buffer, index=False)
-        s3_client.put_object(Bucket=s3_bucket, Key=output_key, Body=csv_buffer.getvalue())
-        print(f"TopProduct calculado y guardado en {output_key}")
-        return output_key
-    else:
-        print("No se encontraron datos para calcular TopProduct")
-        return None
+    return save_top_product(storage, df_top_product, output_prefix, date, artifact_format)
 
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) != 5:
-        print("Uso: python top_product.py <s3_bucket> <filtered_views_file> <output_prefix> <date>")
+    if len(sys.argv) not in (5, 6, 7, 8, 9, 10):
+        print("Uso: python top_product.py <s3_bucket> <filtered_views_file> <output_prefix> <date> [top_k] [artifact_format] [window_days] [workers] [advertiser_ids_file]")
         sys.exit(1)
     
-    calculate_top_product(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+    top_k = int(sys.argv[5]) if len(sys.argv) > 5 else DEFAULT_TOP_K
+    artifact_format = sys.argv[6] if len(sys.argv) > 6 else DEFAULT_ARTIFACT_FORMAT
+    window_days = int(sys.argv[7]) if len(sys.argv) > 7 else DEFAULT_WINDOW_DAYS
+    workers = int(sys.argv[8]) if len(sys.argv) > 8 else DEFAULT_WORKERS
+    advertiser_ids_file = sys.argv[9] if len(sys.argv) > 9 else None
+    calculate_top_product(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], top_k, artifact_format, window_days, workers, advertiser_ids_file)
 
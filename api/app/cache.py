@@ -0,0 +1,141 @@
+"""
+Cache en memoria de la API, invalidado por generación de datos
+
+Las recomendaciones cambian una vez por día, cuando DBWriting carga una
+fecha nueva. Cada entrada del cache queda marcada con la generación vigente
+cuando empezó la consulta que la produjo (la fecha más reciente cargada,
+MAX(date)) y deja de servirse en cuanto aparece una generación nueva; si la
+generación cambió mientras la consulta corría, el resultado no se guarda. La generación se consulta a la base
+como mucho cada CACHE_GENERATION_CHECK_SECONDS, no en cada request.
+
+Configuración por variables de entorno:
+    CACHE_MAX_ENTRIES               entradas máximas, LRU (default 10000; 0 desactiva el cache)
+    CACHE_TTL_SECONDS               vida máxima de una entrada (default 3600)
+    CACHE_GENERATION_CHECK_SECONDS  cada cuánto se consulta la generación (default 30)
+    CACHE_WARMUP_ADVERTISERS        advertisers a precargar al iniciar, separados por coma
+"""
+import os
+import time
+from collections import OrderedDict
+
+CACHE_CONFIG = {
+    'max_entries': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+    'ttl_seconds': float(os.getenv('CACHE_TTL_SECONDS', '3600')),
+    'generation_check_seconds': float(os.getenv('CACHE_GENERATION_CHECK_SECONDS', '30')),
+}
+
+WARMUP_ADVERTISERS = [
+    advertiser_id.strip()
+    for advertiser_id in os.getenv('CACHE_WARMUP_ADVERTISERS', '').split(',')
+    if advertiser_id.strip()
+]
+
+
+class GenerationCache:
+    """Cache LRU con TTL cuyas entradas valen solo para la generación en que se guardaron"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, generation_check_seconds=30, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation_check_seconds = generation_check_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (generation, expires_at, value)
+        self._generation = None
+        self._generation_checked_at = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    async def sync_generation(self, load_generation):
+        """
+        Actualiza la generación vigente si pasó el intervalo de chequeo
+
+        Args:
+            load_generation: Corrutina sin argumentos que devuelve la generación
+                             actual de los datos (p. ej. MAX(date))
+
+        Returns:
+            La generación vigente
+        """
+        now = self._clock()
+        if self._generation_checked_at is not None and now - self._generation_checked_at < self.generation_check_seconds:
+            return self._generation
+
+        # Se marca antes de consultar, así los requests concurrentes no repiten la consulta
+        self._generation_checked_at = now
+        try:
+            self.set_generation(await load_generation())
+        except Exception:
+            self._generation_checked_at = None
+            raise
+        return self._generation
+
+    def set_generation(self, generation):
+        """Fija la generación vigente; si cambió, descarta todas las entradas"""
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._generation = generation
+
+    def get(self, key):
+        """Devuelve el valor cacheado de key o None si no está, venció o es de otra generación"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            generation, expires_at, value = entry
+            if generation == self._generation and self._clock() < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value, generation):
+        """
+        Guarda value para key
+
+        Args:
+            generation: Generación vigente al empezar la consulta que produjo
+                        value (leer .generation antes de consultar); si desde
+                        entonces cambió, value puede ser de la generación
+                        anterior y no se guarda
+        """
+        if not self.enabled or generation != self._generation:
+            return
+        self._entries[key] = (generation, self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'generation': str(self._generation) if self._generation is not None else None,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+# Cache de /recommendations: (advertiser_id, model_name) -> respuesta
+recommendations_cache = GenerationCache(**CACHE_CONFIG)
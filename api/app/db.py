@@ -0,0 +1,101 @@
+"""
+Acceso a la base de datos de la API: pool de conexiones asyncpg
+
+El pool se crea al iniciar la aplicación y se cierra al apagarla (ver el
+lifespan en main.py); cada request toma una conexión ya abierta en lugar de
+pagar el handshake TCP + autenticación contra RDS.
+
+Configuración por variables de entorno:
+    RDS_HOST, RDS_PORT, RDS_DATABASE, RDS_USER, RDS_PASSWORD
+    RDS_SSLMODE                 (default 'prefer')
+    DB_POOL_MIN_SIZE            conexiones abiertas al iniciar (default 2)
+    DB_POOL_MAX_SIZE            máximo de conexiones del pool (default 10)
+    DB_POOL_ACQUIRE_TIMEOUT     segundos de espera por una conexión libre (default 5)
+    DB_COMMAND_TIMEOUT          segundos máximos por consulta (default 10)
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import asyncpg
+from fastapi import HTTPException
+
+# Configuración de base de datos desde variables de entorno
+DB_CONFIG = {
+    'host': os.getenv('RDS_HOST', 'localhost'),
+    'port': os.getenv('RDS_PORT', '5432'),
+    'database': os.getenv('RDS_DATABASE', 'mlops'),
+    'user': os.getenv('RDS_USER', 'postgres'),
+    'password': os.getenv('RDS_PASSWORD', 'password'),
+}
+
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    'acquire_timeout': float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '5')),
+    'command_timeout': float(os.getenv('DB_COMMAND_TIMEOUT', '10')),
+    'ssl': os.getenv('RDS_SSLMODE', 'prefer'),
+}
+
+_pool = None
+
+
+async def create_pool(db_config=None, pool_config=None):
+    """Crea el pool de conexiones de la aplicación"""
+    global _pool
+    db_config = db_config or DB_CONFIG
+    pool_config = {**POOL_CONFIG, **(pool_config or {})}
+    _pool = await asyncpg.create_pool(
+        host=db_config['host'],
+        port=int(db_config['port']),
+        database=db_config['database'],
+        user=db_config['user'],
+        password=db_config['password'],
+        ssl=pool_config['ssl'],
+        min_size=pool_config['min_size'],
+        max_size=pool_config['max_size'],
+        command_timeout=pool_config['command_timeout'],
+    )
+    return _pool
+
+
+async def close_pool():
+    """Cierra el pool esperando a que se devuelvan las conexiones en uso"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def pool_stats():
+    """Conexiones abiertas, libres y máximas del pool, o None si no está inicializado"""
+    if _pool is None:
+        return None
+    return {'size': _pool.get_size(), 'idle': _pool.get_idle_size(), 'max_size': _pool.get_max_size()}
+
+
+def get_pool():
+    if _pool is None:
+        raise HTTPException(status_code=503, detail="El pool de conexiones a la base de datos no está inicializado")
+    return _pool
+
+
+@asynccontextmanager
+async def acquire():
+    """
+    Toma una conexión del pool
+
+    Si no hay una conexión libre en DB_POOL_ACQUIRE_TIMEOUT segundos responde
+    503 en lugar de dejar el request esperando indefinidamente.
+    """
+    pool = get_pool()
+    try:
+        conn = await pool.acquire(timeout=POOL_CONFIG['acquire_timeout'])
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="No hay conexiones libres a la base de datos")
+    except (OSError, asyncpg.PostgresError) as e:
+        raise HTTPException(status_code=500, detail=f"Error conectando a la base de datos: {str(e)}")
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
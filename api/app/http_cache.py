@@ -0,0 +1,81 @@
+"""
+Cache HTTP de los endpoints de lectura: ETag, If-None-Match y Cache-Control
+
+Las respuestas de /recommendations, /history y /stats/ solo cambian cuando
+el pipeline carga una fecha nueva, así que su ETag se arma con la generación
+de los datos (la fecha más reciente cargada) y los parámetros del request.
+Un cliente o CDN que manda If-None-Match con ese ETag recibe 304 sin que la
+API consulte la base. If-None-Match: * solo coincide con un recurso que
+existe, así que los endpoints lo evalúan recién después de encontrarlo (un
+recurso inexistente responde 404, no 304).
+
+Las respuestas se serializan directamente con orjson (ORJSONResponse), que
+es bastante más rápido que el encoder por defecto para los payloads grandes
+de /history.
+
+Configuración por variables de entorno:
+    HTTP_CACHE_MAX_AGE   segundos que clientes y CDNs pueden reusar una respuesta (default 300)
+"""
+import hashlib
+import os
+
+import orjson
+from fastapi.responses import Response
+
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '300'))
+
+
+class ORJSONResponse(Response):
+    """Respuesta JSON serializada con orjson (fechas incluidas), sin pasar por jsonable_encoder"""
+    media_type = 'application/json'
+
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def make_etag(generation, *parts):
+    """
+    ETag fuerte con la generación de los datos y los parámetros que definen la respuesta
+
+    Las partes se hashean: el tag tiene largo fijo sin importar lo que venga
+    en la URL y no repite en el header los parámetros del request.
+    """
+    key = '\0'.join(str(part) for part in (generation, *parts))
+    return '"' + hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+
+def cache_headers(etag):
+    return {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={HTTP_CACHE_MAX_AGE}',
+    }
+
+
+def is_not_modified(request, etag, exists=True):
+    """
+    True si el If-None-Match del request incluye etag (o es '*' y el recurso existe)
+
+    Con exists=False (antes de saber si el recurso existe) solo coinciden los
+    tags explícitos: '*' no debe convertir un 404 en 304.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    # Comparación débil (RFC 9110): W/"x" equivale a "x"
+    return (exists and '*' in tags) or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def not_modified_response(etag):
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def cached_json_response(content, etag=None):
+    """Respuesta JSON serializada con orjson; con etag agrega ETag y Cache-Control"""
+    return ORJSONResponse(content, headers=cache_headers(etag) if etag else None)
+
+
+def cached_raw_json_response(payload, etag=None):
+    """Igual que cached_json_response para un payload que ya es JSON (p. ej. armado en SQL)"""
+    return Response(content=payload, media_type='application/json',
+                    headers=cache_headers(etag) if etag else None)
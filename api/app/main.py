@@ -1,51 +1,170 @@
 """
 API FastAPI para servir recomendaciones de productos
 """
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from pydantic import BaseModel
 from datetime import datetime, timedelta
-import os
 from typing import List, Dict, Optional
+import os
 
-app = FastAPI(title="Recommendations API", version="1.0.0")
+from app.cache import WARMUP_ADVERTISERS, recommendations_cache
+from app.db import acquire, close_pool, create_pool, pool_stats
+from app.http_cache import (
+    ORJSONResponse,
+    cached_json_response,
+    cached_raw_json_response,
+    is_not_modified,
+    make_etag,
+    not_modified_response,
+)
+from app.metrics import MetricsMiddleware, metrics_response, observe_query, register_state_collector
+from app.snapshot import snapshot_store
 
-# Configuración de base de datos desde variables de entorno
-DB_CONFIG = {
-    'host': os.getenv('RDS_HOST', 'localhost'),
-    'port': os.getenv('RDS_PORT', '5432'),
-    'database': os.getenv('RDS_DATABASE', 'mlops'),
-    'user': os.getenv('RDS_USER', 'postgres'),
-    'password': os.getenv('RDS_PASSWORD', 'password'),
-}
 
+MODELS = ['TopCTR', 'TopProduct']
 
-def get_db_connection():
-    """Crea una conexión a la base de datos PostgreSQL"""
-    try:
-        conn = psycopg2.connect(
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            database=DB_CONFIG['database'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password']
+# Máximo de advertisers por request en /recommendations/batch
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '500'))
+
+# Ventana de /history en días: default y máximo del parámetro days
+DEFAULT_HISTORY_DAYS = 7
+MAX_HISTORY_DAYS = int(os.getenv('MAX_HISTORY_DAYS', '90'))
+
+
+async def load_generation():
+    """Generación de los datos: la fecha más reciente cargada en la tabla"""
+    async with acquire() as conn:
+        with observe_query('generation'):
+            return await conn.fetchval("SELECT MAX(date) FROM recommendations")
+
+
+async def fetch_recommendations(conn, advertiser_id, model_name):
+    """
+    Lee de la base las recomendaciones más recientes de un advertiser y modelo
+
+    Returns:
+        Respuesta de /recommendations o None si no hay recomendaciones
+    """
+    # latest_recommendations apunta a la fecha más reciente del par: una sola
+    # consulta por clave primaria + índice (advertiser_id, model_name, date)
+    with observe_query('recommendations'):
+        results = await conn.fetch("""
+            SELECT r.product_id, r.rank_position, r.score, r.date
+            FROM latest_recommendations l
+            INNER JOIN recommendations r
+                ON r.advertiser_id = l.advertiser_id
+                AND r.model_name = l.model_name
+                AND r.date = l.date
+            WHERE l.advertiser_id = $1 AND l.model_name = $2
+            ORDER BY r.rank_position ASC
+            LIMIT 20
+        """, advertiser_id, model_name)
+    if not results:
+        return None
+
+    result_date = results[0]['date']
+    return build_recommendations_response(advertiser_id, model_name, result_date, results)
+
+
+def build_recommendations_response(advertiser_id, model_name, result_date, rows):
+    """Arma la respuesta de un advertiser y modelo (la misma en /recommendations y en el batch)"""
+    return {
+        "advertiser_id": advertiser_id,
+        "model_name": model_name,
+        "date": str(result_date),
+        "recommendations": [
+            {
+                "product_id": row['product_id'],
+                "rank_position": row['rank_position'],
+                "score": row['score'],
+                "date": row['date'],
+            }
+            for row in rows
+        ]
+    }
+
+
+async def fetch_recommendations_batch(conn, advertiser_ids, model_names):
+    """
+    Lee en una sola consulta las recomendaciones más recientes de varios advertisers
+
+    Para cada (advertiser, modelo) toma su fecha más reciente de
+    latest_recommendations y trae sus filas con un join.
+
+    Returns:
+        Diccionario {(advertiser_id, model_name): respuesta}; los pares sin
+        recomendaciones no aparecen
+    """
+    with observe_query('recommendations_batch'):
+        rows = await conn.fetch("""
+            SELECT r.advertiser_id, r.model_name, r.product_id, r.rank_position, r.score, r.date
+            FROM latest_recommendations l
+            INNER JOIN recommendations r
+                ON r.advertiser_id = l.advertiser_id
+                AND r.model_name = l.model_name
+                AND r.date = l.date
+            WHERE l.advertiser_id = ANY($1::varchar[])
+                AND l.model_name = ANY($2::varchar[])
+                AND r.rank_position <= 20
+            ORDER BY r.advertiser_id, r.model_name, r.rank_position ASC
+        """, list(advertiser_ids), list(model_names))
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault((row['advertiser_id'], row['model_name']), []).append(row)
+    return {
+        (advertiser_id, model_name): build_recommendations_response(
+            advertiser_id, model_name, group[0]['date'], group
         )
-        return conn
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error conectando a la base de datos: {str(e)}")
+        for (advertiser_id, model_name), group in grouped.items()
+    }
+
+
+async def warm_up_cache(advertiser_ids):
+    """Precarga en el cache las recomendaciones de ambos modelos de advertiser_ids"""
+    generation = await recommendations_cache.sync_generation(load_generation)
+    async with acquire() as conn:
+        responses = await fetch_recommendations_batch(conn, advertiser_ids, MODELS)
+    for key, response in responses.items():
+        recommendations_cache.put(key, response, generation)
+    print(f"Cache precargado: {len(responses)} entradas de {len(advertiser_ids)} advertisers")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Abre el pool de conexiones al iniciar la aplicación y lo cierra al apagarla"""
+    await create_pool()
+    await snapshot_store.refresh(force=True)
+    if recommendations_cache.enabled and WARMUP_ADVERTISERS:
+        await warm_up_cache(WARMUP_ADVERTISERS)
+    yield
+    await close_pool()
+
+
+app = FastAPI(title="Recommendations API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+register_state_collector(pool_stats, recommendations_cache.stats, snapshot_store.stats)
 
 
 @app.get("/")
-def root():
+async def root():
     """Endpoint raíz"""
     return {"message": "Recommendations API", "version": "1.0.0"}
 
 
-@app.get("/recommendations/{advertiser_id}/{model_name}")
-def get_recommendations(advertiser_id: str, model_name: str):
+@app.get("/recommendations/{advertiser_id}/{model_name}", response_class=ORJSONResponse)
+async def get_recommendations(advertiser_id: str, model_name: str, request: Request):
     """
     Devuelve las recomendaciones del día para un advertiser y modelo específico
+
+    Si hay un snapshot publicado por el pipeline se responde desde ahí sin
+    consultar la base (ver snapshot.py). Si no, las respuestas se leen de la
+    base y se cachean en memoria hasta que se carga una fecha nueva (ver cache.py).
+    El ETag depende de la generación de los datos de donde sale la respuesta
+    (el snapshot o la base): con If-None-Match vigente se responde 304 sin
+    leer la base (ver http_cache.py).
     
     Args:
         advertiser_id: ID del advertiser
@@ -54,87 +173,162 @@ def get_recommendations(advertiser_id: str, model_name: str):
     Returns:
         JSON con las recomendaciones ordenadas por rank_position
     """
-    if model_name not in ['TopCTR', 'TopProduct']:
+    if model_name not in MODELS:
         raise HTTPException(status_code=400, detail="Modelo debe ser 'TopCTR' o 'TopProduct'")
     
-    today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
-    
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        # Buscar la fecha más reciente disponible para este advertiser y modelo
-        cursor.execute("""
-            SELECT MAX(date) as max_date
-            FROM recommendations
-            WHERE advertiser_id = %s AND model_name = %s
-        """, (advertiser_id, model_name))
-        max_date_result = cursor.fetchone()
-        
-        if not max_date_result or not max_date_result['max_date']:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"No se encontraron recomendaciones para advertiser {advertiser_id} y modelo {model_name}"
-            )
-        
-        result_date = max_date_result['max_date']
-        
-        # Buscar recomendaciones para esa fecha
-        query = """
-            SELECT product_id, rank_position, score, date
-            FROM recommendations
-            WHERE advertiser_id = %s 
-                AND model_name = %s 
-                AND date = %s
-            ORDER BY rank_position ASC
-            LIMIT 20
-        """
-        cursor.execute(query, (advertiser_id, model_name, result_date))
-        results = cursor.fetchall()
-        
-        if not results:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"No se encontraron recomendaciones para advertiser {advertiser_id} y modelo {model_name}"
-            )
-        
-        return {
-            "advertiser_id": advertiser_id,
-            "model_name": model_name,
-            "date": str(result_date),
-            "recommendations": [dict(row) for row in results]
-        }
+        # El snapshot está en memoria: se busca primero y, si responde, el ETag
+        # sale de su generación; si no, de la generación de la base
+        snapshot = await snapshot_store.refresh()
+        response = snapshot.lookup(advertiser_id, model_name) if snapshot is not None else None
+        if response is not None:
+            generation = snapshot.generation
+        else:
+            generation = await recommendations_cache.sync_generation(load_generation)
+        etag = make_etag(generation, advertiser_id, model_name) if generation else None
+        # Un ETag explícito vigente ya garantiza que el recurso existe: 304 sin leer la base
+        if etag and is_not_modified(request, etag, exists=False):
+            return not_modified_response(etag)
+
+        key = (advertiser_id, model_name)
+        if response is None and recommendations_cache.enabled:
+            response = recommendations_cache.get(key)
+
+        if response is None:
+            # Generación con la que se cachea el resultado: la de antes de consultar
+            cache_generation = recommendations_cache.generation
+            async with acquire() as conn:
+                response = await fetch_recommendations(conn, advertiser_id, model_name)
+
+            if response is None:
+                raise HTTPException(
+                    status_code=404, 
+                    detail=f"No se encontraron recomendaciones para advertiser {advertiser_id} y modelo {model_name}"
+                )
+
+            recommendations_cache.put(key, response, cache_generation)
+
+        if etag and is_not_modified(request, etag):
+            return not_modified_response(etag)
+        return cached_json_response(response, etag)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo recomendaciones: {str(e)}")
+
+
+class BatchRecommendationsRequest(BaseModel):
+    advertiser_ids: List[str]
+    models: List[str] = MODELS
+
+
+@app.post("/recommendations/batch", response_class=ORJSONResponse)
+async def get_recommendations_batch(request: BatchRecommendationsRequest):
+    """
+    Devuelve las recomendaciones de varios advertisers en un solo request
+
+    Los pares (advertiser, modelo) que están en el snapshot o en el cache no
+    van a la base; el resto se resuelve con una sola consulta.
+
+    Args:
+        request: advertiser_ids (hasta MAX_BATCH_SIZE) y models (por defecto ambos)
+
+    Returns:
+        JSON con las respuestas por advertiser y modelo (el mismo formato que
+        /recommendations/{advertiser_id}/{model_name}) y los advertisers sin
+        recomendaciones en not_found
+    """
+    advertiser_ids = list(dict.fromkeys(request.advertiser_ids))
+    model_names = list(dict.fromkeys(request.models))
+    if len(advertiser_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Se aceptan como máximo {MAX_BATCH_SIZE} advertisers por request")
+    if not model_names or any(model_name not in MODELS for model_name in model_names):
+        raise HTTPException(status_code=400, detail="Los modelos deben ser 'TopCTR' y/o 'TopProduct'")
+
+    try:
+        responses = {}
+        pending = [(advertiser_id, model_name) for advertiser_id in advertiser_ids for model_name in model_names]
+        snapshot = await snapshot_store.refresh()
+        if snapshot is not None:
+            for key in pending:
+                response = snapshot.lookup(*key)
+                if response is not None:
+                    responses[key] = response
+            pending = [key for key in pending if key not in responses]
+
+        if pending and recommendations_cache.enabled:
+            await recommendations_cache.sync_generation(load_generation)
+            for key in pending:
+                response = recommendations_cache.get(key)
+                if response is not None:
+                    responses[key] = response
+            pending = [key for key in pending if key not in responses]
+
+        if pending:
+            # Generación con la que se cachean los resultados: la de antes de consultar
+            cache_generation = recommendations_cache.generation
+            async with acquire() as conn:
+                fetched = await fetch_recommendations_batch(
+                    conn,
+                    dict.fromkeys(advertiser_id for advertiser_id, _ in pending),
+                    dict.fromkeys(model_name for _, model_name in pending),
+                )
+            for key in pending:
+                if key in fetched:
+                    responses[key] = fetched[key]
+                    recommendations_cache.put(key, fetched[key], cache_generation)
+
+        recommendations = {}
+        for advertiser_id in advertiser_ids:
+            by_model = {
+                model_name: responses[(advertiser_id, model_name)]
+                for model_name in model_names
+                if (advertiser_id, model_name) in responses
+            }
+            if by_model:
+                recommendations[advertiser_id] = by_model
+
+        return cached_json_response({
+            "recommendations": recommendations,
+            "not_found": [advertiser_id for advertiser_id in advertiser_ids if advertiser_id not in recommendations]
+        })
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo recomendaciones: {str(e)}")
-    finally:
-        cursor.close()
-        conn.close()
 
 
-@app.get("/stats/")
-def get_stats():
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Devuelve los contadores del cache de recomendaciones (hits, misses, evictions, invalidaciones)"""
+    return recommendations_cache.stats()
+
+
+@app.get("/snapshot/stats")
+async def get_snapshot_stats():
+    """Devuelve el estado del snapshot de recomendaciones (generación, claves, recargas)"""
+    return snapshot_store.stats()
+
+
+@app.get("/stats/", response_class=ORJSONResponse)
+async def get_stats(request: Request):
     """
     Devuelve estadísticas sobre las recomendaciones
+
+    Las estadísticas de cada fecha las precalcula la tarea compute_stats del
+    pipeline en recommendation_stats; si todavía no están (p. ej. la tarea no
+    corrió), se calculan en el momento con la misma función SQL. El ETag es
+    la fecha de las estadísticas.
     
     Returns:
         JSON con estadísticas agregadas
     """
     today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
     
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Obtener la fecha más reciente disponible en toda la tabla
-        cursor.execute("""
-            SELECT MAX(date) as max_date
-            FROM recommendations
-        """)
-        max_date_result = cursor.fetchone()
-        if not max_date_result or not max_date_result['max_date']:
+        # Fecha más reciente disponible en toda la tabla
+        max_date = await recommendations_cache.sync_generation(load_generation)
+        if not max_date:
             return {
                 "date": str(today),
                 "total_advertisers": 0,
@@ -142,160 +336,120 @@ def get_stats():
                 "model_coincidence": [],
                 "top_variation_advertisers": []
             }
-        max_date = max_date_result['max_date']
-        
-        # Cantidad de advertisers únicos
-        cursor.execute("""
-            SELECT COUNT(DISTINCT advertiser_id) as total_advertisers
-            FROM recommendations
-            WHERE date = %s
-        """, (max_date,))
-        total_advertisers = cursor.fetchone()['total_advertisers']
-        
-        # Advertisers con recomendaciones en ambos modelos
-        cursor.execute("""
-            SELECT advertiser_id, COUNT(DISTINCT model_name) as model_count
-            FROM recommendations
-            WHERE date = %s
-            GROUP BY advertiser_id
-            HAVING COUNT(DISTINCT model_name) = 2
-        """, (max_date,))
-        advertisers_both_models = len(cursor.fetchall())
-        
-        # Coincidencia entre modelos (productos que aparecen en ambos modelos para el mismo advertiser)
-        cursor.execute("""
-            SELECT 
-                r1.advertiser_id,
-                COUNT(DISTINCT r1.product_id) as common_products
-            FROM recommendations r1
-            INNER JOIN recommendations r2 
-                ON r1.advertiser_id = r2.advertiser_id 
-                AND r1.product_id = r2.product_id
-                AND r1.date = r2.date
-            WHERE r1.model_name = 'TopCTR' 
-                AND r2.model_name = 'TopProduct'
-                AND r1.date = %s
-            GROUP BY r1.advertiser_id
-        """, (max_date,))
-        model_coincidence = cursor.fetchall()
-        
-        # Estadísticas de variación (comparar con el día anterior)
-        prev_date = max_date - timedelta(days=1)
-        cursor.execute("""
-            SELECT 
-                r1.advertiser_id,
-                COUNT(DISTINCT CASE WHEN r2.product_id IS NULL THEN r1.product_id END) as new_products,
-                COUNT(DISTINCT CASE WHEN r2.product_id IS NOT NULL THEN r1.product_id END) as same_products
-            FROM recommendations r1
-            LEFT JOIN recommendations r2 
-                ON r1.advertiser_id = r2.advertiser_id 
-                AND r1.product_id = r2.product_id
-                AND r1.model_name = r2.model_name
-                AND r2.date = %s
-            WHERE r1.date = %s
-            GROUP BY r1.advertiser_id
-        """, (prev_date, max_date))
-        variation_stats = cursor.fetchall()
-        
-        # Advertisers con más variación
-        advertisers_variation = sorted(
-            variation_stats,
-            key=lambda x: x['new_products'] / (x['new_products'] + x['same_products']) if (x['new_products'] + x['same_products']) > 0 else 0,
-            reverse=True
-        )[:5]
-        
-        return {
-            "date": str(max_date),
-            "total_advertisers": total_advertisers,
-            "advertisers_with_both_models": advertisers_both_models,
-            "model_coincidence": [dict(row) for row in model_coincidence],
-            "top_variation_advertisers": [
-                {
-                    "advertiser_id": row['advertiser_id'],
-                    "variation_rate": row['new_products'] / (row['new_products'] + row['same_products']) if (row['new_products'] + row['same_products']) > 0 else 0,
-                    "new_products": row['new_products'],
-                    "same_products": row['same_products']
-                }
-                for row in advertisers_variation
-            ]
-        }
+
+        etag = make_etag(max_date, 'stats')
+        if is_not_modified(request, etag, exists=False):
+            return not_modified_response(etag)
+
+        async with acquire() as conn:
+            with observe_query('stats'):
+                payload = await conn.fetchval("""
+                    SELECT payload FROM recommendation_stats WHERE date = $1
+                """, max_date)
+            if payload is None:
+                with observe_query('stats_compute'):
+                    payload = await conn.fetchval("SELECT compute_recommendation_stats($1)", max_date)
+
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        # payload ya es el JSON de la respuesta
+        return cached_raw_json_response(payload, etag)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
-    finally:
-        cursor.close()
-        conn.close()
 
 
-@app.get("/history/{advertiser_id}/")
-def get_history(advertiser_id: str):
+@app.get("/history/{advertiser_id}/", response_class=ORJSONResponse)
+async def get_history(
+    advertiser_id: str,
+    request: Request,
+    days: int = Query(DEFAULT_HISTORY_DAYS, ge=1, le=MAX_HISTORY_DAYS),
+):
     """
-    Devuelve todas las recomendaciones para un advertiser en los últimos 7 días
+    Devuelve todas las recomendaciones para un advertiser en los últimos días
+
+    Lee recommendation_history (una fila por fecha y modelo con los productos
+    ya ordenados) y arma el JSON de la respuesta en la base. El ETag depende
+    de la generación de los datos, del día (el período se cuenta desde hoy)
+    y de la ventana.
     
     Args:
         advertiser_id: ID del advertiser
+        days: Días hacia atrás desde hoy (default 7, máximo MAX_HISTORY_DAYS)
     
     Returns:
         JSON con recomendaciones históricas agrupadas por fecha y modelo
     """
     today = datetime.now().date()
-    seven_days_ago = today - timedelta(days=7)
+    start_date = today - timedelta(days=days)
     
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        query = """
-            SELECT model_name, product_id, rank_position, score, date
-            FROM recommendations
-            WHERE advertiser_id = %s 
-                AND date >= %s
-                AND date <= %s
-            ORDER BY date DESC, model_name, rank_position ASC
-        """
-        cursor.execute(query, (advertiser_id, seven_days_ago, today))
-        results = cursor.fetchall()
-        
-        if not results:
+        generation = await recommendations_cache.sync_generation(load_generation)
+        etag = make_etag(generation, advertiser_id, 'history', today, days) if generation else None
+        if etag and is_not_modified(request, etag, exists=False):
+            return not_modified_response(etag)
+
+        async with acquire() as conn:
+            # NULL si el advertiser no tiene recomendaciones en el período
+            with observe_query('history'):
+                payload = await conn.fetchval("""
+                    WITH by_date AS (
+                        SELECT h.date, json_object_agg(
+                            h.model_name,
+                            (
+                                SELECT json_agg(json_build_object(
+                                    'product_id', p.product_id,
+                                    'rank_position', p.rank_position,
+                                    'score', p.score
+                                ) ORDER BY p.ordinality)
+                                FROM unnest(h.product_ids, h.rank_positions, h.scores)
+                                    WITH ORDINALITY AS p(product_id, rank_position, score, ordinality)
+                            )
+                            ORDER BY h.model_name
+                        ) AS models
+                        FROM recommendation_history h
+                        WHERE h.advertiser_id = $1
+                            AND h.date >= $2
+                            AND h.date <= $3
+                        GROUP BY h.date
+                    )
+                    SELECT json_build_object(
+                        'advertiser_id', $1::text,
+                        'period', json_build_object('start_date', $2::date, 'end_date', $3::date),
+                        'history', json_object_agg(date, models ORDER BY date DESC)
+                    )
+                    FROM by_date
+                    HAVING COUNT(*) > 0
+                """, advertiser_id, start_date, today)
+
+        if payload is None:
             raise HTTPException(
                 status_code=404,
-                detail=f"No se encontraron recomendaciones para advertiser {advertiser_id} en los últimos 7 días"
+                detail=f"No se encontraron recomendaciones para advertiser {advertiser_id} en los últimos {days} días"
             )
-        
-        # Agrupar por fecha y modelo
-        history = {}
-        for row in results:
-            date_str = str(row['date'])
-            model = row['model_name']
-            
-            if date_str not in history:
-                history[date_str] = {}
-            if model not in history[date_str]:
-                history[date_str][model] = []
-            
-            history[date_str][model].append({
-                "product_id": row['product_id'],
-                "rank_position": row['rank_position'],
-                "score": float(row['score'])
-            })
-        
-        return {
-            "advertiser_id": advertiser_id,
-            "period": {
-                "start_date": str(seven_days_ago),
-                "end_date": str(today)
-            },
-            "history": history
-        }
+
+        if etag and is_not_modified(request, etag):
+            return not_modified_response(etag)
+        # payload ya es el JSON de la respuesta
+        return cached_raw_json_response(payload, etag)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo historial: {str(e)}")
-    finally:
-        cursor.close()
-        conn.close()
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Métricas en formato Prometheus: latencia y códigos por ruta, latencia de
+    cada consulta SQL y estado del pool, del cache y del snapshot (ver metrics.py)
+    """
+    return metrics_response()
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """
     Endpoint de health check - debe devolver 200 OK para App Runner
     Simplificado para que siempre devuelva 200 OK sin verificar DB
@@ -0,0 +1,124 @@
+"""
+Métricas de la API en formato Prometheus (GET /metrics)
+
+- http_request_duration_seconds: histograma de latencia por método y ruta
+  (la plantilla de la ruta, p. ej. /recommendations/{advertiser_id}/{model_name},
+  no la URL, así la cantidad de series queda acotada).
+- http_requests_total: requests por método, ruta y código de respuesta.
+- db_query_duration_seconds: histograma de latencia de cada consulta SQL de
+  los endpoints, por nombre de consulta (ver observe_query).
+- Gauges del pool de conexiones, del cache en memoria y del snapshot, que se
+  leen recién cuando Prometheus consulta /metrics.
+
+El middleware es ASGI puro (sin BaseHTTPMiddleware) y solo suma un par de
+observaciones por request, así se puede dejar activo en producción.
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.responses import Response
+
+# Buckets pensados para requests servidos desde memoria (sub-ms) hasta consultas lentas
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Rutas que no coinciden con ningún endpoint (404): un único valor para no crear una serie por URL
+UNMATCHED_ROUTE = '<unmatched>'
+
+registry = CollectorRegistry()
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Latencia de los requests HTTP',
+    ['method', 'route'], buckets=LATENCY_BUCKETS, registry=registry,
+)
+REQUESTS = Counter(
+    'http_requests', 'Requests HTTP por código de respuesta',
+    ['method', 'route', 'status'], registry=registry,
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Latencia de las consultas SQL de la API',
+    ['query'], buckets=LATENCY_BUCKETS, registry=registry,
+)
+
+
+@contextmanager
+def observe_query(name):
+    """Registra en db_query_duration_seconds{query=name} lo que tarda el bloque"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_QUERY_DURATION.labels(name).observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide latencia y códigos de respuesta por ruta"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # El router deja en scope la ruta que atendió el request
+            route = scope.get('route')
+            route = getattr(route, 'path', UNMATCHED_ROUTE)
+            method = scope['method']
+            REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - start)
+            REQUESTS.labels(method, route, str(status)).inc()
+
+
+class StateCollector:
+    """Expone como métricas el estado del pool, del cache y del snapshot al momento de la consulta"""
+
+    def __init__(self, pool_stats, cache_stats, snapshot_stats):
+        self._pool_stats = pool_stats
+        self._cache_stats = cache_stats
+        self._snapshot_stats = snapshot_stats
+
+    def collect(self):
+        pool = self._pool_stats()
+        if pool is not None:
+            yield GaugeMetricFamily('db_pool_size', 'Conexiones abiertas del pool', value=pool['size'])
+            yield GaugeMetricFamily('db_pool_idle', 'Conexiones libres del pool', value=pool['idle'])
+            yield GaugeMetricFamily('db_pool_max_size', 'Máximo de conexiones del pool', value=pool['max_size'])
+
+        cache = self._cache_stats()
+        yield GaugeMetricFamily('cache_entries', 'Entradas del cache de recomendaciones', value=cache['entries'])
+        yield GaugeMetricFamily('cache_max_entries', 'Entradas máximas del cache de recomendaciones',
+                                value=cache['max_entries'])
+        yield CounterMetricFamily('cache_hits', 'Hits del cache de recomendaciones', value=cache['hits'])
+        yield CounterMetricFamily('cache_misses', 'Misses del cache de recomendaciones', value=cache['misses'])
+        yield CounterMetricFamily('cache_evictions', 'Entradas descartadas por LRU', value=cache['evictions'])
+        yield CounterMetricFamily('cache_invalidations', 'Vaciados del cache por cambio de generación',
+                                  value=cache['invalidations'])
+
+        snapshot = self._snapshot_stats()
+        yield GaugeMetricFamily('snapshot_loaded', 'Si hay un snapshot de recomendaciones cargado',
+                                value=1 if snapshot['loaded'] else 0)
+        yield GaugeMetricFamily('snapshot_keys', 'Pares advertiser/modelo del snapshot cargado', value=snapshot['keys'])
+        yield CounterMetricFamily('snapshot_reloads', 'Recargas del snapshot', value=snapshot['reloads'])
+
+
+def register_state_collector(pool_stats, cache_stats, snapshot_stats):
+    """Registra el collector de estado; cada argumento es una función sin argumentos que devuelve un dict"""
+    registry.register(StateCollector(pool_stats, cache_stats, snapshot_stats))
+
+
+def metrics_response():
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,217 @@
+"""
+Snapshot en memoria de las recomendaciones vigentes, abierto con mmap
+
+La tarea PublishSnapshot del pipeline publica después de cada carga un
+archivo binario con las recomendaciones que devuelve /recommendations (ver
+airflow/scripts/serving_snapshot.py, que documenta el formato). La API lo
+mapea en memoria y resuelve cada advertiser y modelo con una búsqueda binaria
+sobre las claves ordenadas, sin consultar Postgres. Si el snapshot no está
+configurado o no existe, los endpoints usan la base como siempre.
+
+El pipeline reemplaza el archivo de forma atómica; la API lo vuelve a abrir
+cuando cambia, y los requests en curso siguen leyendo el mapeo anterior.
+
+Configuración por variables de entorno:
+    SNAPSHOT_PATH            archivo local del snapshot (vacío desactiva el snapshot)
+    SNAPSHOT_URI             s3://bucket/key desde donde se descarga a SNAPSHOT_PATH (opcional)
+    SNAPSHOT_CHECK_SECONDS   cada cuánto se verifica si hay un snapshot nuevo (default 30)
+"""
+import asyncio
+import mmap
+import os
+import struct
+import tempfile
+import time
+from datetime import date, timedelta
+
+SNAPSHOT_MAGIC = b'RECSNAP\0'
+SNAPSHOT_VERSION = 1
+HEADER_FORMAT = '<8sIIIi8Q'
+
+EPOCH = date(1970, 1, 1)
+
+SNAPSHOT_CONFIG = {
+    'path': os.getenv('SNAPSHOT_PATH', ''),
+    'uri': os.getenv('SNAPSHOT_URI', ''),
+    'check_seconds': float(os.getenv('SNAPSHOT_CHECK_SECONDS', '30')),
+}
+
+
+class Snapshot:
+    """Snapshot mapeado en memoria; lookup() es O(log n) sobre las claves"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, n_keys, n_rows, generation, *offsets = struct.unpack_from(HEADER_FORMAT, buffer)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} no es un snapshot de recomendaciones versión {SNAPSHOT_VERSION}")
+
+        ends = offsets[1:] + [len(buffer)]
+        sizes = [
+            4 * (n_keys + 1), None, 4 * n_keys, 4 * (n_keys + 1),
+            4 * (n_rows + 1), None, 4 * n_rows, 8 * n_rows,
+        ]
+        sections = [
+            buffer[offset:offset + size] if size is not None else buffer[offset:end]
+            for offset, end, size in zip(offsets, ends, sizes)
+        ]
+        self._key_offsets = sections[0].cast('I')
+        self._key_bytes = sections[1]
+        self._key_dates = sections[2].cast('i')
+        self._row_starts = sections[3].cast('I')
+        self._product_offsets = sections[4].cast('I')
+        self._product_bytes = sections[5]
+        self._ranks = sections[6].cast('i')
+        self._scores = sections[7].cast('d')
+
+        self.path = path
+        self.n_keys = n_keys
+        self.n_rows = n_rows
+        self.generation = EPOCH + timedelta(days=generation)
+
+    def _key(self, index):
+        return bytes(self._key_bytes[self._key_offsets[index]:self._key_offsets[index + 1]])
+
+    def _find(self, key):
+        low, high = 0, self.n_keys
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.n_keys and self._key(low) == key:
+            return low
+        return None
+
+    def lookup(self, advertiser_id, model_name):
+        """
+        Devuelve la respuesta de /recommendations de un advertiser y modelo
+
+        Returns:
+            El mismo diccionario que arma la API desde la base, o None si el
+            par no tiene recomendaciones
+        """
+        index = self._find(f"{advertiser_id}\0{model_name}".encode('utf-8'))
+        if index is None:
+            return None
+
+        result_date = EPOCH + timedelta(days=self._key_dates[index])
+        recommendations = []
+        for row in range(self._row_starts[index], self._row_starts[index + 1]):
+            score = self._scores[row]
+            recommendations.append({
+                "product_id": str(
+                    self._product_bytes[self._product_offsets[row]:self._product_offsets[row + 1]], 'utf-8'
+                ),
+                "rank_position": self._ranks[row],
+                "score": None if score != score else score,
+                "date": result_date,
+            })
+        return {
+            "advertiser_id": advertiser_id,
+            "model_name": model_name,
+            "date": str(result_date),
+            "recommendations": recommendations,
+        }
+
+
+def _download_s3(uri, path, etag=None):
+    """Descarga s3://bucket/key a path si cambió su ETag; devuelve el ETag vigente"""
+    import boto3
+
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    client = boto3.client('s3')
+    current = client.head_object(Bucket=bucket, Key=key)['ETag']
+    if current != etag:
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        os.close(fd)
+        try:
+            client.download_file(bucket, key, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return current
+
+
+class SnapshotStore:
+    """Mantiene abierto el snapshot más reciente y lo reemplaza cuando cambia el archivo"""
+
+    def __init__(self, path='', uri='', check_seconds=30, clock=time.monotonic):
+        self.path = path
+        self.uri = uri
+        self.check_seconds = check_seconds
+        self._clock = clock
+        self._snapshot = None
+        self._file_id = None
+        self._etag = None
+        self._checked_at = None
+        self.reloads = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    async def refresh(self, force=False):
+        """
+        Abre el snapshot si cambió desde la última verificación
+
+        Verifica como mucho cada check_seconds. Si el archivo no existe o no
+        se puede leer, conserva el snapshot anterior (o ninguno).
+
+        Returns:
+            El snapshot vigente o None
+        """
+        now = self._clock()
+        if not self.enabled or (
+            not force and self._checked_at is not None and now - self._checked_at < self.check_seconds
+        ):
+            return self._snapshot
+        self._checked_at = now
+
+        try:
+            if self.uri:
+                self._etag = await asyncio.to_thread(_download_s3, self.uri, self.path, self._etag)
+            stat = os.stat(self.path)
+        except Exception as e:
+            if self._snapshot is None:
+                print(f"Snapshot no disponible ({e}): se usa la base de datos")
+            return self._snapshot
+
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id != self._file_id:
+            try:
+                snapshot = Snapshot(self.path)
+            except Exception as e:
+                print(f"Error abriendo el snapshot {self.path}: {e}")
+                return self._snapshot
+            # Los requests en curso conservan la referencia al mapeo anterior
+            self._snapshot = snapshot
+            self._file_id = file_id
+            self.reloads += 1
+            print(f"Snapshot cargado: generación {snapshot.generation}, "
+                  f"{snapshot.n_keys} claves, {snapshot.n_rows} filas")
+        return self._snapshot
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'enabled': self.enabled,
+            'loaded': snapshot is not None,
+            'generation': str(snapshot.generation) if snapshot is not None else None,
+            'keys': snapshot.n_keys if snapshot is not None else 0,
+            'rows': snapshot.n_rows if snapshot is not None else 0,
+            'reloads': self.reloads,
+        }
+
+
+# Snapshot de /recommendations
+snapshot_store = SnapshotStore(**SNAPSHOT_CONFIG)
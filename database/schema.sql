@@ -1,8 +1,12 @@
 -- Esquema de base de datos para almacenar recomendaciones
--- Tabla para almacenar las recomendaciones de ambos modelos
+-- Tabla para almacenar las recomendaciones de ambos modelos, particionada por
+-- día (recommendations_pYYYYMMDD). Las particiones las crea y reemplaza
+-- DBWriting y la retención las borra (ver airflow/scripts/db_partitions.py).
+-- Para migrar una tabla recommendations sin particionar usar
+-- scripts/create_schema_rds.py.
 
 CREATE TABLE IF NOT EXISTS recommendations (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     advertiser_id VARCHAR(50) NOT NULL,
     model_name VARCHAR(20) NOT NULL,  -- 'TopCTR' o 'TopProduct'
     product_id VARCHAR(50) NOT NULL,
@@ -10,11 +14,143 @@ CREATE TABLE IF NOT EXISTS recommendations (
     score FLOAT,  -- CTR para TopCTR, cantidad de vistas para TopProduct
     date DATE NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- En una tabla particionada las claves deben incluir la columna de partición
+    PRIMARY KEY (id, date),
     UNIQUE(advertiser_id, model_name, product_id, date)
-);
+) PARTITION BY RANGE (date);
 
 -- Índices para mejorar las consultas
 CREATE INDEX IF NOT EXISTS idx_recommendations_advertiser_model_date 
     ON recommendations(advertiser_id, model_name, date);
 CREATE INDEX IF NOT EXISTS idx_recommendations_date 
     ON recommendations(date);
+
+-- Fecha más reciente cargada por (advertiser, modelo): /recommendations la usa para
+-- leer las filas vigentes con una sola consulta. La actualiza DBWriting en la misma
+-- transacción que la carga.
+CREATE TABLE IF NOT EXISTS latest_recommendations (
+    advertiser_id VARCHAR(50) NOT NULL,
+    model_name VARCHAR(20) NOT NULL,
+    date DATE NOT NULL,
+    PRIMARY KEY (advertiser_id, model_name)
+);
+
+-- Completa los punteros de los datos cargados antes de que existiera la tabla
+INSERT INTO latest_recommendations (advertiser_id, model_name, date)
+SELECT advertiser_id, model_name, MAX(date)
+FROM recommendations
+GROUP BY advertiser_id, model_name
+ON CONFLICT (advertiser_id, model_name) DO NOTHING;
+
+-- Historial para /history: una fila por (advertiser, fecha, modelo) con los
+-- productos, posiciones y scores ordenados por ranking. La escribe DBWriting
+-- en la misma transacción que la carga.
+CREATE TABLE IF NOT EXISTS recommendation_history (
+    advertiser_id VARCHAR(50) NOT NULL,
+    date DATE NOT NULL,
+    model_name VARCHAR(20) NOT NULL,
+    product_ids VARCHAR(50)[] NOT NULL,
+    rank_positions INTEGER[] NOT NULL,
+    scores FLOAT[] NOT NULL,
+    PRIMARY KEY (advertiser_id, date, model_name)
+);
+
+-- Completa el historial de los datos cargados antes de que existiera la tabla
+INSERT INTO recommendation_history (advertiser_id, date, model_name, product_ids, rank_positions, scores)
+SELECT advertiser_id, date, model_name,
+    array_agg(product_id ORDER BY rank_position),
+    array_agg(rank_position ORDER BY rank_position),
+    array_agg(score ORDER BY rank_position)
+FROM recommendations
+GROUP BY advertiser_id, date, model_name
+ON CONFLICT (advertiser_id, date, model_name) DO NOTHING;
+
+-- Estadísticas de /stats/ precalculadas por el pipeline (una fila por fecha cargada)
+CREATE TABLE IF NOT EXISTS recommendation_stats (
+    date DATE PRIMARY KEY,
+    payload JSON NOT NULL,  -- Respuesta de /stats/ para esa fecha
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Calcula las estadísticas de /stats/ de una fecha: advertisers, advertisers con ambos
+-- modelos, coincidencia entre modelos y los 5 advertisers con más variación respecto
+-- del día anterior. Lo usa la tarea compute_stats y, si falta la fila, la API.
+CREATE OR REPLACE FUNCTION compute_recommendation_stats(stats_date DATE)
+RETURNS JSON
+LANGUAGE SQL STABLE
+AS $$
+    WITH day AS (
+        SELECT advertiser_id, model_name, product_id
+        FROM recommendations
+        WHERE date = stats_date
+    ),
+    previous_day AS (
+        SELECT advertiser_id, model_name, product_id
+        FROM recommendations
+        WHERE date = stats_date - 1
+    ),
+    -- Productos que aparecen en ambos modelos para el mismo advertiser
+    coincidence AS (
+        SELECT r1.advertiser_id, COUNT(DISTINCT r1.product_id) AS common_products
+        FROM day r1
+        INNER JOIN day r2
+            ON r1.advertiser_id = r2.advertiser_id
+            AND r1.product_id = r2.product_id
+        WHERE r1.model_name = 'TopCTR'
+            AND r2.model_name = 'TopProduct'
+        GROUP BY r1.advertiser_id
+    ),
+    -- Productos nuevos y repetidos respecto del día anterior
+    variation AS (
+        SELECT
+            r1.advertiser_id,
+            COUNT(DISTINCT CASE WHEN r2.product_id IS NULL THEN r1.product_id END) AS new_products,
+            COUNT(DISTINCT CASE WHEN r2.product_id IS NOT NULL THEN r1.product_id END) AS same_products
+        FROM day r1
+        LEFT JOIN previous_day r2
+            ON r1.advertiser_id = r2.advertiser_id
+            AND r1.product_id = r2.product_id
+            AND r1.model_name = r2.model_name
+        GROUP BY r1.advertiser_id
+    ),
+    top_variation AS (
+        SELECT
+            advertiser_id,
+            CASE WHEN new_products + same_products > 0
+                THEN new_products::FLOAT / (new_products + same_products)
+                ELSE 0 END AS variation_rate,
+            new_products,
+            same_products
+        FROM variation
+        ORDER BY variation_rate DESC, advertiser_id
+        LIMIT 5
+    )
+    SELECT json_build_object(
+        'date', to_char(stats_date, 'YYYY-MM-DD'),
+        'total_advertisers', (SELECT COUNT(DISTINCT advertiser_id) FROM day),
+        'advertisers_with_both_models', (
+            SELECT COUNT(*) FROM (
+                SELECT advertiser_id
+                FROM day
+                GROUP BY advertiser_id
+                HAVING COUNT(DISTINCT model_name) = 2
+            ) both_models
+        ),
+        'model_coincidence', COALESCE(
+            (SELECT json_agg(json_build_object(
+                'advertiser_id', advertiser_id,
+                'common_products', common_products
+            ) ORDER BY advertiser_id) FROM coincidence),
+            '[]'::JSON
+        ),
+        'top_variation_advertisers', COALESCE(
+            (SELECT json_agg(json_build_object(
+                'advertiser_id', advertiser_id,
+                'variation_rate', variation_rate,
+                'new_products', new_products,
+                'same_products', same_products
+            ) ORDER BY variation_rate DESC, advertiser_id) FROM top_variation),
+            '[]'::JSON
+        )
+    )
+$$;
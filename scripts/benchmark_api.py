@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia de /recommendations: conexión por request vs. pool async
+
+Compara, con la misma concurrencia y los mismos advertisers:
+  - conexión por request: el handler anterior (psycopg2.connect + 2 consultas
+    + close por request, en un threadpool como los endpoints `def` de FastAPI)
+  - pool: el handler async actual (api/app/main.py) sobre el pool asyncpg,
+    sin cache y con el cache en memoria (api/app/cache.py)
+
+y reporta p50, p99, requests por segundo y, con cache, el hit rate de la
+corrida (de recommendations_cache.stats()). Usa las mismas variables de
+entorno RDS_* que la API y toma advertisers existentes de la tabla.
+
+Los requests se reparten entre --hot-pairs pares (advertiser, modelo) con
+popularidad Zipf de exponente --skew, como el tráfico real, donde pocos
+advertisers concentran la mayoría de los requests. Con muchos pares
+distintos y pocos requests casi todo sería miss y la corrida con cache no
+mediría el cache.
+
+Uso:
+    python scripts/benchmark_api.py [--requests 2000] [--concurrency 32] [--pool-max-size 10] \\
+        [--hot-pairs 200] [--skew 1.0]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psycopg2
+from starlette.requests import Request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from app import db  # noqa: E402
+from app.cache import recommendations_cache  # noqa: E402
+from app.main import get_recommendations  # noqa: E402
+
+
+def legacy_request(advertiser_id, model_name):
+    """Reproduce el acceso a la base del handler con conexión por request"""
+    start = time.perf_counter()
+    conn = psycopg2.connect(
+        host=db.DB_CONFIG['host'],
+        port=db.DB_CONFIG['port'],
+        database=db.DB_CONFIG['database'],
+        user=db.DB_CONFIG['user'],
+        password=db.DB_CONFIG['password'],
+    )
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT MAX(date) FROM recommendations WHERE advertiser_id = %s AND model_name = %s
+        """, (advertiser_id, model_name))
+        result_date = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT product_id, rank_position, score, date
+            FROM recommendations
+            WHERE advertiser_id = %s AND model_name = %s AND date = %s
+            ORDER BY rank_position ASC
+            LIMIT 20
+        """, (advertiser_id, model_name, result_date))
+        cursor.fetchall()
+        cursor.close()
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+
+def run_legacy(requests, concurrency):
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(lambda request: legacy_request(*request), requests))
+
+
+async def run_pooled(requests, concurrency, pool_max_size, cache_entries=0):
+    """Corre los requests con el handler actual; devuelve las latencias y el hit rate del cache en la corrida"""
+    recommendations_cache.max_entries = cache_entries
+    recommendations_cache.clear()
+    before = recommendations_cache.stats()
+    await db.create_pool(pool_config={'min_size': pool_max_size, 'max_size': pool_max_size})
+    semaphore = asyncio.Semaphore(concurrency)
+    # Sin If-None-Match: cada request arma la respuesta completa
+    request = Request({'type': 'http', 'headers': []})
+
+    async def timed(advertiser_id, model_name):
+        async with semaphore:
+            start = time.perf_counter()
+            await get_recommendations(advertiser_id, model_name, request)
+            return time.perf_counter() - start
+
+    try:
+        latencies = await asyncio.gather(*(timed(*request) for request in requests))
+    finally:
+        await db.close_pool()
+
+    after = recommendations_cache.stats()
+    hits, misses = after['hits'] - before['hits'], after['misses'] - before['misses']
+    hit_rate = hits / (hits + misses) if cache_entries and hits + misses else None
+    return latencies, hit_rate
+
+
+def sample_requests(n_requests, hot_pairs=200, skew=1.0, seed=42):
+    """Requests sobre hot_pairs pares existentes, con popularidad 1 / rank^skew"""
+    conn = psycopg2.connect(**{('dbname' if k == 'database' else k): v for k, v in db.DB_CONFIG.items()})
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT advertiser_id, model_name FROM latest_recommendations ORDER BY advertiser_id, model_name
+        """)
+        pairs = cursor.fetchall()
+    finally:
+        conn.close()
+    if not pairs:
+        raise SystemExit("La tabla recommendations está vacía: cargar datos antes de correr el benchmark")
+    rng = random.Random(seed)
+    pairs = rng.sample(pairs, min(hot_pairs, len(pairs)))
+    weights = [1 / rank ** skew for rank in range(1, len(pairs) + 1)]
+    return rng.choices(pairs, weights=weights, k=n_requests)
+
+
+def report(name, latencies, elapsed, hit_rate=None):
+    latencies_ms = np.array(latencies) * 1000
+    hit_rate = f"{hit_rate:.1%}" if hit_rate is not None else '-'
+    print(f"{name:>22} {np.percentile(latencies_ms, 50):9.2f} {np.percentile(latencies_ms, 99):9.2f} "
+          f"{len(latencies) / elapsed:10.0f} {hit_rate:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--pool-max-size', type=int, default=10)
+    parser.add_argument('--hot-pairs', type=int, default=200, help='pares (advertiser, modelo) distintos pedidos')
+    parser.add_argument('--skew', type=float, default=1.0, help='exponente Zipf de popularidad (0 = uniforme)')
+    args = parser.parse_args()
+
+    requests = sample_requests(args.requests, args.hot_pairs, args.skew)
+    print(f"{args.requests} requests sobre {len(set(requests))} pares distintos, concurrencia {args.concurrency}, "
+          f"pool de {args.pool_max_size} conexiones")
+    print(f"{'modo':>22} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>10} {'hit rate':>9}")
+
+    start = time.perf_counter()
+    latencies = run_legacy(requests, args.concurrency)
+    report('conexión por request', latencies, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    latencies, _ = asyncio.run(run_pooled(requests, args.concurrency, args.pool_max_size))
+    report('pool async', latencies, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    latencies, hit_rate = asyncio.run(
+        run_pooled(requests, args.concurrency, args.pool_max_size, cache_entries=len(requests))
+    )
+    report('pool async + cache', latencies, time.perf_counter() - start, hit_rate)
+
+
+if __name__ == "__main__":
+    main()
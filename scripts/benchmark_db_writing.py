@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la carga de recomendaciones en PostgreSQL
+
+Compara la carga en bloque (COPY a staging + reemplazo en una transacción)
+contra la carga original fila por fila (INSERT ... ON CONFLICT) sobre un
+PostgreSQL local con el esquema de database/schema.sql.
+
+Uso:
+    python scripts/benchmark_db_writing.py --host localhost --port 5432 --database mlops \\
+        --user postgres --password postgres [--advertisers 1000 10000] [--methods copy insert]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from db_partitions import partition_name  # noqa: E402
+from db_writing import LOAD_METHODS, insert_recommendations, load_recommendations  # noqa: E402
+from top_k import DEFAULT_TOP_K  # noqa: E402
+
+BENCHMARK_DATE = '2000-01-01'
+
+
+def build_recommendations(n_advertisers, top_k=DEFAULT_TOP_K, date=BENCHMARK_DATE, seed=42):
+    """Genera recomendaciones sintéticas para ambos modelos (n_advertisers × top_k × 2 filas)"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for model_name in ('TopCTR', 'TopProduct'):
+        n_rows = n_advertisers * top_k
+        frames.append(pd.DataFrame({
+            'advertiser_id': np.repeat([f"BENCH{i:07d}" for i in range(n_advertisers)], top_k),
+            'product_id': [f"PRD{i:09d}" for i in range(n_rows)],
+            'score': rng.random(n_rows),
+            'rank_position': np.tile(np.arange(1, top_k + 1), n_advertisers),
+            'model_name': model_name,
+            'date': date,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_load(conn, df, method):
+    """Carga df con el método indicado, hace commit y devuelve los segundos transcurridos"""
+    start = time.perf_counter()
+    with conn.cursor() as cursor:
+        if method == 'copy':
+            load_recommendations(cursor, df, BENCHMARK_DATE)
+        else:
+            for model_name, df_model in df.groupby('model_name'):
+                insert_recommendations(cursor, df_model, model_name, BENCHMARK_DATE)
+    conn.commit()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--database', default='mlops')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='postgres')
+    parser.add_argument('--advertisers', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--methods', nargs='+', choices=LOAD_METHODS, default=list(LOAD_METHODS))
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(host=args.host, port=args.port, database=args.database,
+                            user=args.user, password=args.password)
+    schema_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'schema.sql')
+    with conn.cursor() as cursor, open(schema_path) as f:
+        cursor.execute(f.read())
+    conn.commit()
+
+    print(f"{'advertisers':>12} {'filas':>10} {'método':>8} {'tiempo (s)':>11} {'filas/s':>12}")
+    try:
+        for n_advertisers in args.advertisers:
+            df = build_recommendations(n_advertisers)
+            for method in args.methods:
+                elapsed = run_load(conn, df, method)
+                print(f"{n_advertisers:>12,} {len(df):>10,} {method:>8} {elapsed:11.2f} {len(df) / elapsed:12,.0f}")
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {partition_name(BENCHMARK_DATE)}")
+            cursor.execute("DELETE FROM latest_recommendations WHERE date = %s", (BENCHMARK_DATE,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia de /recommendations: MAX(date) + filas vs. latest_recommendations
+
+Compara, sobre el mismo pool asyncpg y sin cache, las dos formas de leer las
+recomendaciones más recientes de un advertiser y modelo:
+  - dos consultas: SELECT MAX(date) y después las filas de esa fecha
+    (el handler anterior)
+  - puntero: una sola consulta que toma la fecha de latest_recommendations y
+    hace el join con recommendations (fetch_recommendations de api/app/main.py)
+
+y reporta p50, p99 y requests por segundo. Usa las mismas variables de
+entorno RDS_* que la API.
+
+Uso:
+    python scripts/benchmark_latest_pointer.py [--requests 2000] [--concurrency 32] [--pool-max-size 10]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from app import db  # noqa: E402
+from app.main import build_recommendations_response, fetch_recommendations  # noqa: E402
+from benchmark_api import report, sample_requests  # noqa: E402
+
+
+async def fetch_recommendations_two_queries(conn, advertiser_id, model_name):
+    """Lectura anterior: una consulta por la fecha más reciente y otra por sus filas"""
+    result_date = await conn.fetchval("""
+        SELECT MAX(date) FROM recommendations WHERE advertiser_id = $1 AND model_name = $2
+    """, advertiser_id, model_name)
+    if not result_date:
+        return None
+    rows = await conn.fetch("""
+        SELECT product_id, rank_position, score, date
+        FROM recommendations
+        WHERE advertiser_id = $1 AND model_name = $2 AND date = $3
+        ORDER BY rank_position ASC
+        LIMIT 20
+    """, advertiser_id, model_name, result_date)
+    return build_recommendations_response(advertiser_id, model_name, result_date, rows)
+
+
+async def run(fetch, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(advertiser_id, model_name):
+        async with semaphore:
+            start = time.perf_counter()
+            async with db.acquire() as conn:
+                response = await fetch(conn, advertiser_id, model_name)
+            return time.perf_counter() - start, response
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed(*request) for request in requests))
+    return [latency for latency, _ in results], [response for _, response in results], time.perf_counter() - start
+
+
+async def main_async(args):
+    requests = sample_requests(args.requests)
+    await db.create_pool(pool_config={'min_size': args.pool_max_size, 'max_size': args.pool_max_size})
+    try:
+        print(f"{args.requests} requests, concurrencia {args.concurrency}, pool de {args.pool_max_size} conexiones")
+        print(f"{'modo':>22} {'p50 (ms)':>9} {'p99 (ms)':>9} {'req/s':>10}")
+
+        latencies, expected, elapsed = await run(fetch_recommendations_two_queries, requests, args.concurrency)
+        report('MAX(date) + filas', latencies, elapsed)
+
+        latencies, responses, elapsed = await run(fetch_recommendations, requests, args.concurrency)
+        report('latest_recommendations', latencies, elapsed)
+
+        if responses != expected:
+            raise SystemExit("Las respuestas difieren entre ambos modos: revisar latest_recommendations")
+    finally:
+        await db.close_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--pool-max-size', type=int, default=10)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
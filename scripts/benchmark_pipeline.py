@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Benchmark de punta a punta del pipeline sin Airflow
+
+Para cada factor de escala:
+1. Genera logs crudos sintéticos de un día (synthetic_data.py) con
+   --events-per-day × escala eventos, en un directorio local (o en --bucket,
+   p. ej. un bucket de MinIO con AWS_ENDPOINT_URL).
+2. Corre FiltrarDatos -> TopCTR -> TopProduct -> DBWriting llamando
+   directamente a las funciones de airflow/scripts. Cada etapa corre en un
+   proceso nuevo, así su pico de memoria no incluye el de las anteriores.
+3. Registra por etapa el tiempo total y por fase, el pico de RSS, las filas
+   y bytes y el throughput (filas de entrada por segundo), con las métricas
+   de instrumentation.py.
+
+DBWriting usa un PostgreSQL local con database/schema.sql y reemplaza la
+partición de --date: usar una base descartable (o --skip-db).
+
+Con --baseline compara contra un reporte anterior y sale con código 1 si
+alguna etapa tarda o usa memoria más de --tolerance por encima del baseline;
+--save-baseline guarda el reporte de esta corrida como nuevo baseline.
+
+Uso:
+    python scripts/benchmark_pipeline.py [--scales 1 4 16] [--events-per-day 200000] \\
+        [--advertisers 1000] [--workers 1] [--host localhost --database mlops_benchmark] \\
+        [--skip-db] [--baseline benchmark_baseline.json] [--tolerance 0.2] [--min-seconds 1] \\
+        [--save-baseline] [--output pipeline_benchmark.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from artifacts import artifact_key  # noqa: E402
+from db_writing import connect, write_to_db  # noqa: E402
+from filter_data import filter_data  # noqa: E402
+from instrumentation import run_instrumented  # noqa: E402
+from storage import get_storage  # noqa: E402
+from synthetic_data import generate_logs  # noqa: E402
+from top_ctr import calculate_top_ctr  # noqa: E402
+from top_product import calculate_top_product  # noqa: E402
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..')
+STAGES = ('filter_data', 'top_ctr', 'top_product', 'db_writing')
+INPUT_PREFIX = 'raw_data'
+OUTPUT_PREFIX = 'processed_data'
+# Métricas comparadas contra el baseline (más alto = peor)
+COMPARED_METRICS = ('total_seconds', 'peak_rss_mb')
+
+
+def stage_calls(bucket, date, db_config, workers):
+    """Función y argumentos de cada etapa, como los arma el DAG"""
+    return {
+        'filter_data': (filter_data, (bucket, INPUT_PREFIX, OUTPUT_PREFIX, f"{INPUT_PREFIX}/advertiser_ids", date)),
+        'top_ctr': (calculate_top_ctr, (
+            bucket, artifact_key(OUTPUT_PREFIX, 'ads_views_filtered', date), OUTPUT_PREFIX, date,
+        ), {'workers': workers}),
+        'top_product': (calculate_top_product, (
+            bucket, artifact_key(OUTPUT_PREFIX, 'product_views_filtered', date), OUTPUT_PREFIX, date,
+        ), {'workers': workers}),
+        'db_writing': (write_to_db, (
+            bucket, artifact_key(OUTPUT_PREFIX, 'top_ctr', date), artifact_key(OUTPUT_PREFIX, 'top_product', date),
+            db_config, date,
+        )),
+    }
+
+
+def run_stage(stage, bucket, date, db_config, workers):
+    """Corre una etapa instrumentada (en el proceso hijo) y devuelve sus métricas"""
+    func, args, *kwargs = stage_calls(bucket, date, db_config, workers)[stage]
+    kwargs = kwargs[0] if kwargs else {}
+    return run_instrumented(stage, date, get_storage(bucket), OUTPUT_PREFIX, func, *args, **kwargs)['metrics']
+
+
+def run_stage_in_new_process(stage, bucket, date, db_config, workers):
+    # spawn: el proceso arranca limpio y ru_maxrss mide solo esta etapa
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_stage, stage, bucket, date, db_config, workers).result()
+
+
+def input_rows(metrics):
+    """Filas de entrada de una etapa (las que terminan en _in)"""
+    return sum(rows for name, rows in metrics['rows'].items() if name.endswith('_in'))
+
+
+def apply_schema(db_config):
+    conn = connect(db_config)
+    try:
+        with conn.cursor() as cursor, open(os.path.join(REPO_ROOT, 'database', 'schema.sql')) as f:
+            cursor.execute(f.read())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_scale(scale, args, db_config):
+    """Genera los datos de una escala y corre todas las etapas; devuelve el resultado de la escala"""
+    events_per_day = args.events_per_day * scale
+    root = None
+    bucket = args.bucket
+    if bucket is None:
+        root = tempfile.mkdtemp(prefix=f'pipeline-bench-{scale}x-')
+        bucket = f"file://{root}"
+
+    try:
+        print(f"\nEscala {scale}x: {events_per_day:,} eventos por log")
+        generated = generate_logs(
+            bucket, INPUT_PREFIX, chunk_size=args.chunk_size,
+            n_advertisers=args.advertisers, products_per_advertiser=args.products_per_advertiser,
+            events_per_day=events_per_day, days=1, start_date=args.date, seed=args.seed,
+        )
+        stages = {}
+        for stage in args.stages:
+            metrics = run_stage_in_new_process(stage, bucket, args.date, db_config, args.workers)
+            metrics['throughput_rows_per_second'] = round(input_rows(metrics) / metrics['total_seconds'], 1)
+            stages[stage] = metrics
+        return {'scale': scale, 'events_per_day': events_per_day, 'generated_rows': generated['rows'],
+                'stages': stages}
+    finally:
+        if root is not None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def compare_with_baseline(results, baseline, tolerance, min_seconds=0.0):
+    """
+    Compara cada (escala, etapa) con el baseline
+
+    Returns:
+        Lista de regresiones: métricas más de tolerance por encima del baseline
+        (los tiempos del baseline menores a min_seconds no se marcan, son ruido)
+    """
+    baseline_by_scale = {result['scale']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        base = baseline_by_scale.get(result['scale'])
+        if base is None:
+            continue
+        for stage, metrics in result['stages'].items():
+            base_metrics = base['stages'].get(stage)
+            if base_metrics is None:
+                continue
+            for metric in COMPARED_METRICS:
+                current, previous = metrics.get(metric), base_metrics.get(metric)
+                if not current or not previous:
+                    continue
+                ratio = current / previous
+                metrics.setdefault('vs_baseline', {})[metric] = round(ratio, 3)
+                if metric == 'total_seconds' and previous < min_seconds:
+                    continue
+                if ratio > 1 + tolerance:
+                    regressions.append({'scale': result['scale'], 'stage': stage, 'metric': metric,
+                                        'baseline': previous, 'current': current, 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    print(f"\n{'escala':>7} {'etapa':>12} {'segundos':>9} {'filas/s':>12} {'pico RSS MB':>12} {'vs baseline':>12}")
+    for result in results:
+        for stage, metrics in result['stages'].items():
+            ratio = metrics.get('vs_baseline', {}).get('total_seconds')
+            print(f"{result['scale']:>6}x {stage:>12} {metrics['total_seconds']:>9.2f} "
+                  f"{metrics['throughput_rows_per_second']:>12,.0f} {metrics['peak_rss_mb']:>12.1f} "
+                  f"{f'{ratio:.2f}x' if ratio else '-':>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--events-per-day', type=int, default=200_000, help='eventos por log en la escala 1x')
+    parser.add_argument('--advertisers', type=int, default=1000)
+    parser.add_argument('--products-per-advertiser', type=int, default=200)
+    parser.add_argument('--date', default='2024-01-01')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000, help='filas por bloque al generar los logs')
+    parser.add_argument('--workers', type=int, default=1, help='procesos de TopCTR y TopProduct (ver sharding.py)')
+    parser.add_argument('--bucket', help='bucket de S3 (o stand-in) en lugar de un directorio temporal')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--database', default='mlops_benchmark')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='postgres')
+    parser.add_argument('--sslmode', default='prefer')
+    parser.add_argument('--skip-db', action='store_true', help='no correr DBWriting')
+    parser.add_argument('--baseline', help='reporte anterior contra el cual comparar')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='regresión tolerada (0.2 = 20%% peor)')
+    parser.add_argument('--min-seconds', type=float, default=1.0,
+                        help='no marcar regresiones de tiempo en etapas que en el baseline tardan menos')
+    parser.add_argument('--save-baseline', action='store_true', help='guardar este reporte en --baseline')
+    parser.add_argument('--output', default='pipeline_benchmark.json')
+    args = parser.parse_args()
+    args.stages = [stage for stage in STAGES if not (args.skip_db and stage == 'db_writing')]
+
+    db_config = None
+    if not args.skip_db:
+        db_config = {
+            'host': args.host, 'port': args.port, 'database': args.database,
+            'user': args.user, 'password': args.password, 'sslmode': args.sslmode,
+        }
+        apply_schema(db_config)
+
+    results = [run_scale(scale, args, db_config) for scale in args.scales]
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance, args.min_seconds)
+    print_table(results)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'scales': args.scales,
+            'events_per_day': args.events_per_day,
+            'advertisers': args.advertisers,
+            'products_per_advertiser': args.products_per_advertiser,
+            'date': args.date,
+            'seed': args.seed,
+            'workers': args.workers,
+            'stages': args.stages,
+            'bucket': args.bucket,
+        },
+        'baseline': args.baseline,
+        'tolerance': args.tolerance,
+        'regressions': regressions,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Reporte escrito en {args.output}")
+
+    if args.save_baseline and args.baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline guardado en {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regresiones por encima del {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression['scale']}x {regression['stage']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']} ({regression['ratio']:.2f}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
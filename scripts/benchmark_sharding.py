@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escalabilidad de la ejecución de los modelos por shards de advertiser
+
+Mide la agregación + ranking de TopCTR y TopProduct sobre eventos
+sintéticos con 1..N procesos (ver airflow/scripts/sharding.py) y verifica
+que el resultado no cambia con la cantidad de procesos.
+
+Uso:
+    python scripts/benchmark_sharding.py [--events 5000000] [--advertisers 20000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import sys
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from sharding import map_advertiser_shards, sort_ranking  # noqa: E402
+from top_ctr import aggregate_ads, rank_top_ctr  # noqa: E402
+from top_product import aggregate_views, rank_top_product  # noqa: E402
+
+BENCHMARK_DATE = '2024-01-01'
+
+
+def build_events(n_events, n_advertisers, products_per_advertiser, seed=42):
+    """Genera eventos de ads sintéticos (sirven también como product_views)"""
+    rng = np.random.default_rng(seed)
+    advertiser_codes = rng.integers(0, n_advertisers, size=n_events)
+    product_codes = advertiser_codes * products_per_advertiser + rng.integers(0, products_per_advertiser, size=n_events)
+    advertisers = np.array([f"ADV{i:07d}" for i in range(n_advertisers)], dtype=object)
+    products = np.array([f"PRD{i:09d}" for i in range(n_advertisers * products_per_advertiser)], dtype=object)
+    return pd.DataFrame({
+        'advertiser_id': advertisers[advertiser_codes],
+        'product_id': products[product_codes],
+        'type': np.where(rng.random(n_events) < 0.05, 'click', 'impression'),
+    })
+
+
+def run_models(df_events, workers):
+    ctr_counts = map_advertiser_shards(df_events, aggregate_ads, workers)
+    top_ctr = sort_ranking(map_advertiser_shards(ctr_counts, partial(rank_top_ctr, date=BENCHMARK_DATE), workers))
+    view_counts = map_advertiser_shards(df_events, aggregate_views, workers)
+    top_product = sort_ranking(
+        map_advertiser_shards(view_counts, partial(rank_top_product, date=BENCHMARK_DATE), workers)
+    )
+    return top_ctr, top_product
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=5_000_000)
+    parser.add_argument('--advertisers', type=int, default=20_000)
+    parser.add_argument('--products-per-advertiser', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    df_events = build_events(args.events, args.advertisers, args.products_per_advertiser)
+    print(f"{args.events:,} eventos, {args.advertisers:,} advertisers, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'tiempo (s)':>11} {'speedup':>8} {'eventos/s':>14}")
+
+    baseline_time = None
+    baseline_result = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        result = run_models(df_events, workers)
+        elapsed = time.perf_counter() - start
+
+        if baseline_result is None:
+            baseline_time, baseline_result = elapsed, result
+        else:
+            for expected, actual in zip(baseline_result, result):
+                pd.testing.assert_frame_equal(expected, actual)
+
+        print(f"{workers:>8} {elapsed:11.2f} {baseline_time / elapsed:7.2f}x {args.events / elapsed:14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark del ranking Top-K compartido por TopCTR y TopProduct
+
+Compara el ranking vectorizado de airflow/scripts/top_k.py contra el loop
+por advertiser que usaban originalmente los modelos, para distintas
+cantidades de pares (advertiser, producto).
+
+Uso:
+    python scripts/benchmark_top_k.py [--pairs 100000 1000000 5000000] [--products-per-advertiser 100]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from top_k import DEFAULT_TOP_K, rank_top_k  # noqa: E402
+
+# El loop original es cuadrático: solo se mide hasta este tamaño
+LEGACY_MAX_PAIRS = 200_000
+
+
+def build_pairs(n_pairs, products_per_advertiser, seed=42):
+    """Genera un DataFrame agregado sintético con n_pairs pares (advertiser, producto)"""
+    rng = np.random.default_rng(seed)
+    n_advertisers = max(1, n_pairs // products_per_advertiser)
+    advertiser_codes = rng.integers(0, n_advertisers, size=n_pairs)
+    return pd.DataFrame({
+        'advertiser_id': pd.Series(advertiser_codes).map(lambda c: f"ADV{c:07d}"),
+        'product_id': [f"PRD{i:09d}" for i in range(n_pairs)],
+        'score': rng.integers(0, 50, size=n_pairs),
+    })
+
+
+def legacy_top_k(df, score_column, k=DEFAULT_TOP_K):
+    """Implementación original: una máscara booleana sobre todo el DataFrame por advertiser"""
+    results = []
+    for advertiser in df['advertiser_id'].unique():
+        advertiser_data = df[df['advertiser_id'] == advertiser].copy()
+        advertiser_data = advertiser_data.sort_values(score_column, ascending=False).head(k)
+        advertiser_data['rank'] = range(1, len(advertiser_data) + 1)
+        results.append(advertiser_data[['advertiser_id', 'product_id', score_column, 'rank']])
+    return pd.concat(results, ignore_index=True)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--products-per-advertiser', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    print(f"{'pares':>12} {'advertisers':>12} {'vectorizado (s)':>16} {'loop (s)':>10} {'speedup':>8}")
+    for n_pairs in args.pairs:
+        df = build_pairs(n_pairs, args.products_per_advertiser)
+        n_advertisers = df['advertiser_id'].nunique()
+
+        top, vectorized_time = timed(rank_top_k, df, 'score', k=args.top_k)
+
+        if n_pairs <= LEGACY_MAX_PAIRS:
+            legacy, legacy_time = timed(legacy_top_k, df, 'score', k=args.top_k)
+            # Mismo conjunto de filas por advertiser (los empates pueden ordenarse distinto)
+            assert len(legacy) == len(top)
+            legacy_col = f"{legacy_time:10.2f}"
+            speedup_col = f"{legacy_time / vectorized_time:7.1f}x"
+        else:
+            legacy_col = f"{'-':>10}"
+            speedup_col = f"{'-':>8}"
+
+        print(f"{n_pairs:>12,} {n_advertisers:>12,} {vectorized_time:16.2f} {legacy_col} {speedup_col}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,98 @@
 #!/usr/bin/env python3
 """
 Script para crear el esquema de base de datos en RDS
+
+Si recommendations ya existe sin particionar (esquema anterior), la migra a
+la tabla particionada por día en la misma transacción: renombra la tabla
+vieja, crea el esquema, crea una partición por cada fecha y copia las filas.
 """
 import psycopg2
 import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from db_partitions import ensure_partition  # noqa: E402
+
+# Tablas que crea database/schema.sql
+SCHEMA_TABLES = ['recommendations', 'latest_recommendations', 'recommendation_history', 'recommendation_stats']
+
+RECOMMENDATION_COLUMNS = [
+    'id', 'advertiser_id', 'model_name', 'product_id', 'rank_position', 'score', 'date', 'created_at'
+]
+LEGACY_TABLE = 'recommendations_unpartitioned'
+
+
+def rename_unpartitioned_table(cursor):
+    """
+    Si recommendations es una tabla sin particionar, la renombra (con sus
+    índices, constraints y secuencia) para liberar los nombres del esquema nuevo
+
+    Returns:
+        True si había que migrar
+    """
+    cursor.execute("""
+        SELECT relkind FROM pg_class
+        WHERE relname = 'recommendations' AND relnamespace = current_schema()::regnamespace
+    """)
+    row = cursor.fetchone()
+    if row is None or row[0] != 'r':
+        return False
+
+    print("La tabla recommendations no está particionada: se migra")
+    cursor.execute(f"ALTER TABLE recommendations RENAME TO {LEGACY_TABLE}")
+    cursor.execute("""
+        SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u')
+    """, (LEGACY_TABLE,))
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {name} "
+                       f"TO {name.replace('recommendations', LEGACY_TABLE, 1)}")
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (LEGACY_TABLE,))
+    for (name,) in cursor.fetchall():
+        if not name.startswith(LEGACY_TABLE):
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {name}_unpartitioned")
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (LEGACY_TABLE,))
+    sequence = cursor.fetchone()[0]
+    if sequence:
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {LEGACY_TABLE}_id_seq")
+    return True
+
+
+def copy_unpartitioned_rows(cursor):
+    """Crea las particiones de las fechas de la tabla vieja, copia sus filas y la borra"""
+    cursor.execute(f"SELECT DISTINCT date FROM {LEGACY_TABLE} ORDER BY date")
+    dates = [row[0] for row in cursor.fetchall()]
+    for date in dates:
+        ensure_partition(cursor, date)
+
+    columns = ', '.join(RECOMMENDATION_COLUMNS)
+    cursor.execute(f"INSERT INTO recommendations ({columns}) SELECT {columns} FROM {LEGACY_TABLE}")
+    print(f"✓ {cursor.rowcount} filas copiadas a {len(dates)} particiones diarias")
+
+    cursor.execute("""
+        SELECT setval(pg_get_serial_sequence('recommendations', 'id'), COALESCE(MAX(id), 0) + 1, false)
+        FROM recommendations
+    """)
+    cursor.execute("""
+        INSERT INTO latest_recommendations (advertiser_id, model_name, date)
+        SELECT advertiser_id, model_name, MAX(date)
+        FROM recommendations
+        GROUP BY advertiser_id, model_name
+        ON CONFLICT (advertiser_id, model_name) DO NOTHING
+    """)
+    cursor.execute("""
+        INSERT INTO recommendation_history (advertiser_id, date, model_name, product_ids, rank_positions, scores)
+        SELECT advertiser_id, date, model_name,
+            array_agg(product_id ORDER BY rank_position),
+            array_agg(rank_position ORDER BY rank_position),
+            array_agg(score ORDER BY rank_position)
+        FROM recommendations
+        GROUP BY advertiser_id, date, model_name
+        ON CONFLICT (advertiser_id, date, model_name) DO NOTHING
+    """)
+    cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+
+
 def create_schema(host, port, database, user, password):
     """Crea el esquema de base de datos"""
     try:
@@ -30,34 +117,38 @@ def create_schema(host, port, database, user, password):
         with open(schema_path, 'r') as f:
             schema_sql = f.read()
         
-        # Ejecutar el schema
+        # Ejecutar el schema (migrando la tabla sin particionar si hace falta)
+        migrate = rename_unpartitioned_table(cursor)
         print("Ejecutando schema...")
         cursor.execute(schema_sql)
+        if migrate:
+            copy_unpartitioned_rows(cursor)
         conn.commit()
         
-        # Verificar que la tabla se creó
-        cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'recommendations'
-            );
-        """)
-        table_exists = cursor.fetchone()[0]
-        
-        if table_exists:
-            print("✓ Tabla 'recommendations' creada exitosamente")
-            
-            # Verificar índices
+        # Verificar que las tablas se crearon
+        for table in SCHEMA_TABLES:
             cursor.execute("""
-                SELECT indexname FROM pg_indexes 
-                WHERE tablename = 'recommendations';
-            """)
-            indexes = [row[0] for row in cursor.fetchall()]
-            print(f"✓ Índices creados: {len(indexes)}")
-            for idx in indexes:
-                print(f"  - {idx}")
-        else:
-            print("⚠ Advertencia: La tabla no se encontró después de crear el schema")
+                SELECT EXISTS (
+                    SELECT FROM information_schema.tables 
+                    WHERE table_name = %s
+                );
+            """, (table,))
+            table_exists = cursor.fetchone()[0]
+            
+            if table_exists:
+                print(f"✓ Tabla '{table}' creada exitosamente")
+                
+                # Verificar índices
+                cursor.execute("""
+                    SELECT indexname FROM pg_indexes 
+                    WHERE tablename = %s;
+                """, (table,))
+                indexes = [row[0] for row in cursor.fetchall()]
+                print(f"✓ Índices creados: {len(indexes)}")
+                for idx in indexes:
+                    print(f"  - {idx}")
+            else:
+                print(f"⚠ Advertencia: La tabla '{table}' no se encontró después de crear el schema")
         
         cursor.close()
         conn.close()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de la API contra un PostgreSQL local con datos sintéticos
+
+1. Aplica database/schema.sql y carga recomendaciones sintéticas (advertisers
+   × días × modelos × top-k) con la misma carga que DBWriting, más las
+   estadísticas de /stats/ de cada día. Los días terminan hoy, así /history
+   encuentra datos. Reemplaza las particiones de esos días: usar una base
+   local descartable, nunca la de producción.
+2. Levanta la API con uvicorn apuntando a esa base (o usa --url para una API
+   ya levantada).
+3. Para cada endpoint y nivel de concurrencia manda --requests requests y
+   registra throughput y latencia (media, p50, p95, p99, máx.).
+4. Escribe el reporte en JSON (--output) para comparar entre cambios.
+
+Uso:
+    python scripts/load_test_api.py --host localhost --database mlops_load_test \\
+        [--advertisers 1000] [--days 7] [--models TopCTR TopProduct] \\
+        [--requests 2000] [--concurrency 1 16 64] [--endpoints recommendations stats history] \\
+        [--no-cache] [--skip-seed] [--output load_test_report.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from compute_stats import store_stats  # noqa: E402
+from db_writing import connect, load_recommendations  # noqa: E402
+from top_k import DEFAULT_TOP_K  # noqa: E402
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..')
+ENDPOINTS = ('recommendations', 'stats', 'history')
+MODELS = ('TopCTR', 'TopProduct')
+
+
+def advertiser_ids(n_advertisers):
+    return [f"LOAD{i:07d}" for i in range(n_advertisers)]
+
+
+def build_day(advertisers, models, day, top_k, catalog_size, rng):
+    """Recomendaciones sintéticas de un día: top_k productos distintos por advertiser y modelo"""
+    frames = []
+    n_advertisers = len(advertisers)
+    for model_name in models:
+        products = rng.random((n_advertisers, catalog_size)).argsort(axis=1)[:, :top_k]
+        scores = -np.sort(-rng.random((n_advertisers, top_k)), axis=1)
+        frames.append(pd.DataFrame({
+            'advertiser_id': np.repeat(advertisers, top_k),
+            'model_name': model_name,
+            'product_id': [f"PRD{product:05d}" for product in products.ravel()],
+            'rank_position': np.tile(np.arange(1, top_k + 1), n_advertisers),
+            'score': scores.ravel().round(6),
+            'date': str(day),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def seed_database(db_config, n_advertisers, n_days, models, top_k, catalog_size, seed):
+    """Aplica el esquema y carga n_days días de recomendaciones sintéticas terminando hoy"""
+    rng = np.random.default_rng(seed)
+    advertisers = advertiser_ids(n_advertisers)
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in range(n_days - 1, -1, -1)]
+
+    start = time.perf_counter()
+    conn = connect(db_config)
+    try:
+        with conn.cursor() as cursor, open(os.path.join(REPO_ROOT, 'database', 'schema.sql')) as f:
+            cursor.execute(f.read())
+        conn.commit()
+
+        rows = 0
+        for day in days:
+            df = build_day(advertisers, models, day, top_k, catalog_size, rng)
+            with conn.cursor() as cursor:
+                rows += load_recommendations(cursor, df, str(day))
+            conn.commit()
+            with conn.cursor() as cursor:
+                store_stats(cursor, str(day))
+            conn.commit()
+            print(f"  {day}: {len(df):,} filas")
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Base cargada: {n_advertisers:,} advertisers × {n_days} días × {len(models)} modelos "
+          f"= {rows:,} filas en {elapsed:.1f}s")
+    return {'rows': rows, 'first_date': str(days[0]), 'last_date': str(days[-1]), 'seconds': round(elapsed, 2)}
+
+
+def start_api(db_config, port, no_cache):
+    """Levanta la API con uvicorn en un subproceso y espera a que responda /health"""
+    env = dict(
+        os.environ,
+        RDS_HOST=str(db_config['host']),
+        RDS_PORT=str(db_config['port']),
+        RDS_DATABASE=db_config['database'],
+        RDS_USER=db_config['user'],
+        RDS_PASSWORD=db_config['password'],
+        RDS_SSLMODE=db_config.get('sslmode', 'prefer'),
+    )
+    if no_cache:
+        env['CACHE_MAX_ENTRIES'] = '0'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=os.path.join(REPO_ROOT, 'api'),
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"La API terminó al iniciar (código {process.returncode})")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("La API no respondió /health en 30s")
+
+
+def request_paths(endpoint, n_requests, advertisers, models, history_days, rng):
+    if endpoint == 'recommendations':
+        return [
+            f"/recommendations/{advertisers[i]}/{models[j]}"
+            for i, j in zip(rng.integers(0, len(advertisers), n_requests), rng.integers(0, len(models), n_requests))
+        ]
+    if endpoint == 'history':
+        return [
+            f"/history/{advertisers[i]}/?days={history_days}"
+            for i in rng.integers(0, len(advertisers), n_requests)
+        ]
+    return ["/stats/"] * n_requests
+
+
+async def drive(url, paths, concurrency):
+    """Manda paths con concurrency requests en vuelo; devuelve latencias, códigos y segundos totales"""
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    latencies = []
+    status_codes = {}
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def worker():
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                status_codes[status] = status_codes.get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, status_codes, elapsed
+
+
+def summarize(endpoint, concurrency, latencies, status_codes, elapsed):
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': sum(count for status, count in status_codes.items() if status != '200'),
+        'status_codes': status_codes,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(float(latencies_ms.mean()), 3),
+            'p50': round(float(np.percentile(latencies_ms, 50)), 3),
+            'p95': round(float(np.percentile(latencies_ms, 95)), 3),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 3),
+            'max': round(float(latencies_ms.max()), 3),
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--database', default='mlops_load_test')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='postgres')
+    parser.add_argument('--sslmode', default='prefer')
+    parser.add_argument('--advertisers', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--models', nargs='+', choices=MODELS, default=list(MODELS))
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--catalog-size', type=int, default=200, help='productos distintos por advertiser')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-seed', action='store_true', help='usar los datos ya cargados por una corrida anterior')
+    parser.add_argument('--url', help='API ya levantada; si no se indica se levanta una con uvicorn')
+    parser.add_argument('--api-port', type=int, default=8765)
+    parser.add_argument('--no-cache', action='store_true', help='levantar la API con CACHE_MAX_ENTRIES=0')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=2000, help='requests por endpoint y nivel de concurrencia')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--history-days', type=int, default=7)
+    parser.add_argument('--output', default='load_test_report.json')
+    args = parser.parse_args()
+
+    db_config = {
+        'host': args.host, 'port': args.port, 'database': args.database,
+        'user': args.user, 'password': args.password, 'sslmode': args.sslmode,
+    }
+
+    seed_info = None
+    if not args.skip_seed:
+        seed_info = seed_database(db_config, args.advertisers, args.days, args.models,
+                                  args.top_k, args.catalog_size, args.seed)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_api(db_config, args.api_port, args.no_cache)
+
+    rng = np.random.default_rng(args.seed)
+    advertisers = advertiser_ids(args.advertisers)
+    results = []
+    print(f"{'endpoint':>16} {'conc.':>6} {'req/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'errores':>8}")
+    try:
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                paths = request_paths(endpoint, args.requests, advertisers, args.models, args.history_days, rng)
+                summary = summarize(endpoint, concurrency, *asyncio.run(drive(url, paths, concurrency)))
+                results.append(summary)
+                latency = summary['latency_ms']
+                print(f"{endpoint:>16} {concurrency:>6} {summary['throughput_rps']:>9,.0f} {latency['p50']:>9.2f} "
+                      f"{latency['p95']:>9.2f} {latency['p99']:>9.2f} {summary['errors']:>8}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'config': {
+            'advertisers': args.advertisers,
+            'days': args.days,
+            'models': args.models,
+            'top_k': args.top_k,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'history_days': args.history_days,
+            'cache': not args.no_cache,
+            'url': args.url,
+        },
+        'seed': seed_info,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Reporte escrito en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Reporte de memoria y tiempo de los IDs como texto vs. codificados como categóricos
+
+Genera un log de ads sintético en CSV y lo procesa como lo hacía el
+pipeline (IDs como strings de Python, filtro con un set de advertisers
+activos), con solo advertiser_id codificado (el default del pipeline) y con
+advertiser_id y product_id codificados (ENCODE_PRODUCT_IDS=1, ver
+airflow/scripts/id_codes.py): lectura, filtro por advertisers activos y
+agregación de TopCTR. Verifica que todos los caminos den los mismos conteos.
+
+Con pocos eventos por producto (--products-per-advertiser alto) codificar
+product_id usa más memoria y tiempo que el texto; probar con valores
+distintos para decidir ENCODE_PRODUCT_IDS.
+
+Uso:
+    python scripts/report_id_encoding_memory.py [--events 5000000] [--advertisers 20000] \\
+        [--products-per-advertiser 200] [--active-ratio 0.5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from id_codes import ID_COLUMNS, decode_ids, encode_ids, read_csv_encoded  # noqa: E402
+from top_ctr import aggregate_ads  # noqa: E402
+
+
+def build_log(path, n_events, n_advertisers, products_per_advertiser, seed=42):
+    """Escribe un log de ads sintético con el formato de raw_data/ads_views"""
+    rng = np.random.default_rng(seed)
+    advertiser_codes = rng.integers(0, n_advertisers, size=n_events)
+    product_codes = advertiser_codes * products_per_advertiser + rng.integers(0, products_per_advertiser, size=n_events)
+    advertisers = np.array([f"ADV{i:07d}" for i in range(n_advertisers)], dtype=object)
+    products = np.array([f"PRD{i:09d}" for i in range(n_advertisers * products_per_advertiser)], dtype=object)
+    pd.DataFrame({
+        'advertiser_id': advertisers[advertiser_codes],
+        'product_id': products[product_codes],
+        'date': '2024-01-01',
+        'type': np.where(rng.random(n_events) < 0.05, 'click', 'impression'),
+    }).to_csv(path, index=False)
+    return advertisers
+
+
+def run_legacy(path, active_advertisers):
+    start = time.perf_counter()
+    df = pd.read_csv(path)
+    read_seconds = time.perf_counter() - start
+    active = set(active_advertisers.tolist())
+    df = df[df['advertiser_id'].isin(active)]
+    counts = aggregate_ads(df)
+    return df, counts, read_seconds, time.perf_counter() - start
+
+
+def run_encoded(path, active_advertisers, columns):
+    start = time.perf_counter()
+    df = read_csv_encoded(path, columns=columns)
+    read_seconds = time.perf_counter() - start
+    df = encode_ids(df, pd.Index(active_advertisers).sort_values(), columns=columns)
+    df = df[df['advertiser_id'].notna()]
+    counts = aggregate_ads(df)
+    return df, counts, read_seconds, time.perf_counter() - start
+
+
+def memory_mb(df, columns=None):
+    return df[columns or df.columns].memory_usage(index=False, deep=True).sum() / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=5_000_000)
+    parser.add_argument('--advertisers', type=int, default=20_000)
+    parser.add_argument('--products-per-advertiser', type=int, default=200)
+    parser.add_argument('--active-ratio', type=float, default=0.5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ads_views')
+        advertisers = build_log(path, args.events, args.advertisers, args.products_per_advertiser)
+        active_advertisers = advertisers[:int(len(advertisers) * args.active_ratio)]
+
+        results = {
+            'texto': run_legacy(path, active_advertisers),
+            'advertiser': run_encoded(path, active_advertisers, ('advertiser_id',)),
+            'ambos': run_encoded(path, active_advertisers, ID_COLUMNS),
+        }
+
+    legacy_counts = results['texto'][1].sort_values(['advertiser_id', 'product_id']).reset_index(drop=True)
+    for name in ('advertiser', 'ambos'):
+        encoded_counts = decode_ids(results[name][1])
+        pd.testing.assert_frame_equal(
+            legacy_counts,
+            encoded_counts.sort_values(['advertiser_id', 'product_id']).reset_index(drop=True),
+            check_dtype=False,
+        )
+
+    print(f"{args.events:,} eventos, {args.advertisers:,} advertisers ({len(active_advertisers):,} activos), "
+          f"{args.products_per_advertiser} productos por advertiser")
+    print(f"{'codificados':>11} {'IDs (MB)':>9} {'eventos (MB)':>13} {'conteos (MB)':>13} {'lectura (s)':>12} "
+          f"{'total (s)':>10}")
+    for name, (df, counts, read_seconds, total_seconds) in results.items():
+        print(f"{name:>11} {memory_mb(df, list(ID_COLUMNS)):9.1f} {memory_mb(df):13.1f} {memory_mb(counts):13.1f} "
+              f"{read_seconds:12.2f} {total_seconds:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
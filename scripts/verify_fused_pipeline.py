@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Verifica que el pipeline fusionado produce lo mismo que el pipeline por etapas
+
+Genera logs sintéticos en un directorio temporal, corre FiltrarDatos ->
+TopCTR/TopProduct sobre el layout plano y sobre el particionado (ver
+raw_partitions.py) y el modo fusionado sobre el backend local, y compara los
+resultados de ambos modelos. Lo hace dos veces: con IDs de texto y con IDs
+numéricos, que pandas infiere como enteros. Sale con código 1 si difieren o
+si algún resultado queda vacío.
+
+Uso:
+    python scripts/verify_fused_pipeline.py [--rows 200000] [--chunk-size 50000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+
+from artifacts import read_artifact  # noqa: E402
+from filter_data import filter_data  # noqa: E402
+from fused_pipeline import run_fused_pipeline  # noqa: E402
+from raw_partitions import RAW_LOGS, compact_raw_log  # noqa: E402
+from storage import get_storage  # noqa: E402
+from top_ctr import calculate_top_ctr  # noqa: E402
+from top_product import calculate_top_product  # noqa: E402
+
+DATES = ['2024-01-01', '2024-01-02', '2024-01-03']
+TARGET_DATE = '2024-01-02'
+
+
+def write_raw_logs(root, n_rows, numeric_ids=False, seed=7):
+    """
+    Escribe advertiser_ids, product_views y ads_views sintéticos en root/raw_data
+
+    Con numeric_ids los IDs son números sin prefijo (1000, 1001, ...).
+    """
+    rng = np.random.default_rng(seed)
+    raw_dir = os.path.join(root, 'raw_data')
+    os.makedirs(raw_dir)
+
+    if numeric_ids:
+        advertisers = [str(1000 + i) for i in range(200)]
+        products = [str(100000 + i) for i in range(3000)]
+    else:
+        advertisers = [f"ADV{i:04d}" for i in range(200)]
+        products = [f"PRD{i:05d}" for i in range(3000)]
+    pd.DataFrame({'advertiser_id': advertisers[:150]}).to_csv(os.path.join(raw_dir, 'advertiser_ids'), index=False)
+
+    def events():
+        return pd.DataFrame({
+            'advertiser_id': rng.choice(advertisers, n_rows),
+            'product_id': rng.choice(products, n_rows),
+            'date': rng.choice(DATES, n_rows),
+        })
+
+    events().to_csv(os.path.join(raw_dir, 'product_views'), index=False)
+    ads = events()
+    ads['type'] = rng.choice(['impression', 'click'], n_rows, p=[0.9, 0.1])
+    ads.to_csv(os.path.join(raw_dir, 'ads_views'), index=False)
+
+
+def run_staged(bucket, output_prefix, raw_layout='flat'):
+    filtered = filter_data(bucket, 'raw_data', output_prefix, 'raw_data/advertiser_ids', TARGET_DATE,
+                           raw_layout=raw_layout)
+    return {
+        'top_ctr': calculate_top_ctr(bucket, filtered['ads_views_filtered'], output_prefix, TARGET_DATE),
+        'top_product': calculate_top_product(bucket, filtered['product_views_filtered'], output_prefix, TARGET_DATE),
+    }
+
+
+def verify_case(n_rows, chunk_size, numeric_ids):
+    """Corre las variantes del pipeline sobre un mismo dataset y las compara contra el pipeline por etapas"""
+    ok = True
+    with tempfile.TemporaryDirectory() as root:
+        write_raw_logs(root, n_rows, numeric_ids)
+        bucket = f"file://{root}"
+        storage = get_storage(bucket)
+        for log_name in RAW_LOGS:
+            compact_raw_log(storage, 'raw_data', log_name)
+
+        staged = run_staged(bucket, 'staged')
+        variants = {
+            'fusionado': run_fused_pipeline(bucket, 'raw_data', 'fused', 'raw_data/advertiser_ids', TARGET_DATE,
+                                            chunk_size=chunk_size),
+            'particionado': run_staged(bucket, 'partitioned', raw_layout='partitioned'),
+        }
+
+        ids = 'numéricos' if numeric_ids else 'de texto'
+        for model in ('top_ctr', 'top_product'):
+            df_staged = read_artifact(storage, staged[model])
+            if df_staged.empty:
+                ok = False
+                print(f"✗ IDs {ids}, {model}: el pipeline por etapas no devolvió filas")
+                continue
+            for variant, outputs in variants.items():
+                df_variant = read_artifact(storage, outputs[model])
+                try:
+                    pd.testing.assert_frame_equal(df_staged, df_variant, check_dtype=False)
+                    print(f"✓ IDs {ids}, {model} {variant}: {len(df_variant)} filas idénticas")
+                except AssertionError as e:
+                    ok = False
+                    print(f"✗ IDs {ids}, {model} {variant} difiere:\n{e}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    args = parser.parse_args()
+
+    results = [verify_case(args.rows, args.chunk_size, numeric_ids) for numeric_ids in (False, True)]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Verifica que un snapshot publicado por el pipeline responde lo mismo que la base
+
+Arma recomendaciones sintéticas (IDs de texto, numéricos y con caracteres
+no ASCII, scores NULL, más de MAX_ROWS_PER_KEY filas por clave), las
+serializa con serving_snapshot.build_snapshot, abre el archivo con
+api/app/snapshot.Snapshot y compara lookup() de cada advertiser y modelo
+con la respuesta que arma la API desde la base. Sale con código 1 si alguna
+difiere o si un par inexistente devuelve algo.
+
+Uso:
+    python scripts/verify_snapshot.py [--advertisers 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'airflow', 'scripts'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+
+from serving_snapshot import MAX_ROWS_PER_KEY, build_snapshot  # noqa: E402
+from app.snapshot import Snapshot  # noqa: E402
+
+MODELS = ['TopCTR', 'TopProduct']
+GENERATION = date(2024, 1, 7)
+
+
+def build_rows(n_advertisers, seed=7):
+    """Filas como las de read_current_recommendations: una fecha por advertiser y modelo"""
+    rng = np.random.default_rng(seed)
+    advertisers = [f"ADV{i:04d}" for i in range(n_advertisers // 2)]
+    advertisers += [str(1000 + i) for i in range(n_advertisers - len(advertisers) - 1)] + ['AnunciañteÑ']
+    rows = []
+    for advertiser_id in advertisers:
+        for model_name in MODELS:
+            result_date = GENERATION - timedelta(days=int(rng.integers(0, 3)))
+            for rank in range(1, int(rng.integers(1, MAX_ROWS_PER_KEY + 5)) + 1):
+                score = None if rng.random() < 0.05 else float(rng.random())
+                rows.append((advertiser_id, model_name, f"PRD{rng.integers(0, 10_000):05d}", rank, score, result_date))
+    columns = ['advertiser_id', 'model_name', 'product_id', 'rank_position', 'score', 'date']
+    return pd.DataFrame(rows, columns=columns)
+
+
+def expected_response(advertiser_id, model_name, group):
+    """La respuesta de /recommendations (main.build_recommendations_response) para las filas de un par"""
+    group = group[group['rank_position'] <= MAX_ROWS_PER_KEY].sort_values('rank_position')
+    result_date = group['date'].iloc[0]
+    return {
+        "advertiser_id": advertiser_id,
+        "model_name": model_name,
+        "date": str(result_date),
+        "recommendations": [
+            {
+                "product_id": row.product_id,
+                "rank_position": row.rank_position,
+                "score": None if pd.isna(row.score) else row.score,
+                "date": row.date,
+            }
+            for row in group.itertuples()
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--advertisers', type=int, default=50)
+    args = parser.parse_args()
+
+    df = build_rows(args.advertisers)
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'recommendations.snap')
+        with open(path, 'wb') as f:
+            f.write(build_snapshot(df, GENERATION))
+        snapshot = Snapshot(path)
+
+        ok = snapshot.generation == GENERATION
+        if not ok:
+            print(f"✗ generación {snapshot.generation}, se esperaba {GENERATION}")
+
+        groups = df.groupby(['advertiser_id', 'model_name'], sort=False)
+        for (advertiser_id, model_name), group in groups:
+            expected = expected_response(advertiser_id, model_name, group)
+            found = snapshot.lookup(advertiser_id, model_name)
+            if found != expected:
+                ok = False
+                print(f"✗ {advertiser_id}/{model_name}: {'sin respuesta' if found is None else 'difiere'}")
+
+        for advertiser_id, model_name in (('NOPE', 'TopCTR'), ('ADV0000', 'TopNada'), ('', '')):
+            if snapshot.lookup(advertiser_id, model_name) is not None:
+                ok = False
+                print(f"✗ {advertiser_id!r}/{model_name!r} no existe y el snapshot devolvió una respuesta")
+
+    if ok:
+        print(f"✓ {groups.ngroups} pares idénticos a la respuesta de la base, pares inexistentes sin respuesta")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()